@@ -0,0 +1,45 @@
+import importlib
+import sys
+
+# One entry point for the tools: `python assetsync.py <command> [options]`.
+# Only the chosen command's module is imported, and each module pulls in
+# yfinance / kiteconnect itself when it actually talks to them. A command's
+# --help comes from its parser in cli_args.py, without importing the
+# module, so help starts without pandas or the broker SDKs. Nothing
+# prompts when stdin is not a terminal, so every command can run from cron.
+COMMANDS = {
+    "fetch": ("data_fetch", "Append new Nifty 50 daily closes to the price store"),
+    "live": ("final_script", "One live pass of the strategy on Zerodha (--save yes|no for cron)"),
+    "live-multi": ("multi_portfolio", "One live pass for every portfolio in a config, sharing one snapshot"),
+    "daemon": ("live_daemon", "Warm live process running cycles on a market-hours schedule"),
+    "stream": ("streaming", "Tick-driven live mode: --live (Kite WebSocket) or --replay ticks.csv"),
+    "backtest": ("stratergy", "Manual backtest: --capital --start --end"),
+    "sweep": ("sweep", "Parallel parameter sweep over run_backtest"),
+    "monte-carlo": ("monte_carlo", "Block-bootstrap Monte Carlo: CAGR / value / drawdown distributions"),
+    "charges": ("tax_on_log", "Estimate taxes and charges for portfolio logs"),
+    "token": ("generate_token", "Generate a Zerodha access token (--redirect-url for no prompt)"),
+}
+
+def usage() -> str:
+    lines = ["usage: assetsync <command> [options]", "", "commands:"]
+    lines += [f"  {name:<12} {summary}" for name, (_, summary) in COMMANDS.items()]
+    lines += ["", "Run 'assetsync <command> --help' for a command's options."]
+    return "\n".join(lines)
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or argv[0] in ("-h", "--help", "help"):
+        print(usage())
+        return 0
+    command, rest = argv[0], argv[1:]
+    if command not in COMMANDS:
+        print(f"assetsync: unknown command '{command}'\n\n{usage()}", file=sys.stderr)
+        return 2
+    if any(arg in ("-h", "--help") for arg in rest):
+        from cli_args import PARSERS
+        PARSERS[command]().parse_args(rest)  # prints the help and exits
+    module = importlib.import_module(COMMANDS[command][0])
+    return module.main(rest)
+
+if __name__ == "__main__":
+    sys.exit(main())
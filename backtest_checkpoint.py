@@ -0,0 +1,87 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from ledger import PositionBook
+
+# Simulation checkpoint for run_backtest: the loop state after the last
+# processed date, so a rerun after data_fetch.py appends new closes only
+# simulates the new dates. One JSON file per output suffix:
+#   key          capital, start date, rules, CSV / membership paths
+#   rows, last_date
+#   history      sha1 of the symbols, dates, prices and deviations of the
+#                processed rows; any edit to earlier history changes it
+#   log          size and mtime of the trade log the state was written with
+#   cash, positions [[stock, qty, cost]], realized_pnl [[stock, pnl]]
+#                (lists keep the engine's insertion order)
+# The indicator window state is the trailing rows of that history:
+# indicators are recomputed over the whole range (one vectorized pass,
+# indicators.py), which keeps the resumed deviations bit-identical to a
+# full run.
+
+CHECKPOINT_VERSION = 1
+
+def checkpoint_path_for(output_suffix: str) -> str:
+    return f"Output files/checkpoint_{output_suffix}.json"
+
+def history_digest(dates, symbols, prices, deviation, rows: int) -> str:
+    digest = hashlib.sha1(json.dumps(list(map(str, symbols))).encode())
+    digest.update(np.asarray(dates[:rows], dtype="datetime64[D]").tobytes())
+    digest.update(np.ascontiguousarray(prices[:rows], dtype=np.float64).tobytes())
+    digest.update(np.ascontiguousarray(deviation[:rows], dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+def _log_stamp(log_path: str):
+    try:
+        st = os.stat(log_path)
+        return [st.st_size, st.st_mtime_ns]
+    except OSError:
+        return None
+
+def save_checkpoint(path: str, key: dict, dates, symbols, prices, deviation, state, log_path: str):
+    cash, holdings, realized_pnl_log = state
+    rows = len(dates)
+    checkpoint = {
+        "version": CHECKPOINT_VERSION,
+        "key": key,
+        "rows": rows,
+        "last_date": str(np.datetime64(dates[-1], "D")) if rows else None,
+        "history": history_digest(dates, symbols, prices, deviation, rows),
+        "log": _log_stamp(log_path),
+        "cash": cash if isinstance(cash, int) else float(cash),
+        "positions": [[stock, float(holdings[stock].qty), float(holdings[stock].cost)] for stock in holdings],
+        "realized_pnl": [[stock, float(pnl)] for stock, pnl in realized_pnl_log.items()],
+    }
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp, path)
+    return path
+
+def load_checkpoint(path: str, key: dict, dates, symbols, prices, deviation, log_path: str):
+    # (rows, (cash, holdings, realized_pnl_log)) to resume from, or None when
+    # the checkpoint is missing or no longer matches the history, rules or log
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return None
+    rows = checkpoint.get("rows", -1)
+    if (checkpoint.get("version") != CHECKPOINT_VERSION or checkpoint.get("key") != key
+            or not 0 < rows <= len(dates) or checkpoint.get("log") != _log_stamp(log_path)
+            or checkpoint.get("history") != history_digest(dates, symbols, prices, deviation, rows)):
+        return None
+    holdings = PositionBook()
+    for stock, qty, cost in checkpoint["positions"]:
+        holdings.add(stock, 0.0, 0.0)
+        holdings[stock].qty, holdings[stock].cost = qty, cost
+    realized_pnl_log = dict(checkpoint["realized_pnl"])
+    return rows, (checkpoint["cash"], holdings, realized_pnl_log)
+
+def discard_checkpoint(path: str):
+    if os.path.exists(path):
+        os.remove(path)
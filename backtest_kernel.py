@@ -0,0 +1,271 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from indicators import indicator_matrix, signal_deviation
+from ledger import PositionBook
+from mul_stratergy_per_capital import (
+    CSV_PATH, AVG_THRESHOLD, SELL_THRESHOLD, TOP_N, MAX_BUYS, UNIT_DIVISOR, date_mask, summarize,
+)
+from membership import exclude_non_members, membership_mask
+from price_store import PRICE_DECIMALS, load_prices, to_float64
+from trade_log import TradeLogWriter, BACKTEST_LOG_COLUMNS
+
+try:
+    from numba import njit
+except ImportError:  # plain NumPy fallback
+    njit = None
+
+BUY, AVERAGE, SELL = 0, 1, 2
+ACTION_NAMES = ["BUY", "AVERAGE", "SELL"]
+DMA_BLOCK = 256      # symbols per rolling-DMA block in the universe path
+RANK_CHUNK = 512     # days per argpartition chunk in top-k ranking
+
+# === Faller ranking ===
+def _sort_row(deviation_row, valid_row):
+    # pandas' sort_values: quicksort over the non-NaN values in column order
+    columns = np.nonzero(valid_row)[0]
+    return columns[np.argsort(deviation_row[columns], kind="quicksort")]
+
+def rank_fallers(deviation, top_k: int = None):
+    # Per-day ranking of deviations (most negative first) and the number of
+    # non-NaN entries. With top_k, only the k best columns per day are kept:
+    # one vectorized argpartition over all days, then the k (+1) survivors
+    # are ordered, a chunk of days at a time to bound temporaries. Rows
+    # where equal values touch the top k (day one of a window, where every
+    # deviation is 0) are ranked with the full sort, so ties resolve exactly
+    # as in the loop engine.
+    valid = ~np.isnan(deviation)
+    n_valid = valid.sum(axis=1)
+    n_days, n_cols = deviation.shape
+
+    if top_k is None or top_k + 1 >= n_cols:
+        order = np.argsort(deviation, axis=1, kind="quicksort")
+        for i in np.nonzero(n_valid < n_cols)[0]:
+            ranked = _sort_row(deviation[i], valid[i])
+            order[i, :len(ranked)] = ranked
+        return order, n_valid
+
+    order = np.empty((n_days, top_k), dtype=np.int64)
+    for r in range(0, n_days, RANK_CHUNK):
+        filled = np.where(valid[r:r + RANK_CHUNK], deviation[r:r + RANK_CHUNK], np.inf)
+        part = np.sort(np.argpartition(filled, top_k, axis=1)[:, :top_k + 1], axis=1)
+        values = np.take_along_axis(filled, part, axis=1)
+        by_value = np.argsort(values, axis=1, kind="stable")
+        part = np.take_along_axis(part, by_value, axis=1)
+        values = np.take_along_axis(values, by_value, axis=1)
+        tied = ((values[:, 1:] == values[:, :-1]) & np.isfinite(values[:, 1:])).any(axis=1)
+        order[r:r + RANK_CHUNK] = part[:, :top_k]
+        for i in r + np.nonzero(tied)[0]:
+            ranked = _sort_row(deviation[i], valid[i])[:top_k]
+            order[i, :len(ranked)] = ranked
+    return order, n_valid
+
+def deviation_matrix(prices, window: int = 20, block: int = DMA_BLOCK, signal: str = None) -> np.ndarray:
+    # (price - dma) / dma (or `signal`'s deviation) from the float32 store, a
+    # block of symbols at a time. The indicators run column by column, so
+    # this matches compute_indicator_matrices while only one block is ever
+    # held in float64; blocks are not cached, which would defeat that.
+    signal = signal or f"sma{window}"
+    deviation = np.empty(prices.shape)
+    for c in range(0, prices.shape[1], block):
+        block_prices = to_float64(prices[:, c:c + block])
+        values = indicator_matrix(pd.DataFrame(block_prices), signal)
+        deviation[:, c:c + block] = signal_deviation(block_prices, values, signal)
+    return deviation
+
+# === Kernel ===
+# Same rules as mul_stratergy_per_capital.simulate, on integer-indexed
+# arrays only. Positions are held as qty/cost vectors; `open_ids` lists the
+# held columns in the order they were opened, so the averaging and sell
+# checks are vector operations over open positions only and follow the
+# loop engine's dict insertion order. `name_rank` reproduces its tie-break
+# on stock names. Prices may be the float32 store; rows are widened and
+# rounded to the quoted precision as they are read.
+def _kernel(prices, order, n_valid, capital, unit_allocation, avg_threshold, sell_threshold,
+            top_n, max_buys, name_rank, round_prices):
+    n_days, n_stocks = prices.shape
+    qty = np.zeros(n_stocks)
+    cost = np.zeros(n_stocks)
+    held = np.zeros(n_stocks, dtype=np.bool_)
+    open_ids = np.empty(n_stocks, dtype=np.int64)
+    n_open = 0
+    realized = np.zeros(n_stocks)
+    first_sell = np.full(n_stocks, -1, dtype=np.int64)
+    cash = capital
+
+    # Buys a day stop at max_buys, or at top_n when max_buys < 1 (the loop
+    # engine's counter never equals it); plus one average and one sell
+    max_trades = n_days * (min(max_buys if max_buys > 0 else top_n, n_stocks) + 2)
+    t_day = np.empty(max_trades, dtype=np.int64)
+    t_action = np.empty(max_trades, dtype=np.int64)
+    t_stock = np.empty(max_trades, dtype=np.int64)
+    t_price = np.empty(max_trades)
+    t_qty = np.empty(max_trades)
+    t_pnl = np.empty(max_trades)
+    n_trades = 0
+
+    for i in range(n_days):
+        price_row = prices[i].astype(np.float64)
+        if round_prices:
+            price_row = np.round(price_row, PRICE_DECIMALS)
+
+        # Entry: top_n fallers by deviation
+        buy_count = 0
+        for k in range(min(top_n, n_valid[i])):
+            j = order[i, k]
+            if held[j]:
+                continue
+            price = price_row[j]
+            if cash >= unit_allocation:
+                q = unit_allocation // price
+                if q != 0:
+                    cash -= q * price
+                    qty[j] = q
+                    cost[j] = 0.0 + price * q
+                    held[j] = True
+                    open_ids[n_open] = j
+                    n_open += 1
+                    t_day[n_trades], t_action[n_trades], t_stock[n_trades] = i, BUY, j
+                    t_price[n_trades], t_qty[n_trades], t_pnl[n_trades] = price, q, 0.0
+                    n_trades += 1
+            buy_count += 1  # counts attempts, as the loop engine does
+            if buy_count == max_buys:
+                break
+
+        # Averaging: largest drop below avg_threshold (ties: larger name).
+        # Choosing a candidate has no side effects, so skip it without cash.
+        if buy_count == 0 and n_open > 0 and cash >= unit_allocation:
+            ids = open_ids[:n_open]
+            held_prices = price_row[ids]
+            avg = cost[ids] / qty[ids]
+            below = held_prices < avg_threshold * avg  # NaN prices compare False
+            if below.any():
+                drops = np.where(below, avg - held_prices, -np.inf)
+                best_drop = drops.max()
+                best = -1
+                for k in np.nonzero(drops == best_drop)[0]:
+                    if best < 0 or name_rank[ids[k]] > name_rank[best]:
+                        best = ids[k]
+                price = price_row[best]
+                q = unit_allocation // price
+                if q != 0:
+                    cash -= q * price
+                    qty[best] += q
+                    cost[best] += price * q
+                    t_day[n_trades], t_action[n_trades], t_stock[n_trades] = i, AVERAGE, best
+                    t_price[n_trades], t_qty[n_trades], t_pnl[n_trades] = price, q, 0.0
+                    n_trades += 1
+
+        # Exit: first position (in opening order) at or above sell_threshold
+        if n_open > 0:
+            ids = open_ids[:n_open]
+            hits = np.nonzero(price_row[ids] >= sell_threshold * (cost[ids] / qty[ids]))[0]
+            if hits.shape[0] > 0:
+                k = hits[0]
+                sell = ids[k]
+                open_ids[k:n_open - 1] = open_ids[k + 1:n_open].copy()
+                n_open -= 1
+                price = price_row[sell]
+                avg = cost[sell] / qty[sell]
+                proceeds = price * qty[sell]
+                pnl = proceeds - (avg * qty[sell])
+                cash += proceeds
+                realized[sell] += pnl
+                if first_sell[sell] < 0:
+                    first_sell[sell] = n_trades
+                t_day[n_trades], t_action[n_trades], t_stock[n_trades] = i, SELL, sell
+                t_price[n_trades], t_qty[n_trades], t_pnl[n_trades] = price, qty[sell], pnl
+                n_trades += 1
+                held[sell] = False
+                qty[sell] = 0.0
+                cost[sell] = 0.0
+
+    trades = (t_day[:n_trades], t_action[:n_trades], t_stock[:n_trades],
+              t_price[:n_trades], t_qty[:n_trades], t_pnl[:n_trades])
+    return cash, qty, cost, open_ids[:n_open], realized, first_sell, trades
+
+kernel = njit(cache=True)(_kernel) if njit else _kernel
+
+def run_kernel(symbols, prices, deviation, capital: float,
+               avg_threshold: float = AVG_THRESHOLD, sell_threshold: float = SELL_THRESHOLD,
+               top_n: int = TOP_N, max_buys: int = MAX_BUYS, unit_divisor: float = UNIT_DIVISOR, ranking=None):
+    # Raw kernel output: (cash, qty, cost, open_ids, realized, first_sell, trades).
+    # ranking: precomputed rank_fallers(deviation, top_n), if the caller has it.
+    # float32 prices (the store's usual dtype) are rounded per row inside the kernel.
+    name_rank = np.argsort(np.argsort(np.array(list(symbols), dtype=object))).astype(np.int64)
+    order, n_valid = ranking if ranking is not None else rank_fallers(np.asarray(deviation, dtype=np.float64), top_n)
+    prices = np.asarray(prices)
+    round_prices = prices.dtype != np.float64
+    if round_prices:
+        prices = np.ascontiguousarray(prices, dtype=np.float32)
+    return kernel(np.ascontiguousarray(prices), np.ascontiguousarray(order), np.ascontiguousarray(n_valid),
+                  float(capital), capital / unit_divisor, avg_threshold, sell_threshold, top_n, max_buys,
+                  name_rank, round_prices)
+
+def collect_results(dates, symbols, capital, kernel_output, actions_log=None):
+    # Kernel arrays -> the loop engine's (cash, holdings, actions_log, realized_pnl_log)
+    cash, qty, cost, open_ids, realized, first_sell, trades = kernel_output
+    actions_log = [] if actions_log is None else actions_log
+    date_strings = dates.strftime("%Y-%m-%d")
+    for day, action, j, price, q, pnl in zip(*trades):
+        actions_log.append([date_strings[day], ACTION_NAMES[action], symbols[j], np.float64(price), np.float64(q),
+                            round(float(pnl), 2) if action == SELL else ""])
+
+    holdings = PositionBook()
+    for j in open_ids:
+        holdings.add(symbols[j], 0.0, 0.0)
+        holdings[symbols[j]].qty, holdings[symbols[j]].cost = np.float64(qty[j]), np.float64(cost[j])
+    realized_pnl_log = {symbols[j]: np.float64(realized[j])
+                        for j in sorted(np.nonzero(first_sell >= 0)[0], key=lambda j: first_sell[j])}
+    # Cash stays an int capital until the first fill, then float64 like the loop engine
+    return (np.float64(cash) if len(trades[0]) else capital), holdings, actions_log, realized_pnl_log
+
+def simulate_kernel(dates, symbols, prices, deviation, capital: float,
+                    avg_threshold: float = AVG_THRESHOLD, sell_threshold: float = SELL_THRESHOLD,
+                    top_n: int = TOP_N, max_buys: int = MAX_BUYS, unit_divisor: float = UNIT_DIVISOR,
+                    actions_log=None):
+    # Drop-in for mul_stratergy_per_capital.simulate: same arguments, same
+    # (cash, holdings, actions_log, realized_pnl_log) result.
+    symbols = list(symbols)
+    output = run_kernel(symbols, prices, deviation, capital, avg_threshold, sell_threshold, top_n, max_buys, unit_divisor)
+    return collect_results(dates, symbols, capital, output, actions_log)
+
+# === Large-universe backtest ===
+def run_universe_backtest(capital: float, start_date: str, end_date: str, output_suffix: str = "",
+                          avg_threshold: float = AVG_THRESHOLD, sell_threshold: float = SELL_THRESHOLD,
+                          top_n: int = TOP_N, max_buys: int = MAX_BUYS, unit_divisor: float = UNIT_DIVISOR,
+                          csv_path: str = CSV_PATH, window: int = 20, membership_path: str = None,
+                          signal: str = None):
+    # run_backtest for 500-2,000+ symbols, with the same outputs. Prices stay
+    # as the memory-mapped store; only the deviation matrix is built
+    # in float64, and it is dropped once the top_n ranking is taken.
+    matrix = load_prices(csv_path)
+    rows = np.nonzero(date_mask(matrix.index, start_date, end_date))[0]
+    a, b = rows[0], rows[-1] + 1
+    prices = matrix.prices[a:b]
+    dates = matrix.index[a:b]
+    symbols = list(matrix.symbols)
+
+    deviation = deviation_matrix(prices, window, signal=signal)
+    deviation = exclude_non_members(deviation, membership_mask(membership_path, dates, symbols))
+    ranking = rank_fallers(deviation, top_n)
+    del deviation
+    output = run_kernel(symbols, prices, None, capital, avg_threshold, sell_threshold, top_n, max_buys,
+                        unit_divisor, ranking=ranking)
+
+    os.makedirs("Output files", exist_ok=True)
+    with TradeLogWriter(f"Output files/portfolio_log_{output_suffix}.csv", BACKTEST_LOG_COLUMNS,
+                        flush_every=1000, truncate=True) as log:
+        cash, holdings, _, realized_pnl_log = collect_results(dates, symbols, capital, output, log)
+    summary_df, final_value, cagr = summarize(
+        symbols, to_float64(prices[-1]), cash, holdings, realized_pnl_log, capital, start_date, end_date)
+
+    summary_df.to_csv(f"Output files/final_result_{output_suffix}.csv", index=False)
+
+    return {
+        "Capital": capital,
+        "Final Value": round(final_value, 2),
+        "CAGR": f"{cagr*100:.2f}%"
+    }
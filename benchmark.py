@@ -0,0 +1,216 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from backtest_kernel import run_universe_backtest
+from ledger import PortfolioLedger
+from mul_stratergy_per_capital import compute_indicator_matrices, run_backtest
+from price_store import convert_csv, load_price_frame, store_path_for
+from quotes import QuoteSnapshot
+from synthetic_market import generate_market
+from tax_on_log import compute_charges
+from trade_log import TradeLogWriter, LIVE_LOG_COLUMNS
+
+# Times each stage of the pipeline on seeded synthetic markets of growing
+# universe size and history length, and stores the results as JSON so runs
+# can be compared over time (--compare).
+BENCHMARKS = ["load_csv", "load_store", "dma", "backtest_loop", "backtest_kernel", "backtest_universe", "charges",
+              "live_decision"]
+SCALING_SYMBOLS = [50, 250, 500, 1000, 2000]
+SCALING_BENCHMARKS = ["backtest_kernel", "backtest_universe"]
+WORK_DIR = "Output files/benchmarks"
+BENCH_CAPITAL = 3000000
+LIVE_HOLDINGS = 20  # open positions in the stubbed live run
+
+def _timed(fn, repeat: int, setup=None):
+    # setup() runs untimed before each repeat and its result is passed to fn
+    seconds = []
+    for _ in range(repeat):
+        args = setup() if setup else ()
+        started = time.perf_counter()
+        fn(*args)
+        seconds.append(time.perf_counter() - started)
+    return {"best_s": min(seconds), "median_s": statistics.median(seconds), "repeat": repeat}
+
+def _peak_memory(fn):
+    # One extra, untimed run under tracemalloc (numpy reports its buffers)
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+@contextlib.contextmanager
+def _in_dir(path):
+    # run_backtest writes to "Output files/" relative to the working directory
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+def _stub_snapshot(df: pd.DataFrame, rng) -> QuoteSnapshot:
+    # NSE/BSE quotes a little either side of the last close
+    last = df.ffill().iloc[-1].dropna()
+    quotes = {}
+    for exchange in ("NSE", "BSE"):
+        moves = rng.normal(0.0, 0.01, len(last))
+        quotes.update({(symbol, exchange): round(float(price) * (1 + move), 2)
+                       for symbol, price, move in zip(last.index, last.to_numpy(), moves)})
+    return QuoteSnapshot(quotes)
+
+def _stub_ledger(snapshot: QuoteSnapshot, symbols, rng) -> PortfolioLedger:
+    held = rng.choice(symbols, size=min(LIVE_HOLDINGS, len(symbols)), replace=False)
+    rows = [[s, int(rng.integers(5, 50)), round(snapshot.price(s, "NSE") * rng.uniform(0.9, 1.1), 2), "NSE"]
+            for s in held]
+    ledger = PortfolioLedger.from_frame(pd.DataFrame(rows, columns=["Stock", "Qty", "Avg Buy Price", "Exchange"]))
+    ledger.mark_all(snapshot.price)
+    return ledger
+
+def bench_case(n_symbols: int, years: float, seed: int = 0, repeat: int = 3, only=None, work_dir: str = WORK_DIR,
+               memory: bool = False):
+    import final_script  # decision path only; Zerodha is never contacted
+
+    only = set(only or BENCHMARKS)
+    work_dir = os.path.abspath(work_dir)
+    csv_path = os.path.join(work_dir, f"synthetic_{n_symbols}x{years:g}_s{seed}.csv")
+    if not os.path.exists(csv_path):
+        generate_market(csv_path, n_symbols, years, seed)
+    df = load_price_frame(csv_path)
+    start, end = df.index[0].strftime("%Y-%m-%d"), df.index[-1].strftime("%Y-%m-%d")
+    results = {}
+
+    if "load_csv" in only:
+        results["load_csv"] = _timed(lambda: convert_csv(csv_path), repeat)
+    if "load_store" in only:
+        results["load_store"] = _timed(lambda: load_price_frame(store_path_for(csv_path), cache=False),
+                                          repeat)
+    if "dma" in only:
+        results["dma"] = _timed(lambda: compute_indicator_matrices(df, cache=None), repeat)
+    backtests = {
+        "backtest_loop": lambda: run_backtest(BENCH_CAPITAL, start, end, "bench_loop", csv_path=csv_path,
+                                              checkpoint=False, indicator_cache=None),
+        "backtest_kernel": lambda: run_backtest(BENCH_CAPITAL, start, end, "bench_kernel", csv_path=csv_path,
+                                                engine="kernel", checkpoint=False, indicator_cache=None),
+        "backtest_universe": lambda: run_universe_backtest(BENCH_CAPITAL, start, end, "bench_universe",
+                                                           csv_path=csv_path),
+    }
+    with _in_dir(work_dir):
+        for name, backtest in backtests.items():
+            if name in only:
+                results[name] = _timed(backtest, repeat)
+                if memory:
+                    results[name]["peak_bytes"] = _peak_memory(backtest)
+    if "charges" in only:
+        log_path = os.path.join(work_dir, "Output files", "portfolio_log_bench_kernel.csv")
+        if not os.path.exists(log_path):
+            with _in_dir(work_dir), contextlib.redirect_stdout(io.StringIO()):
+                run_backtest(BENCH_CAPITAL, start, end, "bench_kernel", csv_path=csv_path, engine="kernel",
+                             checkpoint=False)
+        log = pd.read_csv(log_path)
+        results["charges"] = _timed(lambda: compute_charges(log), repeat)
+        results["charges"]["rows"] = len(log)
+    if "live_decision" in only:
+        rng = np.random.default_rng(seed)
+        snapshot = _stub_snapshot(df, rng)
+        universe = set(df.columns)
+        log_path = os.path.join(work_dir, "bench_live_log.csv")
+
+        def setup():
+            trade_log = TradeLogWriter(log_path, LIVE_LOG_COLUMNS, flush_every=None, truncate=True)
+            return _stub_ledger(snapshot, list(universe), rng), trade_log
+
+        def decide(ledger, trade_log):
+            with contextlib.redirect_stdout(io.StringIO()):
+                final_script.run_strategy(df, universe, ledger, snapshot, trade_log, final_script.CAPITAL, end)
+
+        results["live_decision"] = _timed(decide, repeat, setup)
+
+    return {"symbols": n_symbols, "years": years, "days": len(df), "seed": seed, "results": results}
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _environment():
+    try:
+        import numba
+        numba_version = numba.__version__
+    except ImportError:
+        numba_version = None
+    return {"python": platform.python_version(), "numpy": np.__version__, "pandas": pd.__version__,
+            "numba": numba_version, "machine": platform.machine(), "cpus": os.cpu_count()}
+
+def run_suite(symbol_counts, year_counts, seed: int = 0, repeat: int = 3, only=None, work_dir: str = WORK_DIR,
+              memory: bool = False):
+    cases = []
+    for n_symbols in symbol_counts:
+        for years in year_counts:
+            print(f"⏱️ {n_symbols} symbols × {years:g} years...")
+            case = bench_case(n_symbols, years, seed, repeat, only, work_dir, memory)
+            for name, timing in case["results"].items():
+                peak = f"   peak {timing['peak_bytes'] / 2**20:8.1f} MiB" if "peak_bytes" in timing else ""
+                print(f"   {name:<18} best {timing['best_s'] * 1e3:10.2f} ms   "
+                      f"median {timing['median_s'] * 1e3:10.2f} ms{peak}")
+            cases.append(case)
+    return {"timestamp": datetime.now().isoformat(timespec="seconds"), "commit": _git_commit(),
+            "environment": _environment(), "cases": cases}
+
+def compare(current: dict, baseline: dict) -> pd.DataFrame:
+    # Speedup of `current` over `baseline` (>1 is faster) per case and benchmark
+    def flatten(report):
+        return {(c["symbols"], c["years"], name): t["best_s"]
+                for c in report["cases"] for name, t in c["results"].items()}
+    now, before = flatten(current), flatten(baseline)
+    rows = [[*key, before[key] * 1e3, now[key] * 1e3, before[key] / now[key]] for key in now if key in before]
+    return pd.DataFrame(rows, columns=["Symbols", "Years", "Benchmark", "Baseline ms", "Current ms", "Speedup"])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark loading, indicators, backtest, charges and live decisions.")
+    parser.add_argument("--symbols", type=int, nargs="+", default=[50, 500], help="Universe sizes (50 to 2000)")
+    parser.add_argument("--years", type=float, nargs="+", default=[1, 10], help="History lengths (1 to 30)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, help="Run a subset of the benchmarks")
+    parser.add_argument("--memory", action="store_true", help="Also record peak traced memory of each backtest")
+    parser.add_argument("--scaling", action="store_true",
+                        help=f"Universe scaling run: {SCALING_SYMBOLS} symbols x 10 years, kernel backtests, with memory")
+    parser.add_argument("--work-dir", default=WORK_DIR, help="Synthetic CSVs and backtest outputs go here")
+    parser.add_argument("--output", default=None, help="Results JSON (default: <work-dir>/bench_<timestamp>.json)")
+    parser.add_argument("--compare", default=None, metavar="BASELINE_JSON", help="Print speedups against an earlier run")
+    args = parser.parse_args(argv)
+
+    if args.scaling:
+        args.symbols, args.years, args.memory = SCALING_SYMBOLS, [10], True
+        args.only = args.only or SCALING_BENCHMARKS
+
+    os.makedirs(args.work_dir, exist_ok=True)
+    report = run_suite(args.symbols, args.years, args.seed, args.repeat, args.only, args.work_dir, args.memory)
+    output = args.output or os.path.join(args.work_dir, f"bench_{datetime.now():%Y%m%d_%H%M%S}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✅ Results saved to '{output}'")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(compare(report, baseline).round(3).to_string(index=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import argparse
+
+from market_cache import CACHE_DIR
+
+# Argument parsers for the assetsync subcommands, importable without pandas
+# or the tools themselves, so `assetsync <command> --help` stays fast. Each
+# tool's main() builds its parser here and fills in the defaults that live
+# next to its own code with parser.set_defaults (help texts don't print
+# defaults, so nothing heavy is needed to show them).
+
+def _add_cache_arguments(parser, no_cache_help: str):
+    parser.add_argument("--offline", action="store_true",
+                        help="Quotes from the market-data cache only; skip Zerodha and use the saved holdings")
+    parser.add_argument("--no-cache", action="store_true", help=no_cache_help)
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+
+def _add_metrics_argument(parser, help: str):
+    parser.add_argument("--metrics", nargs="?", const="", default=None, metavar="PATH", help=help)
+
+def parse_window(text):
+    start, _, end = text.partition(":")
+    if not start or not end:
+        raise argparse.ArgumentTypeError(f"Window must be START:END (YYYY-MM-DD:YYYY-MM-DD), got '{text}'")
+    return start, end
+
+# === One parser per subcommand ===
+def fetch_parser():
+    parser = argparse.ArgumentParser(description="Append new Nifty 50 daily closes to the price store.")
+    parser.add_argument("--output", help="CSV path whose .store directory is updated")
+    parser.add_argument("--export-csv", action="store_true", help="Also rewrite the wide CSV from the store")
+    parser.add_argument("--membership", default=None, metavar="STORE_DIR",
+                        help="Record today's Nifty 50 list in this membership store (see membership.py)")
+    parser.add_argument("--offline", action="store_true", help="Serve everything from the market-data cache")
+    parser.add_argument("--no-cache", action="store_true", help="Always hit Yahoo / niftyindices directly")
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    return parser
+
+def live_parser():
+    parser = argparse.ArgumentParser(description="Run one live pass of the 20-DMA strategy on Zerodha.")
+    _add_metrics_argument(parser, "Record phase timings and call latencies (default file: live_metrics_<timestamp>.json)")
+    parser.add_argument("--trace-memory", action="store_true", help="With --metrics, also record peak memory (tracemalloc)")
+    _add_cache_arguments(parser, "Always fetch fresh quotes from Yahoo")
+    parser.add_argument("--save", choices=["ask", "yes", "no"], default="ask",
+                        help="Save the log and holdings without prompting ('ask' is treated as 'no' without a terminal)")
+    return parser
+
+def live_multi_parser():
+    parser = argparse.ArgumentParser(description="One live pass of the 20-DMA strategy for several portfolios "
+                                                 "sharing one market snapshot.")
+    parser.add_argument("--config", help="Portfolios config (JSON)")
+    _add_metrics_argument(parser, "Record phase timings and call latencies (default file: live_metrics_<timestamp>.json)")
+    _add_cache_arguments(parser, "Always fetch fresh quotes from Yahoo")
+    parser.add_argument("--save", choices=["ask", "yes", "no"], default="ask",
+                        help="Save every portfolio's log and holdings without prompting "
+                             "('ask' is treated as 'no' without a terminal)")
+    return parser
+
+def daemon_parser():
+    parser = argparse.ArgumentParser(description="Keep the live strategy warm and run it on a market-hours schedule.")
+    parser.add_argument("--config", default=None,
+                        help="Portfolios config (JSON, see multi_portfolio.py); default: the final_script.py portfolio")
+    parser.add_argument("--from", dest="run_from", help="First cycle of the day (HH:MM, IST)")
+    parser.add_argument("--until", help="Last cycle of the day (HH:MM, IST)")
+    parser.add_argument("--interval", type=float, help="Seconds between cycles")
+    parser.add_argument("--holidays", default=None, help="File of market holidays, one YYYY-MM-DD per line")
+    parser.add_argument("--once", action="store_true", help="Run one cycle now, ignoring the schedule")
+    parser.add_argument("--max-cycles", type=int, default=None)
+    parser.add_argument("--verbose", action="store_true", help="Print the price and 20DMA of every stock each cycle")
+    _add_metrics_argument(parser, "Record phase timings and call latencies across all cycles, written on exit")
+    _add_cache_arguments(parser, "Always fetch fresh quotes from Yahoo")
+    return parser
+
+def backtest_parser():
+    parser = argparse.ArgumentParser(description="Manual backtest of the 20-DMA strategy over one date range.")
+    parser.add_argument("--capital", type=float, default=None, help="Total capital")
+    parser.add_argument("--start", default=None, help="Start date (YYYY-MM-DD)")
+    parser.add_argument("--end", default=None, help="End date (YYYY-MM-DD)")
+    parser.add_argument("--csv")
+    parser.add_argument("--engine", choices=["loop", "kernel"], default="loop")
+    return parser
+
+def sweep_parser():
+    parser = argparse.ArgumentParser(description="Run a parallel parameter sweep over run_backtest.")
+    parser.add_argument("--capital", type=float, nargs="+", required=True)
+    parser.add_argument("--window", type=parse_window, nargs="+", required=True, help="START:END date windows")
+    parser.add_argument("--avg-threshold", type=float, nargs="+")
+    parser.add_argument("--sell-threshold", type=float, nargs="+")
+    parser.add_argument("--top-n", type=int, nargs="+")
+    parser.add_argument("--max-buys", type=int, nargs="+")
+    parser.add_argument("--unit-divisor", type=float, nargs="+")
+    parser.add_argument("--signal", nargs="+",
+                        help="Indicators to rank fallers against, e.g. sma20 sma50 ema20 drawdown252")
+    parser.add_argument("--csv")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", default="Output files/sweep_results.csv")
+    parser.add_argument("--engine", choices=["loop", "kernel"], default="loop",
+                        help="'kernel' runs the array backtest kernel (Numba-compiled if installed)")
+    parser.add_argument("--membership", default=None,
+                        help="Index membership history (Symbol,Start,End CSV or .members store)")
+    parser.add_argument("--cache-dir", default=None,
+                        help="Also keep computed indicators on disk here (e.g. .market_cache) for later sweeps")
+    return parser
+
+def monte_carlo_parser():
+    parser = argparse.ArgumentParser(description="Block-bootstrap Monte Carlo of the strategy over resampled price paths.")
+    parser.add_argument("--capital", type=float, required=True)
+    parser.add_argument("--paths", type=int, default=10000)
+    parser.add_argument("--years", type=float, default=10, help="Length of each path")
+    parser.add_argument("--block", type=int, help="Bootstrap block length in trading days")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=1, help="Processes to spread chunks of paths over")
+    parser.add_argument("--chunk", type=int, help="Paths simulated together per task")
+    parser.add_argument("--start", default=None, help="First date of the history to resample")
+    parser.add_argument("--end", default=None, help="Last date of the history to resample")
+    parser.add_argument("--avg-threshold", type=float)
+    parser.add_argument("--sell-threshold", type=float)
+    parser.add_argument("--top-n", type=int)
+    parser.add_argument("--max-buys", type=int)
+    parser.add_argument("--unit-divisor", type=float)
+    parser.add_argument("--csv")
+    parser.add_argument("--output", default="Output files/monte_carlo_results.csv")
+    return parser
+
+def charges_parser():
+    parser = argparse.ArgumentParser(description="Estimate taxes and charges for portfolio logs.")
+    parser.add_argument("--log", help="Single log to cost (default mode)")
+    parser.add_argument("--output")
+    parser.add_argument("--batch", nargs="+", metavar="GLOB",
+                        help="Cost many logs, e.g. 'Output files/portfolio_log_*.csv'; writes charges_summary_<run>.csv per log")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunksize", type=int)
+    parser.add_argument("--detail", action="store_true", help="Batch mode: also write per-transaction portfolio_charges_<run>.csv")
+    return parser
+
+def token_parser():
+    parser = argparse.ArgumentParser(description="Generate a Zerodha access token and save it to the .env file.")
+    parser.add_argument("--redirect-url", default=None,
+                        help="Redirect URL from the Kite login (skips the browser and the prompt)")
+    parser.add_argument("--no-browser", action="store_true", help="Print the login URL without opening it")
+    parser.add_argument("--env", help="Where to save ZERODHA_ACCESS_TOKEN")
+    return parser
+
+def stream_parser():
+    parser = argparse.ArgumentParser(description="Tick-driven streaming mode for the live strategy.")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--replay", help="Recorded ticks (CSV timestamp,symbol,price or JSONL)")
+    group.add_argument("--live", action="store_true", help="Subscribe to the Kite WebSocket feed")
+    parser.add_argument("--speed", type=float, default=None, help="Replay pacing multiplier (default: no pacing)")
+    parser.add_argument("--record", default=None, help="Append received ticks to this JSONL file")
+    parser.add_argument("--csv")
+    parser.add_argument("--holdings")
+    parser.add_argument("--capital", type=float)
+    parser.add_argument("--log")
+    return parser
+
+PARSERS = {
+    "fetch": fetch_parser,
+    "live": live_parser,
+    "live-multi": live_multi_parser,
+    "daemon": daemon_parser,
+    "backtest": backtest_parser,
+    "sweep": sweep_parser,
+    "monte-carlo": monte_carlo_parser,
+    "charges": charges_parser,
+    "token": token_parser,
+    "stream": stream_parser,
+}
@@ -1,102 +1,176 @@
-import yfinance as yf
 import pandas as pd
 from io import StringIO
-import requests
 import os
+import time
 import warnings
 import numpy as np
 from datetime import datetime, timedelta
+from cli_args import fetch_parser
+from market_cache import CACHE_DIR, CacheMiss, MarketCache, daily_kind
+from membership import record_constituents
+from price_store import (
+    PRICE_DECIMALS, store_path_for, load_prices, write_store, append_rows, add_symbols, export_csv,
+)
 
 warnings.simplefilter(action='ignore', category=FutureWarning)
 
+OUTPUT_PATH = "daily_ma_nifty50_June1.csv"
+FIRST_DATE = "2025-06-01"
+MAX_RETRIES = 3
+BACKOFF_SECONDS = 2.0  # doubled after every failed attempt
+
+# === Shared HTTP session with retry/backoff ===
+# For the niftyindices request. yfinance keeps its own (curl_cffi) session
+# and rejects a requests.Session, so price downloads retry in download_closes.
+_session = None
+
+def get_session():
+    global _session
+    if _session is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+        retry = Retry(total=MAX_RETRIES, backoff_factor=BACKOFF_SECONDS,
+                      status_forcelist=[429, 500, 502, 503, 504], allowed_methods=["GET"])
+        _session = requests.Session()
+        _session.headers.update({"User-Agent": "Mozilla/5.0"})
+        _session.mount("https://", HTTPAdapter(max_retries=retry))
+    return _session
+
 # === Step 1: Get Nifty 50 Tickers ===
-def get_nifty_50_symbols():
+def get_nifty_50_symbols(cache=None):
     url = "https://www.niftyindices.com/IndexConstituent/ind_nifty50list.csv"
-    headers = {"User-Agent": "Mozilla/5.0"}
-    res = requests.get(url, headers=headers, timeout=10)
-    if res.status_code == 200:
-        df = pd.read_csv(StringIO(res.text))
-        return list(df['Symbol'].str.strip().str.upper())  # only symbol, no .NS
-    else:
-        raise Exception("Failed to fetch Nifty 50 list from NSE.")
 
-# === Step 2: Get Daily Close Prices ===
-def get_daily_closing_prices(ticker, start, end):
-    try:
-        df = yf.download(ticker, start=start, end=end, interval="1d", progress=False)
-        if df.empty or "Close" not in df.columns:
-            print(f"⚠️ No data for {ticker}")
-            return None
-        close_series = df["Close"]
-        close_series.index = close_series.index.strftime("%Y-%m-%d")
-        return close_series
-    except Exception as e:
-        print(f"❌ Error fetching {ticker}: {e}")
-        return None
-
-# === Step 3: Build and Append Daily Data ===
-def append_daily_nifty_csv():
-    output_path = "daily_ma_nifty50_June1.csv"
-
-    if os.path.exists(output_path):
-        df_existing = pd.read_csv(output_path, index_col="Stock")
-        existing_dates = list(df_existing.columns)
-        last_date = max(pd.to_datetime(existing_dates))
+    def fetch():
+        res = get_session().get(url, timeout=10)
+        if res.status_code == 200:
+            df = pd.read_csv(StringIO(res.text))
+            return list(df['Symbol'].str.strip().str.upper())  # only symbol, no .NS
+        else:
+            raise Exception("Failed to fetch Nifty 50 list from NSE.")
+
+    return fetch() if cache is None else cache.fetch("constituents", ("NIFTY50", url), fetch)
+
+# === Step 2: Get Daily Close Prices (one download, with retry) ===
+# yf.download is not safe to call from several threads (its results live in
+# module globals), so every pending ticker goes into one call; threads=True
+# already downloads them in parallel inside yfinance.
+def download_closes(tickers, start, end, cache=None):
+    # Returns a date x ticker frame of closes; tickers still missing after
+    # the last retry are left out and end up as NaN. With a cache, each
+    # ticker's closes for this range are stored separately, and only the
+    # tickers not cached yet are downloaded (none at all when offline).
+    closes = pd.DataFrame()
+    pending = list(tickers)
+    kind = daily_kind(end)
+    if cache is not None:
+        cached = {}
+        for ticker in pending:
+            found, series = cache.get(kind, (ticker, "1d", "adjusted", start, end))
+            if found:
+                cached[ticker] = series
+        if cached:
+            closes = pd.DataFrame(cached)
+            pending = [t for t in pending if t not in cached]
+    attempts = MAX_RETRIES if pending and not (cache and cache.offline) else 0
+    if attempts:
+        import yfinance as yf  # only needed when something is actually downloaded
+    delay = BACKOFF_SECONDS
+    for attempt in range(attempts):
+        try:
+            # Adjusted closes, yfinance's default (which the history was fetched with)
+            df = yf.download(pending, start=start, end=end, interval="1d", progress=False,
+                             threads=True, auto_adjust=True)
+            if not df.empty and "Close" in df.columns.get_level_values(0):
+                got = df["Close"]
+                if isinstance(got, pd.Series):  # single ticker, flat columns
+                    got = got.to_frame(pending[0])
+                got = got.dropna(axis=1, how="all")
+                if cache is not None:
+                    for ticker in got.columns:
+                        cache.put(kind, (ticker, "1d", "adjusted", start, end), got[ticker])
+                closes = pd.concat([closes, got], axis=1)
+                pending = [t for t in pending if t not in got.columns]
+        except Exception as e:
+            print(f"❌ Download error ({len(pending)} tickers, attempt {attempt + 1}): {e}")
+        if not pending:
+            break
+        if attempt < MAX_RETRIES - 1:
+            time.sleep(delay)
+            delay *= 2
+    for ticker in pending:
+        print(f"⚠️ No data for {ticker}")
+    return closes
+
+def get_daily_closing_prices(tickers, start, end, cache=None):
+    return download_closes(list(tickers), start, end, cache).reindex(columns=tickers)
+
+# === Step 3: Append only the new dates to the price store ===
+def append_daily_nifty_csv(output_path=OUTPUT_PATH, export=False, membership_dir=None, cache=None):
+    store_dir = store_path_for(output_path)
+
+    if os.path.exists(output_path) or os.path.isdir(store_dir):
+        matrix = load_prices(output_path)
+        last_date = pd.Timestamp(matrix.dates[-1])
         fetch_start = (last_date + timedelta(days=1)).strftime("%Y-%m-%d")
     else:
-        df_existing = None
-        fetch_start = "2025-06-01"
+        matrix = None
+        fetch_start = FIRST_DATE
 
     fetch_end = datetime.today().strftime("%Y-%m-%d")
     print(f"\n📅 Fetching data from {fetch_start} to {fetch_end}")
 
-    symbols = get_nifty_50_symbols()
-    all_data = {}
-    all_dates = set()
-    daily_data = {}
-
-    for symbol in symbols:
-        full_symbol = f"{symbol}.NS"  # Use .NS for yfinance
-        print(f"\n📈 Fetching {full_symbol}...")
-        close_series = get_daily_closing_prices(full_symbol, start=fetch_start, end=fetch_end)
-        if close_series is not None:
-            daily_data[symbol] = close_series  # Save only the symbol
-            all_dates.update(close_series.index)
-        else:
-            daily_data[symbol] = None
-
-    sorted_dates = sorted(all_dates)
+    symbols = get_nifty_50_symbols(cache)
+    if membership_dir:
+        # Today's constituents become a new row of the membership history
+        record_constituents(membership_dir, fetch_end, symbols)
+    tickers = [f"{symbol}.NS" for symbol in symbols]  # Use .NS for yfinance
+    print(f"📈 Fetching {len(tickers)} tickers...")
+    closes = get_daily_closing_prices(tickers, start=fetch_start, end=fetch_end, cache=cache)
+    closes.columns = symbols  # Save only the symbol
+    closes = closes.dropna(how="all")
+    closes.index = pd.to_datetime(closes.index).normalize()
+    closes = closes[closes.index >= pd.Timestamp(fetch_start)].sort_index()
 
-    if not sorted_dates:
+    if closes.empty:
         print("✅ No new data to append.")
         return
 
-    for symbol in symbols:
-        series = daily_data.get(symbol)
-        if series is None:
-            all_data[symbol] = ["null"] * len(sorted_dates)
-        else:
-            series = series.reindex(sorted_dates)
-            values = series.values.flatten()
-            row = []
-            for val in values:
-                if isinstance(val, (int, float, np.integer, np.floating)):
-                    row.append(f"{val:.2f}")
-                else:
-                    row.append("null")
-            all_data[symbol] = row
-
-    df_new = pd.DataFrame.from_dict(all_data, orient="index", columns=sorted_dates)
-    df_new.index.name = "Stock"
-
-    if df_existing is not None:
-        df_combined = pd.concat([df_existing, df_new], axis=1)
+    columns = symbols
+    if matrix is not None:
+        missing = [s for s in symbols if s not in matrix.symbols]
+        if missing:
+            print(f"➕ New constituents: {', '.join(missing)}")
+            matrix = add_symbols(store_dir, missing)
+        columns = matrix.symbols
+
+    # Vectorized: round to the quoted precision, NaN stays missing
+    new_prices = np.round(closes.reindex(columns=columns).to_numpy(dtype=np.float64), PRICE_DECIMALS)
+    new_dates = closes.index.values.astype("datetime64[D]")
+
+    if matrix is None:
+        write_store(store_dir, new_prices, new_dates, columns)
     else:
-        df_combined = df_new
+        append_rows(store_dir, new_prices, new_dates)
+
+    print(f"\n✅ Appended {len(new_dates)} new date(s) to '{store_dir}'")
 
-    df_combined.to_csv(output_path)
-    print(f"\n✅ Updated CSV saved to '{output_path}'")
+    if export:
+        export_csv(store_dir, output_path)
+        print(f"✅ CSV exported to '{output_path}'")
 
 # === Run Script ===
+def main(argv=None):
+    parser = fetch_parser()
+    parser.set_defaults(output=OUTPUT_PATH)
+    args = parser.parse_args(argv)
+    cache = None if args.no_cache else MarketCache(args.cache_dir, offline=args.offline)
+    try:
+        append_daily_nifty_csv(args.output, export=args.export_csv, membership_dir=args.membership, cache=cache)
+    except CacheMiss as e:
+        print(f"❌ {e}")
+    if cache is not None:
+        print(cache.summary())
+
 if __name__ == "__main__":
-    append_daily_nifty_csv()
\ No newline at end of file
+    main()
@@ -1,18 +1,16 @@
 import os
-import yfinance as yf
+import sys
 import pandas as pd
 import numpy as np
 from datetime import datetime
-from dotenv import load_dotenv
-from kiteconnect import KiteConnect
-
-load_dotenv()
-
-# === Zerodha Setup ===
-api_key = os.getenv("ZERODHA_API_KEY")
-access_token = os.getenv("ZERODHA_ACCESS_TOKEN")
-kite = KiteConnect(api_key=api_key)
-kite.set_access_token(access_token)
+from cli_args import live_parser
+from indicators import latest_values
+from price_store import load_price_frame
+from quotes import QuoteSnapshot
+from ledger import PortfolioLedger, HOLDINGS_COLUMNS
+from trade_log import TradeLogWriter, LIVE_LOG_COLUMNS
+from instrumentation import RunMetrics, DISABLED
+from market_cache import CACHE_DIR, MarketCache
 
 # === Constants ===
 CSV_PATH = "daily_ma_nifty50_June1.csv"
@@ -20,203 +18,219 @@ LOG_PATH = "live_portfolio_log.csv"
 HOLDINGS_PATH = "current_holdings.csv"
 CAPITAL = 200000
 UNIT_ALLOCATION = CAPITAL / 40
+DMA_WINDOW = 20
 
-# === Load Nifty 50 Symbols and 20DMA ===
-nifty_50 = set(pd.read_csv(CSV_PATH, index_col="Stock").index.tolist())
-df_price = pd.read_csv(CSV_PATH, index_col="Stock").transpose()
-df_price.index = pd.to_datetime(df_price.index)
-
-# === Load Zerodha Holdings and filter for Nifty 50 ===
-try:
-    zerodha_holdings = kite.holdings()
-    df_zerodha = pd.DataFrame([{
-        "Stock": h["tradingsymbol"],
-        "Qty": h["quantity"],
-        "Avg Buy Price": h["average_price"],
-        "Exchange": None
-    } for h in zerodha_holdings if h["tradingsymbol"] in nifty_50])
-    print("\n📥 Zerodha Nifty 50 Holdings:")
-    print(df_zerodha if not df_zerodha.empty else "No holdings in Nifty 50")
-except Exception as e:
-    print("Error fetching holdings from Zerodha:", e)
-    df_zerodha = pd.DataFrame(columns=["Stock", "Qty", "Avg Buy Price", "Exchange"])
-
-# === Load previous holdings CSV and merge ===
-if os.path.exists(HOLDINGS_PATH):
-    df_prev_holdings = pd.read_csv(HOLDINGS_PATH)
-    df_holdings = pd.concat([df_prev_holdings, df_zerodha]).drop_duplicates(subset="Stock", keep="last")
-else:
-    df_holdings = df_zerodha.copy()
-    if df_holdings.empty:
-        df_holdings = pd.DataFrame(columns=["Stock", "Qty", "Avg Buy Price", "Exchange"])
-
-# === Setup Log ===
-if os.path.exists(LOG_PATH):
-    df_log = pd.read_csv(LOG_PATH)
-else:
-    df_log = pd.DataFrame(columns=["Date", "Action", "Stock", "Price", "Qty", "Exchange", "PnL", "Cash Left", "Holdings Value", "Total PnL"])
+# === Zerodha Setup ===
+# (reload_env: re-read .env over the process environment, for a token refreshed since start-up)
+def connect_kite(api_key_env: str = "ZERODHA_API_KEY", access_token_env: str = "ZERODHA_ACCESS_TOKEN",
+                 reload_env: bool = False):
+    from dotenv import load_dotenv
+    from kiteconnect import KiteConnect
+    load_dotenv(override=reload_env)
+    api_key = os.getenv(api_key_env)
+    access_token = os.getenv(access_token_env)
+    kite = KiteConnect(api_key=api_key)
+    kite.set_access_token(access_token)
+    return kite
+
+# === Load Zerodha Holdings, filter for Nifty 50 and merge with the saved CSV ===
+# (kite=None: offline, the saved CSV only)
+def fetch_zerodha_holdings(kite, nifty_50, metrics: RunMetrics = DISABLED) -> pd.DataFrame:
+    try:
+        if kite is None:
+            raise RuntimeError("offline, Zerodha not contacted")
+        with metrics.call("kite.holdings"):
+            zerodha_holdings = kite.holdings()
+        df_zerodha = pd.DataFrame([{
+            "Stock": h["tradingsymbol"],
+            "Qty": h["quantity"],
+            "Avg Buy Price": h["average_price"],
+            "Exchange": None
+        } for h in zerodha_holdings if h["tradingsymbol"] in nifty_50])
+        print("\n📥 Zerodha Nifty 50 Holdings:")
+        print(df_zerodha if not df_zerodha.empty else "No holdings in Nifty 50")
+    except Exception as e:
+        print("Error fetching holdings from Zerodha:", e)
+        df_zerodha = pd.DataFrame(columns=HOLDINGS_COLUMNS)
+    return df_zerodha
+
+def merge_holdings(df_zerodha: pd.DataFrame, holdings_path: str = HOLDINGS_PATH) -> PortfolioLedger:
+    if os.path.exists(holdings_path):
+        df_prev_holdings = pd.read_csv(holdings_path)
+        df_holdings = pd.concat([df_prev_holdings, df_zerodha]).drop_duplicates(subset="Stock", keep="last")
+    else:
+        df_holdings = df_zerodha.copy()
+        if df_holdings.empty:
+            df_holdings = pd.DataFrame(columns=HOLDINGS_COLUMNS)
+    return PortfolioLedger.from_frame(df_holdings)
+
+def load_holdings(kite, nifty_50, holdings_path: str = HOLDINGS_PATH, metrics: RunMetrics = DISABLED) -> PortfolioLedger:
+    return merge_holdings(fetch_zerodha_holdings(kite, nifty_50, metrics), holdings_path)
 
 # === Utility Functions ===
-def get_best_buy_price(symbol):
-    prices = {}
-    try:
-        nse = yf.Ticker(symbol + ".NS").history(period="1d", interval="1m")
-        if not nse.empty:
-            prices["NSE"] = float(nse.iloc[-1]['Close'])
-    except:
-        pass
-    try:
-        bse = yf.Ticker(symbol + ".BO").history(period="1d", interval="1m")
-        if not bse.empty:
-            prices["BSE"] = float(bse.iloc[-1]['Close'])
-    except:
-        pass
-    if prices:
-        best_exchange = min(prices, key=prices.get)
-        return prices[best_exchange], best_exchange
-    return None, None
-
-def get_best_sell_price(symbol, preferred_ex=None):
-    try:
-        suffix = ".NS" if preferred_ex == "NSE" else ".BO" if preferred_ex == "BSE" else ""
-        if suffix:
-            ticker = yf.Ticker(symbol + suffix).history(period="1d", interval="1m")
-            if not ticker.empty:
-                return float(ticker.iloc[-1]['Close'])
-    except:
-        pass
-    return None
-
-def compute_20dma(symbol):
-    series = df_price[symbol].replace("null", np.nan).dropna().astype(float)
-    if len(series) >= 20:
-        dma_series = series[-20:]
-        return dma_series.mean()
-    return None
-
-def update_holdings(stock, qty, price, action, exchange):
-    global df_holdings
-    existing = df_holdings[df_holdings.Stock == stock]
-    if action in ["BUY", "AVERAGE"]:
-        if not existing.empty:
-            total_qty = int(existing.iloc[0]['Qty']) + qty
-            old_price = float(existing.iloc[0]['Avg Buy Price'])
-            new_price = ((old_price * int(existing.iloc[0]['Qty'])) + (price * qty)) / total_qty
-            df_holdings.loc[df_holdings.Stock == stock, ['Qty', 'Avg Buy Price', 'Exchange']] = [total_qty, round(new_price, 2), exchange]
-        else:
-            df_holdings.loc[len(df_holdings)] = [stock, qty, price, exchange]
-    elif action == "SELL":
-        df_holdings = df_holdings[df_holdings.Stock != stock]
-
-def calculate_holdings_value():
-    value = 0
-    for _, row in df_holdings.iterrows():
-        stock = row["Stock"]
-        qty = int(row["Qty"])
-        ex = row.get("Exchange")
-        price = get_best_sell_price(stock, ex)
-        if price:
-            value += price * qty
-    return value
-
-def log_transaction(date, action, stock, price, qty, exchange, pnl, cash, holdings_val, total_value):
-    global df_log
-    df_log.loc[len(df_log)] = [date, action, stock, price, qty, exchange, pnl, cash, holdings_val, total_value]
+# The DMA is the mean of a stock's last DMA_WINDOW valid closes (None with
+# fewer), for every symbol in one pass (indicators.latest_values)
+def compute_dmas(df_price, symbols, window: int = DMA_WINDOW) -> dict:
+    symbols = list(symbols)
+    values = latest_values(df_price[symbols].to_numpy(dtype=float), f"sma{window}")
+    return {stock: (None if np.isnan(value) else float(value)) for stock, value in zip(symbols, values)}
+
+def compute_20dma(df_price, symbol):
+    return compute_dmas(df_price, [symbol])[symbol]
+
+# === Fallers: (deviation from 20DMA, stock), most fallen first ===
+# Depends only on the prices and the snapshot, not on any portfolio, so
+# several portfolios can share one list. `dmas` (from compute_dmas) skips
+# recomputing the 20DMAs when the price history has not changed.
+def find_fallers(df_price, nifty_50, snapshot: QuoteSnapshot, dmas: dict = None, verbose: bool = True) -> list:
+    top_fallers = []
+    for stock in nifty_50:
+        price, ex = snapshot.best_buy(stock)
+        dma = dmas[stock] if dmas is not None else compute_20dma(df_price, stock)
+        if price and dma:
+            deviation = (price - dma) / dma
+            top_fallers.append((deviation, stock))
+        if verbose:
+            price_str = f"{price:.2f}" if price else "N/A"
+            dma_str = f"{dma:.2f}" if dma else "N/A"
+            print(f"🔎 {stock}: Price = ₹{price_str} ({ex or 'NSE/BSE not found'}), 20DMA = ₹{dma_str}")
+    top_fallers.sort()
+    return top_fallers
+
+# === Decision pass: fallers, buy, average down, sell ===
+# Fills go to `ledger` and `trade_log`; returns the cash left. Quotes come
+# only from `snapshot`, so any QuoteSnapshot (live or stubbed) can drive it.
+# Pass `top_fallers` (from find_fallers) to reuse one scan across portfolios.
+def run_strategy(df_price, nifty_50, ledger: PortfolioLedger, snapshot: QuoteSnapshot, trade_log: TradeLogWriter,
+                 cash: float, today_str: str, unit_allocation: float = UNIT_ALLOCATION,
+                 metrics: RunMetrics = DISABLED, top_fallers: list = None) -> float:
+    def log_transaction(action, stock, price, qty, exchange, pnl):
+        holdings_val = ledger.holdings_value
+        total_val = cash + holdings_val
+        trade_log.write([today_str, action, stock, price, qty, exchange, pnl,
+                         round(cash, 2), round(holdings_val, 2), round(total_val, 2)])
+
+    # === FIND FALLERS ===
+    if top_fallers is None:
+        with metrics.phase("find_fallers"):
+            top_fallers = find_fallers(df_price, nifty_50, snapshot)
+
+    # === BUY ===
+    with metrics.phase("buy"):
+        buy_count = 0
+        for _, stock in top_fallers:
+            if buy_count >= 2:
+                break
+            if stock not in ledger:
+                price, exchange = snapshot.best_buy(stock)
+                qty = int(unit_allocation // price)
+                cost = qty * price
+                if qty > 0 and cost <= cash:
+                    cash -= cost
+                    ledger.apply_fill(stock, qty, price, "BUY", exchange)
+                    print(f"🟢 BUY: {stock} @ ₹{price:.2f} × {qty} on {exchange}")
+                    log_transaction("BUY", stock, price, qty, exchange, 0)
+                    buy_count += 1
+
+    # === AVERAGE DOWN ===
+    with metrics.phase("average_down"):
+        if buy_count == 0:
+            drop_candidates = []
+            for position in ledger:
+                stock, avg = position.stock, position.avg_price
+                price, exchange = snapshot.best_buy(stock)
+                if price and price < 0.97 * avg:
+                    drop_candidates.append((avg - price, stock, price, exchange))
+            if drop_candidates:
+                drop_candidates.sort(reverse=True)
+                _, stock, price, exchange = drop_candidates[0]
+                qty = int(unit_allocation // price)
+                if qty > 0 and (qty * price) <= cash:
+                    cash -= qty * price
+                    ledger.apply_fill(stock, qty, price, "AVERAGE", exchange)
+                    print(f"🟡 AVERAGE DOWN: {stock} @ ₹{price:.2f} × {qty} on {exchange}")
+                    log_transaction("AVERAGE", stock, price, qty, exchange, 0)
+
+    # === SELL ===
+    with metrics.phase("sell"):
+        for position in ledger:
+            stock, avg, qty, ex = position.stock, position.avg_price, position.qty, position.exchange
+            price = snapshot.price(stock, ex)
+            if price and price >= 1.05 * avg:
+                proceeds = price * qty
+                pnl = (price - avg) * qty
+                cash += proceeds
+                ledger.apply_fill(stock, qty, price, "SELL", ex)
+                print(f"🔴 SELL: {stock} @ ₹{price:.2f} × {qty} on {ex} | PnL = ₹{pnl:.2f}")
+                log_transaction("SELL", stock, price, qty, ex, round(pnl, 2))
+                break
+
+    return cash
 
 # === Main Execution ===
-now = datetime.now()
-today_str = now.strftime("%Y-%m-%d")
-print(f"\n🕒 Running strategy for {today_str} at {now.strftime('%H:%M:%S')}\n")
-
-cash = CAPITAL - df_log["Price"].mul(df_log["Qty"]).sum() + df_log["PnL"].sum()
-top_fallers = []
-
-# === FIND FALLERS ===
-for stock in nifty_50:
-    price, ex = get_best_buy_price(stock)
-    dma = compute_20dma(stock)
-    if price and dma:
-        deviation = (price - dma) / dma
-        top_fallers.append((deviation, stock))
-    price_str = f"{price:.2f}" if price else "N/A"
-    dma_str = f"{dma:.2f}" if dma else "N/A"
-    print(f"🔎 {stock}: Price = ₹{price_str} ({ex or 'NSE/BSE not found'}), 20DMA = ₹{dma_str}")
-
-# === BUY ===
-top_fallers.sort()
-buy_count = 0
-for _, stock in top_fallers:
-    if buy_count >= 2:
-        break
-    if stock not in df_holdings.Stock.values:
-        price, exchange = get_best_buy_price(stock)
-        qty = int(UNIT_ALLOCATION // price)
-        cost = qty * price
-        if qty > 0 and cost <= cash:
-            cash -= cost
-            update_holdings(stock, qty, price, "BUY", exchange)
-            holdings_val = calculate_holdings_value()
-            total_val = cash + holdings_val
-            print(f"🟢 BUY: {stock} @ ₹{price:.2f} × {qty} on {exchange}")
-            log_transaction(today_str, "BUY", stock, price, qty, exchange, 0, round(cash, 2), round(holdings_val, 2), round(total_val, 2))
-            buy_count += 1
-
-# === AVERAGE DOWN ===
-if buy_count == 0:
-    drop_candidates = []
-    for _, row in df_holdings.iterrows():
-        stock = row["Stock"]
-        avg = float(row["Avg Buy Price"])
-        qty = int(row["Qty"])
-        price, exchange = get_best_buy_price(stock)
-        if price and price < 0.97 * avg:
-            drop_candidates.append((avg - price, stock, price, exchange))
-    if drop_candidates:
-        drop_candidates.sort(reverse=True)
-        _, stock, price, exchange = drop_candidates[0]
-        qty = int(UNIT_ALLOCATION // price)
-        if qty > 0 and (qty * price) <= cash:
-            cash -= qty * price
-            update_holdings(stock, qty, price, "AVERAGE", exchange)
-            holdings_val = calculate_holdings_value()
-            total_val = cash + holdings_val
-            print(f"🟡 AVERAGE DOWN: {stock} @ ₹{price:.2f} × {qty} on {exchange}")
-            log_transaction(today_str, "AVERAGE", stock, price, qty, exchange, 0, round(cash, 2), round(holdings_val, 2), round(total_val, 2))
-
-# === SELL ===
-for _, row in df_holdings.copy().iterrows():
-    stock = row["Stock"]
-    avg = float(row["Avg Buy Price"])
-    qty = int(row["Qty"])
-    ex = row.get("Exchange")
-    price = get_best_sell_price(stock, ex)
-    if price and price >= 1.05 * avg:
-        proceeds = price * qty
-        pnl = (price - avg) * qty
-        cash += proceeds
-        update_holdings(stock, qty, price, "SELL", ex)
-        holdings_val = calculate_holdings_value()
-        total_val = cash + holdings_val
-        print(f"🔴 SELL: {stock} @ ₹{price:.2f} × {qty} on {ex} | PnL = ₹{pnl:.2f}")
-        log_transaction(today_str, "SELL", stock, price, qty, ex, round(pnl, 2), round(cash, 2), round(holdings_val, 2), round(total_val, 2))
-        break
-
-# === FINAL SUMMARY ===
-holdings_val = calculate_holdings_value()
-total_realized_pnl = df_log[df_log['Action'] == 'SELL']['PnL'].sum()
-final_value = cash + holdings_val
-
-print(f"\n📊 Final Portfolio Summary ({today_str}):")
-print(f"   💰 Cash Left         : ₹{cash:,.2f}")
-print(f"   📦 Holdings Value    : ₹{holdings_val:,.2f}")
-print(f"   ✅ Realized P&L      : ₹{total_realized_pnl:,.2f}")
-print(f"   🧾 Total Portfolio   : ₹{final_value:,.2f}")
-
-# === SAVE ===
-save_response = input("\n💾 Save log and holdings? (yes/no): ").strip().lower()
-if save_response == "yes":
-    df_log.to_csv(LOG_PATH, index=False)
-    df_holdings.to_csv(HOLDINGS_PATH, index=False)
-    print("✅ Log and Holdings saved.")
-else:
-    print("❌ Not saved.")
\ No newline at end of file
+def main(argv=None):
+    parser = live_parser()
+    args = parser.parse_args(argv)
+    cache = None if args.no_cache else MarketCache(args.cache_dir, offline=args.offline)
+    metrics = RunMetrics(enabled=args.metrics is not None, trace_memory=args.trace_memory).start()
+
+    with metrics.phase("load"):
+        kite = None if args.offline else connect_kite()
+
+        # === Load Nifty 50 Symbols and 20DMA ===
+        df_price = load_price_frame(CSV_PATH)
+        nifty_50 = set(df_price.columns)
+        ledger = load_holdings(kite, nifty_50, metrics=metrics)
+
+        # === Setup Log (running totals come from the sidecar, not the full history) ===
+        trade_log = TradeLogWriter(LOG_PATH, LIVE_LOG_COLUMNS, flush_every=None)
+
+    now = datetime.now()
+    today_str = now.strftime("%Y-%m-%d")
+    print(f"\n🕒 Running strategy for {today_str} at {now.strftime('%H:%M:%S')}\n")
+
+    # === Quote snapshot: one concurrent fetch serves every lookup below ===
+    with metrics.phase("quotes"):
+        quote_symbols = sorted(nifty_50 | set(ledger.positions))
+        snapshot = QuoteSnapshot.fetch(quote_symbols, metrics=metrics, cache=cache)
+        print(f"📡 Fetched {len(snapshot.quotes)} quotes for {len(quote_symbols)} symbols (NSE + BSE)")
+        if cache is not None:
+            print(cache.summary())
+        ledger.mark_all(snapshot.price)
+
+    cash = trade_log.totals.cash(CAPITAL)
+    cash = run_strategy(df_price, nifty_50, ledger, snapshot, trade_log, cash, today_str, metrics=metrics)
+
+    # === FINAL SUMMARY ===
+    holdings_val = ledger.holdings_value
+    total_realized_pnl = trade_log.totals.realized_pnl
+    final_value = cash + holdings_val
+
+    print(f"\n📊 Final Portfolio Summary ({today_str}):")
+    print(f"   💰 Cash Left         : ₹{cash:,.2f}")
+    print(f"   📦 Holdings Value    : ₹{holdings_val:,.2f}")
+    print(f"   ✅ Realized P&L      : ₹{total_realized_pnl:,.2f}")
+    print(f"   🧾 Total Portfolio   : ₹{final_value:,.2f}")
+
+    # === SAVE ===
+    save_response = args.save
+    if save_response == "ask":
+        save_response = input("\n💾 Save log and holdings? (yes/no): ").strip().lower() if sys.stdin.isatty() else "no"
+    with metrics.phase("save"):
+        if save_response == "yes":
+            trade_log.flush()
+            ledger.to_frame().to_csv(HOLDINGS_PATH, index=False)
+            print("✅ Log and Holdings saved.")
+        else:
+            trade_log.discard()
+            print("❌ Not saved.")
+
+    # === METRICS ===
+    metrics.stop()
+    metrics.print_summary()
+    metrics_path = metrics.write(args.metrics or f"live_metrics_{now:%Y%m%d_%H%M%S}.json")
+    if metrics_path:
+        print(f"📝 Metrics saved to '{metrics_path}'")
+
+if __name__ == "__main__":
+    main()
@@ -1,46 +1,16 @@
 import os
-from dotenv import load_dotenv
-from kiteconnect import KiteConnect
+import sys
 from urllib.parse import urlparse, parse_qs
-import webbrowser
 
-# === Load API key and secret from .env ===
-load_dotenv()
-api_key = os.getenv("ZERODHA_API_KEY")
-api_secret = os.getenv("ZERODHA_API_SECRET")
+from cli_args import token_parser
 
-if not api_key or not api_secret:
-    print("❌ ZERODHA_API_KEY or ZERODHA_API_SECRET not set in .env.")
-    exit()
+ENV_PATH = "real_time_zerodha/.env"
 
-# === Step 1: Generate Login URL and open in browser ===
-kite = KiteConnect(api_key=api_key)
-login_url = kite.login_url()
-print(f"🔗 Open this URL to login:\n{login_url}")
-webbrowser.open(login_url)
+def extract_request_token(redirect_url: str):
+    query_params = parse_qs(urlparse(redirect_url).query)
+    return query_params.get("request_token", [None])[0]
 
-# === Step 2: Wait for manual paste ===
-redirect_url = input("\n🔗 Paste full redirect URL after login: ").strip()
-
-# === Step 3: Extract request_token ===
-parsed_url = urlparse(redirect_url)
-query_params = parse_qs(parsed_url.query)
-request_token = query_params.get("request_token", [None])[0]
-
-if not request_token:
-    print("❌ Could not extract request_token from URL.")
-    exit()
-
-print(f"🔑 Extracted request_token: {request_token}")
-
-# === Step 4: Generate access_token ===
-try:
-    session_data = kite.generate_session(request_token, api_secret=api_secret)
-    access_token = session_data["access_token"]
-    print(f"\n✅ Access Token: {access_token}")
-
-    # === Step 5: Save access_token to .env ===
-    env_path = "real_time_zerodha/.env"
+def save_access_token(access_token: str, env_path: str = ENV_PATH):
     with open(env_path, "r") as f:
         lines = f.readlines()
 
@@ -55,7 +25,61 @@ try:
         if not found:
             f.write(f"ZERODHA_ACCESS_TOKEN={access_token}\n")
 
-    print("💾 Access token saved to .env as ZERODHA_ACCESS_TOKEN.")
+def main(argv=None):
+    parser = token_parser()
+    parser.set_defaults(env=ENV_PATH)
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+    from kiteconnect import KiteConnect
+
+    # === Load API key and secret from .env ===
+    load_dotenv()
+    api_key = os.getenv("ZERODHA_API_KEY")
+    api_secret = os.getenv("ZERODHA_API_SECRET")
+
+    if not api_key or not api_secret:
+        print("❌ ZERODHA_API_KEY or ZERODHA_API_SECRET not set in .env.")
+        return 1
+
+    # === Step 1: Generate Login URL and open in browser ===
+    kite = KiteConnect(api_key=api_key)
+    redirect_url = args.redirect_url
+    if redirect_url is None:
+        login_url = kite.login_url()
+        print(f"🔗 Open this URL to login:\n{login_url}")
+        if not args.no_browser:
+            import webbrowser
+            webbrowser.open(login_url)
+
+        # === Step 2: Wait for manual paste ===
+        if not sys.stdin.isatty():
+            print("❌ No terminal to paste the redirect URL into; pass --redirect-url.")
+            return 1
+        redirect_url = input("\n🔗 Paste full redirect URL after login: ").strip()
+
+    # === Step 3: Extract request_token ===
+    request_token = extract_request_token(redirect_url)
+    if not request_token:
+        print("❌ Could not extract request_token from URL.")
+        return 1
+
+    print(f"🔑 Extracted request_token: {request_token}")
+
+    # === Step 4: Generate access_token ===
+    try:
+        session_data = kite.generate_session(request_token, api_secret=api_secret)
+        access_token = session_data["access_token"]
+        print(f"\n✅ Access Token: {access_token}")
+
+        # === Step 5: Save access_token to .env ===
+        save_access_token(access_token, args.env)
+        print("💾 Access token saved to .env as ZERODHA_ACCESS_TOKEN.")
+
+    except Exception as e:
+        print(f"❌ Error generating access token: {e}")
+        return 1
+    return 0
 
-except Exception as e:
-    print(f"❌ Error generating access token: {e}")
\ No newline at end of file
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,209 @@
+import hashlib
+import json
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from market_cache import MarketCache
+
+# Indicators over the [dates x symbols] price matrix, shared by the
+# backtests and the live scripts. A spec names an indicator and its window:
+#   smaN        mean of the last N rows (min_periods=1): the backtest 20-DMA
+#   emaN        exponential average, span N, NaN closes skipped
+#   drawdownN   close / highest close of the last N rows - 1
+# Backtests read whole matrices (indicator_matrices), one vectorized pass
+# per spec, cached in memory and optionally on disk under the dataset's
+# content fingerprint. Live code wants the value as of the last close over
+# the last N *valid* closes (like compute_20dma); latest_values computes
+# that for every symbol at once, and RollingIndicators keeps it up to date
+# as days are appended, in O(1) per symbol.
+
+DEFAULT_SIGNAL = "sma20"
+CACHE_KIND = "indicators"
+MEMORY_BYTES = 512 * 2**20
+_SPEC = re.compile(r"^(sma|ema|drawdown)(\d+)$")
+
+def parse_spec(spec: str):
+    match = _SPEC.match(spec)
+    if not match or int(match.group(2)) < 1:
+        raise ValueError(f"Unknown indicator '{spec}' (expected smaN, emaN or drawdownN, e.g. sma20)")
+    return match.group(1), int(match.group(2))
+
+# === Whole-matrix indicators (backtests) ===
+def indicator_matrix(frame: pd.DataFrame, spec: str) -> np.ndarray:
+    kind, window = parse_spec(spec)
+    if kind == "sma":
+        return frame.rolling(window, min_periods=1).mean().to_numpy()
+    if kind == "ema":
+        return frame.ewm(span=window, adjust=False, ignore_na=True).mean().to_numpy()
+    return (frame / frame.rolling(window, min_periods=1).max() - 1).to_numpy()
+
+def signal_deviation(prices, values, spec: str) -> np.ndarray:
+    # How far below the indicator each close is; the most negative rank first
+    kind, _ = parse_spec(spec)
+    return values if kind == "drawdown" else (prices - values) / values
+
+def fingerprint(prices, dates=None, symbols=None) -> str:
+    prices = np.ascontiguousarray(prices)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(json.dumps([str(prices.dtype), prices.shape, None if symbols is None else list(map(str, symbols))]).encode())
+    if dates is not None:
+        digest.update(np.asarray(dates, dtype="datetime64[D]").tobytes())
+    digest.update(prices.tobytes())
+    return digest.hexdigest()
+
+class IndicatorCache:
+    # { (fingerprint, spec): matrix } kept in process (least recently used
+    # dropped beyond max_bytes) and, with `disk`, in a MarketCache so other
+    # processes and later runs reuse it. Matrices are shared between callers
+    # and marked read-only.
+    def __init__(self, disk: MarketCache = None, max_bytes: int = MEMORY_BYTES):
+        self.disk = disk
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, prices, specs, dates=None, symbols=None) -> dict:
+        key = fingerprint(prices, dates, symbols)
+        found, missing = {}, []
+        for spec in specs:
+            with self._lock:
+                if (key, spec) in self._entries:
+                    self._entries.move_to_end((key, spec))
+                    found[spec] = self._entries[(key, spec)]
+                    continue
+            hit, value = self.disk.get(CACHE_KIND, (key, spec)) if self.disk is not None else (False, None)
+            if hit:
+                found[spec] = self._remember(key, spec, value)
+            else:
+                missing.append(spec)
+        if missing:
+            frame = pd.DataFrame(np.asarray(prices, dtype=np.float64))
+            for spec in missing:
+                value = indicator_matrix(frame, spec)
+                if self.disk is not None:
+                    self.disk.put(CACHE_KIND, (key, spec), value)
+                found[spec] = self._remember(key, spec, value)
+        return found
+
+    def _remember(self, key, spec, value):
+        value.flags.writeable = False
+        with self._lock:
+            self._entries[(key, spec)] = value
+            total = sum(v.nbytes for v in self._entries.values())
+            while total > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                total -= evicted.nbytes
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+MEMORY_CACHE = IndicatorCache()
+
+def indicator_matrices(prices, specs, dates=None, symbols=None, cache: IndicatorCache = MEMORY_CACHE) -> dict:
+    if cache is None:
+        frame = pd.DataFrame(np.asarray(prices, dtype=np.float64))
+        return {spec: indicator_matrix(frame, spec) for spec in specs}
+    return cache.get(prices, specs, dates, symbols)
+
+def signal_matrices(prices, signal: str = DEFAULT_SIGNAL, dates=None, symbols=None,
+                    cache: IndicatorCache = MEMORY_CACHE):
+    # (indicator, deviation) for the backtests' faller ranking
+    values = indicator_matrices(prices, [signal], dates, symbols, cache)[signal]
+    return values, signal_deviation(prices, values, signal)
+
+# === Latest values over valid closes (live) ===
+def _last_valid(prices, window: int):
+    # [symbols x window] buffer of each symbol's last `window` valid closes,
+    # oldest first, and how many there are (NaN-padded at the end)
+    prices = np.asarray(prices, dtype=np.float64)
+    valid = ~np.isnan(prices)
+    rank = np.cumsum(valid[::-1], axis=0)[::-1]  # 1 = a symbol's latest valid close
+    count = np.minimum(valid.sum(axis=0), window)
+    rows, cols = np.nonzero(valid & (rank <= window))
+    buffer = np.full((prices.shape[1], window), np.nan)
+    buffer[cols, count[cols] - rank[rows, cols]] = prices[rows, cols]
+    return buffer, count
+
+def _ema_last(prices, window: int) -> np.ndarray:
+    frame = pd.DataFrame(np.asarray(prices, dtype=np.float64))
+    if frame.empty:
+        return np.full(frame.shape[1], np.nan)
+    return frame.ewm(span=window, adjust=False, ignore_na=True).mean().ffill().to_numpy()[-1].copy()
+
+def latest_values(prices, spec: str) -> np.ndarray:
+    # Per symbol, as of its last close; NaN until it has `window` valid closes
+    kind, window = parse_spec(spec)
+    buffer, count = _last_valid(prices, window)
+    if kind == "sma":
+        values = buffer.sum(axis=1) / window
+    elif kind == "ema":
+        values = _ema_last(prices, window)
+    else:
+        values = buffer[np.arange(len(count)), np.maximum(count - 1, 0)] / np.nanmax(buffer, axis=1, initial=-np.inf) - 1
+    return np.where(count == window, values, np.nan)
+
+class RollingIndicators:
+    # latest_values kept current as daily closes arrive: each append costs
+    # O(1) per symbol per spec (a ring buffer of the last `window` valid
+    # closes, a running sum, an EMA step and a running high that is only
+    # rescanned when the high itself leaves the window). Running sums can
+    # differ from a fresh latest_values in the last bits.
+    def __init__(self, prices, symbols, specs):
+        self.symbols = list(symbols)
+        self.specs = list(specs)
+        self._state = {}
+        for spec in self.specs:
+            kind, window = parse_spec(spec)
+            buffer, count = _last_valid(prices, window)
+            self._state[spec] = {
+                "kind": kind, "window": window, "buffer": buffer, "count": count,
+                "head": np.zeros(len(self.symbols), dtype=np.int64),
+                "sum": np.nan_to_num(buffer).sum(axis=1),
+                "high": np.nanmax(buffer, axis=1, initial=-np.inf),
+                "last": buffer[np.arange(len(count)), np.maximum(count - 1, 0)],
+                "ema": _ema_last(prices, window) if kind == "ema" else None,
+            }
+
+    def append(self, closes):
+        # One day's closes, in `symbols` order (NaN where a symbol did not trade)
+        closes = np.asarray(closes, dtype=np.float64)
+        cols = np.nonzero(~np.isnan(closes))[0]
+        x = closes[cols]
+        for state in self._state.values():
+            window, buffer, count, head = state["window"], state["buffer"], state["count"], state["head"]
+            full = count[cols] == window
+            slot = np.where(full, head[cols], (head[cols] + count[cols]) % window)
+            old = buffer[cols, slot]
+            buffer[cols, slot] = x
+            head[cols] = np.where(full, (head[cols] + 1) % window, head[cols])
+            count[cols] = np.minimum(count[cols] + 1, window)
+            state["sum"][cols] += x - np.where(full, old, 0.0)
+            state["last"][cols] = x
+            high = state["high"]
+            lost = cols[full & (old >= high[cols]) & (x < old)]
+            high[cols] = np.fmax(high[cols], x)
+            high[lost] = np.nanmax(buffer[lost], axis=1)
+            if state["kind"] == "ema":
+                alpha = 2 / (window + 1)
+                prev = state["ema"][cols]
+                state["ema"][cols] = np.where(np.isnan(prev), x, (1 - alpha) * prev + alpha * x)
+
+    def values(self, spec: str) -> np.ndarray:
+        state = self._state[spec]
+        if state["kind"] == "sma":
+            values = state["sum"] / state["window"]
+        elif state["kind"] == "ema":
+            values = state["ema"]
+        else:
+            values = state["last"] / state["high"] - 1
+        return np.where(state["count"] == state["window"], values, np.nan)
+
+    def as_dict(self, spec: str) -> dict:
+        # { symbol: value or None }, the shape final_script's dmas take
+        return {s: (None if np.isnan(v) else float(v)) for s, v in zip(self.symbols, self.values(spec))}
@@ -0,0 +1,182 @@
+import json
+import os
+import random
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+
+# Run metrics: wall time per phase plus latency samples for every external
+# call (quotes, broker). Instrumented code always goes through
+# metrics.phase(...) / metrics.call(...); a disabled RunMetrics hands back
+# one shared no-op timer, so the cost is an attribute lookup and a method call.
+# Samples go into fixed-size reservoirs, so a daemon with --metrics running
+# for weeks holds the same memory as a single pass.
+
+LATENCY_SAMPLES = 10000
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def fail(self):
+        pass
+
+NULL_TIMER = _NullTimer()
+
+class LatencyReservoir:
+    # Uniform sample of at most `size` latencies (reservoir sampling), so a
+    # long session runs in fixed memory; count and max are exact.
+    def __init__(self, size: int = LATENCY_SAMPLES, seed: int = 0):
+        self.size = size
+        self.samples = []
+        self.count = 0
+        self.max = 0
+        self._random = random.Random(seed)
+
+    def add(self, value):
+        self.count += 1
+        self.max = max(self.max, value)
+        if len(self.samples) < self.size:
+            self.samples.append(value)
+        else:
+            slot = self._random.randrange(self.count)
+            if slot < self.size:
+                self.samples[slot] = value
+
+    def percentile(self, q: float):
+        return float(np.percentile(self.samples, q))
+
+class LatencyStats:
+    # Exact count, errors, total and max per phase / call; p50 and p95 come
+    # from the reservoir
+    def __init__(self, size: int = LATENCY_SAMPLES):
+        self.errors = 0
+        self.total = 0.0
+        self.reservoir = LatencyReservoir(size)
+        self._lock = threading.Lock()  # timers may finish on worker threads
+
+    def add(self, seconds: float, failed: bool):
+        with self._lock:
+            self.reservoir.add(seconds)
+            self.total += seconds
+            self.errors += bool(failed)
+
+    @property
+    def count(self):
+        return self.reservoir.count
+
+    def to_dict(self):
+        reservoir = self.reservoir
+        return {
+            "count": reservoir.count,
+            "errors": self.errors,
+            "total_ms": self.total * 1e3,
+            "p50_ms": reservoir.percentile(50) * 1e3,
+            "p95_ms": reservoir.percentile(95) * 1e3,
+            "max_ms": reservoir.max * 1e3,
+        }
+
+class _Timer:
+    __slots__ = ("stats", "started", "failed")
+
+    def __init__(self, stats: LatencyStats):
+        self.stats = stats
+        self.failed = False
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stats.add(time.perf_counter() - self.started, self.failed or exc_type is not None)
+        return False
+
+    def fail(self):
+        # Mark a call that returned without data (e.g. an empty quote) as an error
+        self.failed = True
+
+class RunMetrics:
+    def __init__(self, enabled: bool = True, trace_memory: bool = False):
+        self.enabled = enabled
+        self.trace_memory = enabled and trace_memory
+        self.phases = {}   # { name: LatencyStats }, in first-seen order
+        self.calls = {}
+        self.started_at = None
+        self.started = None
+        self.elapsed = None
+        self.peak_memory = None
+
+    def start(self):
+        if self.enabled:
+            self.started_at = datetime.now()
+            self.started = time.perf_counter()
+            if self.trace_memory:
+                tracemalloc.start()
+        return self
+
+    def stop(self):
+        if self.enabled and self.started is not None:
+            self.elapsed = time.perf_counter() - self.started
+            if self.trace_memory and tracemalloc.is_tracing():
+                self.peak_memory = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+        return self
+
+    def phase(self, name: str):
+        if not self.enabled:
+            return NULL_TIMER
+        return _Timer(self._stats(self.phases, name))
+
+    def call(self, name: str):
+        if not self.enabled:
+            return NULL_TIMER
+        return _Timer(self._stats(self.calls, name))
+
+    @staticmethod
+    def _stats(table: dict, name: str) -> LatencyStats:
+        stats = table.get(name)
+        if stats is None:
+            stats = table.setdefault(name, LatencyStats())
+        return stats
+
+    def to_dict(self) -> dict:
+        return {
+            "started_at": self.started_at.isoformat(timespec="seconds") if self.started_at else None,
+            "elapsed_ms": self.elapsed * 1e3 if self.elapsed is not None else None,
+            "peak_memory_bytes": self.peak_memory,
+            "phases": {name: stats.total * 1e3 for name, stats in self.phases.items()},
+            "calls": {name: stats.to_dict() for name, stats in self.calls.items() if stats.count},
+        }
+
+    def write(self, path: str):
+        if not self.enabled:
+            return None
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        return path
+
+    def print_summary(self):
+        if not self.enabled:
+            return
+        data = self.to_dict()
+        print("\n⏱️ Run Metrics:")
+        if data["elapsed_ms"] is not None:
+            print(f"   Total             : {data['elapsed_ms']:,.1f} ms")
+        for name, ms in data["phases"].items():
+            print(f"   {name:<18}: {ms:,.1f} ms")
+        for name, stats in data["calls"].items():
+            print(f"   {name:<18}: {stats['count']} calls, p50 {stats['p50_ms']:.1f} ms, "
+                  f"p95 {stats['p95_ms']:.1f} ms, max {stats['max_ms']:.1f} ms, {stats['errors']} errors")
+        if data["peak_memory_bytes"] is not None:
+            print(f"   Peak memory       : {data['peak_memory_bytes'] / 2**20:,.1f} MiB")
+
+DISABLED = RunMetrics(enabled=False)
@@ -0,0 +1,118 @@
+import pandas as pd
+
+HOLDINGS_COLUMNS = ["Stock", "Qty", "Avg Buy Price", "Exchange"]
+
+class Position:
+    __slots__ = ("stock", "qty", "avg_price", "exchange", "market_value")
+
+    def __init__(self, stock, qty, avg_price, exchange):
+        self.stock = stock
+        self.qty = qty
+        self.avg_price = avg_price
+        self.exchange = exchange
+        self.market_value = 0.0
+
+# Running quantity, cost basis and market value per position. Fills and
+# price updates adjust the totals by their delta, so holdings value is
+# always available without rescanning or re-pricing every position.
+class PortfolioLedger:
+    def __init__(self):
+        self.positions = {}  # { stock: Position }, in insertion order
+        self.holdings_value = 0.0
+        self.cost_basis = 0.0
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame):
+        ledger = cls()
+        for stock, qty, avg_price, exchange in df[HOLDINGS_COLUMNS].itertuples(index=False):
+            exchange = exchange if isinstance(exchange, str) else None
+            ledger.positions[stock] = Position(stock, int(qty), float(avg_price), exchange)
+            ledger.cost_basis += int(qty) * float(avg_price)
+        return ledger
+
+    def to_frame(self) -> pd.DataFrame:
+        rows = [[p.stock, p.qty, p.avg_price, p.exchange] for p in self.positions.values()]
+        return pd.DataFrame(rows, columns=HOLDINGS_COLUMNS)
+
+    def __contains__(self, stock):
+        return stock in self.positions
+
+    def __iter__(self):
+        return iter(list(self.positions.values()))
+
+    def mark(self, stock, price):
+        position = self.positions[stock]
+        value = price * position.qty if price else 0.0
+        self.holdings_value += value - position.market_value
+        position.market_value = value
+
+    def mark_all(self, price_of):
+        # price_of(stock, exchange) -> price or None
+        for position in self.positions.values():
+            self.mark(position.stock, price_of(position.stock, position.exchange))
+
+    def apply_fill(self, stock, qty, price, action, exchange):
+        if action in ["BUY", "AVERAGE"]:
+            position = self.positions.get(stock)
+            if position is not None:
+                self.cost_basis -= position.qty * position.avg_price
+                total_qty = position.qty + qty
+                new_price = ((position.avg_price * position.qty) + (price * qty)) / total_qty
+                position.qty, position.avg_price, position.exchange = total_qty, round(new_price, 2), exchange
+            else:
+                position = self.positions[stock] = Position(stock, qty, price, exchange)
+            self.cost_basis += position.qty * position.avg_price
+            # A fill is the latest traded price for the position
+            self.mark(stock, price)
+        elif action == "SELL":
+            position = self.positions.pop(stock, None)
+            if position is not None:
+                self.holdings_value -= position.market_value
+                self.cost_basis -= position.qty * position.avg_price
+
+# === Backtest position book ===
+class BookPosition:
+    __slots__ = ("qty", "cost")
+
+    def __init__(self):
+        self.qty = 0
+        self.cost = 0
+
+    @property
+    def avg_price(self):
+        return self.cost / self.qty if self.qty else 0
+
+# Running total quantity and total cost per stock, replacing the
+# [(price, qty), ...] lot lists, so average price and the sell/average
+# threshold checks are constant time no matter how often a position was
+# averaged. Costs accumulate in fill order, giving the same averages as
+# re-summing the lots.
+class PositionBook:
+    def __init__(self):
+        self.positions = {}  # { stock: BookPosition }, in insertion order
+
+    def __contains__(self, stock):
+        return stock in self.positions
+
+    def __iter__(self):
+        return iter(self.positions)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __getitem__(self, stock):
+        return self.positions[stock]
+
+    def add(self, stock, price, qty):
+        position = self.positions.get(stock)
+        if position is None:
+            position = self.positions[stock] = BookPosition()
+        position.qty += qty
+        position.cost += price * qty
+
+    def avg_price(self, stock):
+        return self.positions[stock].avg_price
+
+    def close(self, stock):
+        position = self.positions.pop(stock)
+        return position.qty, position.avg_price
@@ -0,0 +1,209 @@
+import signal
+import sys
+import threading
+import time
+from datetime import datetime, date, timedelta
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+from cli_args import daemon_parser
+from final_script import CAPITAL, CSV_PATH, DMA_WINDOW, HOLDINGS_PATH, LOG_PATH, find_fallers
+from indicators import RollingIndicators
+from instrumentation import RunMetrics, DISABLED
+from market_cache import CACHE_DIR, MarketCache
+from multi_portfolio import (Portfolio, connect_accounts, fetch_account_holdings, load_config, load_portfolios,
+                             restore_cash, run_portfolios, save_portfolios)
+from price_store import load_price_frame
+from quotes import QuoteSnapshot
+
+# Long-lived alternative to running final_script.py from cron every few
+# minutes. Imports, Kite sessions, the price frame, 20DMAs, ledgers and log
+# totals stay in memory; a cycle is one quote snapshot plus the decision pass,
+# and logs and holdings are saved after every cycle. Sessions and holdings
+# are reloaded once per trading day (and after a failed cycle), the 20DMAs
+# whenever the price store changes on disk: new days are appended to a
+# RollingIndicators state, any other change reseeds it. Cash is restored
+# from the in-memory log totals each cycle, so decisions match a cron
+# run's (up to float rounding in the rolled 20DMAs).
+
+MARKET_TZ = ZoneInfo("Asia/Kolkata")
+RUN_FROM = "09:20"   # first cycle, a few minutes after the open
+RUN_UNTIL = "15:25"  # last cycle, before the close
+INTERVAL = 300       # seconds between cycles
+WEEKDAYS = range(5)  # Mon-Fri
+
+# === Market-hours schedule ===
+class Schedule:
+    def __init__(self, start: str = RUN_FROM, end: str = RUN_UNTIL, interval: float = INTERVAL, holidays=(),
+                 tz=MARKET_TZ):
+        self.start = datetime.strptime(start, "%H:%M").time()
+        self.end = datetime.strptime(end, "%H:%M").time()
+        self.interval = timedelta(seconds=interval)
+        self.holidays = set(holidays)
+        self.tz = tz
+
+    def is_trading_day(self, day: date) -> bool:
+        return day.weekday() in WEEKDAYS and day not in self.holidays
+
+    def next_run(self, now: datetime) -> datetime:
+        # First slot start + k * interval at or after `now`, skipping closed days
+        now = now.astimezone(self.tz)
+        day = now.date()
+        while True:
+            if self.is_trading_day(day):
+                open_at = datetime.combine(day, self.start, self.tz)
+                close_at = datetime.combine(day, self.end, self.tz)
+                slot = open_at
+                if now > open_at:
+                    steps = -((open_at - now) // self.interval)  # ceil
+                    slot = open_at + steps * self.interval
+                if slot <= close_at:
+                    return slot
+            day += timedelta(days=1)
+            now = datetime.combine(day, datetime.min.time(), self.tz)
+
+def read_holidays(path: str) -> set:
+    # One YYYY-MM-DD per line (NSE trading holidays); blank lines and # comments ignored
+    with open(path) as f:
+        lines = [line.split("#")[0].strip() for line in f]
+    return {date.fromisoformat(line) for line in lines if line}
+
+# === Warm state and one cycle ===
+class LiveDaemon:
+    def __init__(self, csv_path: str, accounts: dict, portfolios, cache: MarketCache = None, offline: bool = False,
+                 verbose: bool = False, metrics: RunMetrics = DISABLED):
+        self.csv_path = csv_path
+        self.accounts = accounts
+        self.portfolios = portfolios
+        self.cache = cache
+        self.offline = offline
+        self.verbose = verbose
+        self.metrics = metrics
+        self.day = None
+        self.df_price = None
+        self.nifty_50 = None
+        self.dmas = None
+        self.rolling = None
+        self.kites = {}
+        self.cycles = 0
+
+    def refresh_prices(self):
+        # load_price_frame hands back the same frame until the store changes
+        df_price = load_price_frame(self.csv_path)
+        if df_price is not self.df_price:
+            old, self.df_price = self.df_price, df_price
+            self.nifty_50 = set(df_price.columns)
+            spec = f"sma{DMA_WINDOW}"
+            if old is not None and self._appended(old, df_price):
+                for closes in df_price.to_numpy(dtype=float)[len(old):]:
+                    self.rolling.append(closes)
+            else:
+                self.rolling = RollingIndicators(df_price.to_numpy(dtype=float), df_price.columns, [spec])
+            self.dmas = self.rolling.as_dict(spec)
+            print(f"📈 20DMA ready for {len(self.nifty_50)} symbols (history to {df_price.index[-1]:%Y-%m-%d})")
+
+    @staticmethod
+    def _appended(old, new) -> bool:
+        # `new` is `old` plus rows at the end (data_fetch.py adding a day)
+        n = len(old)
+        return (len(new) >= n and new.columns.equals(old.columns) and new.index[:n].equals(old.index)
+                and np.array_equal(new.to_numpy(dtype=float)[:n], old.to_numpy(dtype=float), equal_nan=True))
+
+    def start_day(self, day: date):
+        with self.metrics.phase("start_day"):
+            self.refresh_prices()
+            self.kites = connect_accounts(self.accounts, self.portfolios, self.offline, reload_env=True)
+            load_portfolios(self.portfolios, fetch_account_holdings(self.kites, self.nifty_50, self.metrics))
+            self.day = day
+
+    def run_cycle(self, now: datetime):
+        today_str = now.strftime("%Y-%m-%d")
+        try:
+            if now.date() != self.day:
+                self.start_day(now.date())
+            started = time.perf_counter()
+            with self.metrics.phase("load"):
+                self.refresh_prices()
+                for portfolio in self.portfolios:
+                    restore_cash(portfolio)
+            with self.metrics.phase("quotes"):
+                held = set().union(*(p.ledger.positions for p in self.portfolios))
+                snapshot = QuoteSnapshot.fetch(sorted(self.nifty_50 | held), metrics=self.metrics, cache=self.cache)
+            fetched = time.perf_counter()
+            with self.metrics.phase("find_fallers"):
+                top_fallers = find_fallers(self.df_price, self.nifty_50, snapshot, self.dmas, self.verbose)
+            summary = run_portfolios(self.df_price, self.nifty_50, self.portfolios, snapshot, top_fallers, today_str,
+                                     self.metrics)
+            with self.metrics.phase("save"):
+                save_portfolios(self.portfolios, True)
+        except Exception as e:
+            # In-memory state may be half-updated: drop it and reload from disk next cycle
+            for portfolio in self.portfolios:
+                if portfolio.trade_log is not None:
+                    portfolio.trade_log.discard()
+            self.day = None
+            print(f"❌ Cycle at {now:%H:%M:%S} failed: {e}")
+            return None
+        self.cycles += 1
+        done = time.perf_counter()
+        print(f"✅ Cycle {self.cycles} at {now:%H:%M:%S}: {len(snapshot.quotes)} quotes in "
+              f"{(fetched - started) * 1e3:,.0f} ms, decide + save {(done - fetched) * 1e3:,.1f} ms, "
+              f"{int(summary['New Trades'].sum())} trades")
+        if summary["New Trades"].any():
+            print(summary.to_string(index=False))
+        return summary
+
+# === Scheduler loop ===
+def run_forever(daemon: LiveDaemon, schedule: Schedule, max_cycles: int = None, stop: threading.Event = None):
+    stop = stop or threading.Event()
+    last_run = None
+    while not stop.is_set() and (max_cycles is None or daemon.cycles < max_cycles):
+        now = datetime.now(schedule.tz)
+        if last_run is not None and now <= last_run:
+            now = last_run + timedelta(microseconds=1)  # a wait that woke early must not repeat the slot
+        run_at = last_run = schedule.next_run(now)
+        print(f"⏳ Next cycle at {run_at:%Y-%m-%d %H:%M}")
+        if stop.wait(max(0.0, (run_at - datetime.now(schedule.tz)).total_seconds())):
+            break
+        daemon.run_cycle(run_at)
+
+def main(argv=None):
+    parser = daemon_parser()
+    parser.set_defaults(run_from=RUN_FROM, until=RUN_UNTIL, interval=INTERVAL)
+    args = parser.parse_args(argv)
+
+    if args.config:
+        csv_path, accounts, portfolios = load_config(args.config)
+    else:
+        csv_path, accounts = CSV_PATH, {"zerodha": {}}
+        portfolios = [Portfolio("main", CAPITAL, LOG_PATH, HOLDINGS_PATH, account="zerodha")]
+    cache = None if args.no_cache else MarketCache(args.cache_dir, offline=args.offline)
+    metrics = RunMetrics(enabled=args.metrics is not None).start()
+    daemon = LiveDaemon(csv_path, accounts, portfolios, cache, args.offline, args.verbose, metrics)
+    schedule = Schedule(args.run_from, args.until, args.interval,
+                        read_holidays(args.holidays) if args.holidays else ())
+
+    # SIGTERM (systemd, docker stop) ends the loop between cycles; state is already saved
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    print(f"🚀 Live daemon: {len(portfolios)} portfolio(s), {args.run_from}-{args.until} IST every "
+          f"{args.interval:g}s")
+    try:
+        if args.once:
+            daemon.run_cycle(datetime.now(MARKET_TZ))
+        else:
+            run_forever(daemon, schedule, args.max_cycles, stop)
+    except KeyboardInterrupt:
+        pass
+    print(f"👋 Stopped after {daemon.cycles} cycle(s)")
+
+    metrics.stop()
+    metrics.print_summary()
+    metrics_path = metrics.write(args.metrics or f"live_metrics_{datetime.now():%Y%m%d_%H%M%S}.json")
+    if metrics_path:
+        print(f"📝 Metrics saved to '{metrics_path}'")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+import hashlib
+import os
+import pickle
+import threading
+import time
+from datetime import date
+
+# Persistent cache for market-data responses (Yahoo closes and quotes, the
+# niftyindices constituents list). One pickle per key under
+#   <root>/<kind>/<sha1 of the key>.pkl   {"key", "fetched_at", "value"}
+# Freshness comes from each kind's TTL; file mtimes track last use, and the
+# least recently used entries are evicted once the cache outgrows max_bytes.
+# Offline, every lookup is served from disk regardless of age.
+
+CACHE_DIR = os.getenv("ASSETSYNC_CACHE_DIR", ".market_cache")
+MAX_BYTES = 256 * 2**20
+
+DAY = 24 * 3600
+TTL = {
+    "daily": None,         # closes for a finished date range never change
+    "daily_open": 3600,    # ...but a range reaching today is still filling in
+    "quote_1m": 60,        # last 1-minute close
+    "constituents": DAY,   # index membership list
+    "indicators": None,    # keyed by a fingerprint of the prices (indicators.py)
+}
+
+class CacheMiss(KeyError):
+    pass
+
+def daily_kind(end) -> str:
+    # yf.download's end is exclusive: a range ending after today may gain rows
+    return "daily" if str(end) <= date.today().isoformat() else "daily_open"
+
+class MarketCache:
+    def __init__(self, root: str = CACHE_DIR, max_bytes: int = MAX_BYTES, offline: bool = False):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.hits = 0
+        self.misses = 0
+        self._size = None  # bytes on disk, scanned on first write
+        self._lock = threading.Lock()  # quotes are fetched from a thread pool
+
+    def _path(self, kind: str, key: tuple) -> str:
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self.root, kind, digest + ".pkl")
+
+    def get(self, kind: str, key: tuple, max_age: float = None):
+        # (found, value); expired entries count as missing unless offline
+        path = self._path(kind, key)
+        try:
+            with open(path, "rb") as f:
+                entry = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            self.misses += 1
+            return False, None
+        max_age = TTL.get(kind) if max_age is None else max_age
+        if not self.offline and max_age is not None and time.time() - entry["fetched_at"] > max_age:
+            self.misses += 1
+            return False, None
+        try:
+            os.utime(path)  # last use, for LRU eviction
+        except OSError:
+            pass
+        self.hits += 1
+        return True, entry["value"]
+
+    def put(self, kind: str, key: tuple, value):
+        path = self._path(kind, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = pickle.dumps({"key": key, "fetched_at": time.time(), "value": value})
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        with self._lock:
+            old = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp, path)
+            if self._size is not None:
+                self._size += len(data) - old
+            self._evict()
+
+    def fetch(self, kind: str, key: tuple, fetch_fn, max_age: float = None):
+        # Cached value when fresh, else fetch_fn() (stored unless None).
+        # Offline, a key that was never cached raises CacheMiss.
+        found, value = self.get(kind, key, max_age)
+        if found:
+            return value
+        if self.offline:
+            raise CacheMiss(f"{kind} {key} is not cached (offline)")
+        value = fetch_fn()
+        if value is not None:
+            self.put(kind, key, value)
+        return value
+
+    def _entries(self):
+        for dirpath, _, files in os.walk(self.root):
+            for name in files:
+                if name.endswith(".pkl"):
+                    path = os.path.join(dirpath, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    yield stat.st_mtime, stat.st_size, path
+
+    def _evict(self):
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self._entries())
+        if self._size <= self.max_bytes:
+            return
+        # Down to 90% of the bound, so eviction doesn't run on every write
+        for _, size, path in sorted(self._entries()):
+            if self._size <= 0.9 * self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                self._size -= size
+            except OSError:
+                pass
+
+    def clear(self):
+        with self._lock:
+            for _, _, path in list(self._entries()):
+                os.remove(path)
+            self._size = 0
+
+    def summary(self) -> str:
+        mode = "offline" if self.offline else "online"
+        return f"🗃️ Market cache ({mode}): {self.hits} hits, {self.misses} misses, '{self.root}'"
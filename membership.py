@@ -0,0 +1,169 @@
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# Point-in-time index membership.
+#
+# Source: a CSV of membership intervals, one row per stint in the index
+#   Symbol,Start,End
+#   HDFC,2015-01-01,2023-07-12
+#   JIOFIN,2023-07-20,          (empty End: still a member)
+# A symbol that left and re-entered simply has two rows.
+#
+# Compiled store: one directory per history, like the price store
+#   bits.npy     uint8 [change dates x ceil(symbols / 8)], np.packbits rows
+#   dates.npy    datetime64[D] dates on which membership changed (sorted)
+#   symbols.json column index of the bits
+# Row k holds the members from dates[k] until the day before dates[k + 1].
+# Dates before the first row have no members. Symbols are matched without
+# their exchange suffix, so "INFY" covers the "INFY.NS" price column.
+# Nothing here touches the network; the backtest only reads these files.
+
+STORE_SUFFIX = ".members"
+EXCHANGE_SUFFIXES = (".NS", ".BO")
+
+def base_symbol(symbol: str) -> str:
+    symbol = str(symbol).strip().upper()
+    for suffix in EXCHANGE_SUFFIXES:
+        if symbol.endswith(suffix):
+            return symbol[:-len(suffix)]
+    return symbol
+
+class Membership:
+    def __init__(self, bits: np.ndarray, dates: np.ndarray, symbols: list):
+        self.bits = bits
+        self.dates = dates
+        self.symbols = symbols
+
+    def members_on(self, date) -> set:
+        row = np.searchsorted(self.dates, np.datetime64(pd.Timestamp(date), "D"), side="right") - 1
+        if row < 0:
+            return set()
+        flags = np.unpackbits(self.bits[row], count=len(self.symbols)).astype(bool)
+        return {s for s, member in zip(self.symbols, flags) if member}
+
+    def mask_for(self, dates, symbols) -> np.ndarray:
+        # bool [len(dates) x len(symbols)]: True where the symbol was in the
+        # index on that date. Symbols outside the history are never members.
+        rows = np.searchsorted(self.dates, np.asarray(pd.DatetimeIndex(dates).values, dtype="datetime64[D]"),
+                               side="right") - 1
+        columns = {s: j for j, s in enumerate(self.symbols)}
+        cols = np.array([columns.get(base_symbol(s), -1) for s in symbols], dtype=np.int64)
+        flags = np.unpackbits(self.bits, axis=1, count=len(self.symbols)).astype(bool)
+        flags = np.hstack([flags, np.zeros((len(flags), 1), dtype=bool)])  # column -1: not a member
+        flags = np.vstack([flags, np.zeros((1, flags.shape[1]), dtype=bool)])  # row -1: before the history
+        return flags[rows][:, cols]
+
+def exclude_non_members(deviation: np.ndarray, members: np.ndarray = None) -> np.ndarray:
+    # One vectorized mask over every day. NaN deviations are never ranked
+    # as fallers, so this gates new entries only; positions keep being
+    # averaged and sold after the stock leaves the index.
+    return deviation if members is None else np.where(members, deviation, np.nan)
+
+# === Compiler ===
+def read_intervals(csv_path: str) -> pd.DataFrame:
+    df = pd.read_csv(csv_path, dtype={"Symbol": str})
+    df["Symbol"] = df["Symbol"].map(base_symbol)
+    df["Start"] = pd.to_datetime(df["Start"])
+    df["End"] = pd.to_datetime(df["End"])  # empty -> NaT
+    return df
+
+def compile_intervals(intervals: pd.DataFrame):
+    # -> (bits, dates, symbols). A stint covers Start..End inclusive, so
+    # membership changes on each Start and on the day after each End.
+    symbols = sorted(intervals["Symbol"].unique())
+    starts = intervals["Start"].values.astype("datetime64[D]")
+    ends = intervals["End"].values.astype("datetime64[D]") + np.timedelta64(1, "D")
+    open_ended = np.isnat(ends)
+    dates = np.unique(np.concatenate([starts, ends[~open_ended]]))
+
+    # For every stint, the change rows from its Start up to (not incl.) End + 1
+    first = np.searchsorted(dates, starts)
+    stop = np.where(open_ended, len(dates), np.searchsorted(dates, np.where(open_ended, starts, ends)))
+    covered = (np.arange(len(dates))[None, :] >= first[:, None]) & (np.arange(len(dates))[None, :] < stop[:, None])
+    col = pd.Index(symbols).get_indexer(intervals["Symbol"])
+
+    flags = np.zeros((len(dates), len(symbols)), dtype=bool)
+    stint, row = np.nonzero(covered)
+    flags[row, col[stint]] = True
+    return np.packbits(flags, axis=1), dates, symbols
+
+def store_path_for(csv_path: str) -> str:
+    return os.path.splitext(csv_path)[0] + STORE_SUFFIX
+
+def write_store(store_dir: str, bits: np.ndarray, dates, symbols):
+    os.makedirs(store_dir, exist_ok=True)
+    np.save(os.path.join(store_dir, "dates.npy"), np.asarray(dates, dtype="datetime64[D]"))
+    with open(os.path.join(store_dir, "symbols.json"), "w") as f:
+        json.dump(list(symbols), f)
+    # bits.npy is written last: its mtime marks the store as complete
+    np.save(os.path.join(store_dir, "bits.npy"), np.asarray(bits, dtype=np.uint8))
+    return store_dir
+
+def convert_csv(csv_path: str, store_dir: str = None) -> str:
+    return write_store(store_dir or store_path_for(csv_path), *compile_intervals(read_intervals(csv_path)))
+
+def record_constituents(store_dir: str, date, symbols):
+    # Adds today's constituents (e.g. from data_fetch) as a change row when
+    # they differ from the latest one. Only dates after the last row are kept.
+    date = np.datetime64(pd.Timestamp(date), "D")
+    symbols = sorted({base_symbol(s) for s in symbols})
+    if not os.path.isdir(store_dir):
+        return write_store(store_dir, np.packbits(np.ones((1, len(symbols)), dtype=bool), axis=1), [date], symbols)
+
+    current = open_store(store_dir)
+    if date <= current.dates[-1] or current.members_on(date) == set(symbols):
+        return store_dir
+    all_symbols = current.symbols + [s for s in symbols if s not in current.symbols]
+    flags = np.zeros((len(current.dates) + 1, len(all_symbols)), dtype=bool)
+    flags[:-1, :len(current.symbols)] = np.unpackbits(current.bits, axis=1, count=len(current.symbols))
+    flags[-1] = np.isin(all_symbols, symbols)
+    return write_store(store_dir, np.packbits(flags, axis=1), np.append(current.dates, date), all_symbols)
+
+def export_csv(store_dir: str, csv_path: str):
+    # Back to Symbol,Start,End intervals (one row per stint)
+    matrix = open_store(store_dir)
+    flags = np.unpackbits(matrix.bits, axis=1, count=len(matrix.symbols)).astype(bool)
+    rows = []
+    for j, symbol in enumerate(matrix.symbols):
+        edges = np.diff(np.concatenate([[False], flags[:, j], [False]]).astype(np.int8))
+        for start, stop in zip(np.nonzero(edges == 1)[0], np.nonzero(edges == -1)[0]):
+            end = matrix.dates[stop] - np.timedelta64(1, "D") if stop < len(matrix.dates) else None
+            rows.append([symbol, str(matrix.dates[start]), str(end) if end is not None else ""])
+    pd.DataFrame(rows, columns=["Symbol", "Start", "End"]).to_csv(csv_path, index=False)
+    return csv_path
+
+# === Loader ===
+def open_store(store_dir: str) -> Membership:
+    with open(os.path.join(store_dir, "symbols.json")) as f:
+        symbols = json.load(f)
+    return Membership(np.load(os.path.join(store_dir, "bits.npy")),
+                      np.load(os.path.join(store_dir, "dates.npy")), symbols)
+
+def load_membership(path: str) -> Membership:
+    # Accepts a compiled store directory or an intervals CSV; the CSV is
+    # compiled on first use and again whenever it is newer than its store.
+    if os.path.isdir(path):
+        return open_store(path)
+    store_dir = store_path_for(path)
+    marker = os.path.join(store_dir, "bits.npy")
+    if os.path.exists(path) and (not os.path.exists(marker) or os.path.getmtime(marker) < os.path.getmtime(path)):
+        convert_csv(path, store_dir)
+    return open_store(store_dir)
+
+def membership_mask(path: str, dates, symbols):
+    # mask_for() of the history at `path`, or None when no history is given
+    return load_membership(path).mask_for(dates, symbols) if path else None
+
+# === CLI ===
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile Symbol,Start,End membership CSVs into date bitmask stores.")
+    parser.add_argument("csv", nargs="+", help="Membership interval CSVs to compile")
+    args = parser.parse_args()
+    for csv_path in args.csv:
+        store_dir = convert_csv(csv_path)
+        history = open_store(store_dir)
+        print(f"✅ {csv_path} → {store_dir} ({len(history.dates)} change dates × {len(history.symbols)} symbols)")
@@ -0,0 +1,239 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from cli_args import monte_carlo_parser
+from backtest_kernel import rank_fallers
+from mul_stratergy_per_capital import (
+    CSV_PATH, AVG_THRESHOLD, SELL_THRESHOLD, TOP_N, MAX_BUYS, UNIT_DIVISOR, date_slice,
+)
+from price_store import PRICE_DECIMALS, load_price_frame
+
+DMA_WINDOW = 20
+TRADING_DAYS = 252
+BLOCK_DAYS = 20   # bootstrap block length (about a trading month)
+CHUNK_PATHS = 500  # paths simulated together per task
+QUANTILES = [0.05, 0.25, 0.5, 0.75, 0.95]
+
+# === Batched strategy ===
+# simulate's rules for many price paths at once: state is [paths x symbols]
+# and each day is a handful of array operations over every path, so the
+# only Python loops are over days and the top_n entry candidates. The
+# entry, averaging and exit choices follow the loop engine exactly (pandas
+# tie order via rank_fallers, the larger-name tie-break when averaging,
+# first-opened position when selling), so a single historical path
+# reproduces run_backtest.
+def simulate_batch(price_rows, capital: float, name_rank: np.ndarray,
+                   avg_threshold: float = AVG_THRESHOLD, sell_threshold: float = SELL_THRESHOLD,
+                   top_n: int = TOP_N, max_buys: int = MAX_BUYS, unit_divisor: float = UNIT_DIVISOR,
+                   window: int = DMA_WINDOW) -> dict:
+    # price_rows: iterable of [paths x symbols] closes, one per day (NaN =
+    # no quote). Returns per-path arrays: Final Value (summarize's
+    # cash + realized + holdings), Cash, Realized PnL, Holdings Value,
+    # Trades and Max Drawdown of mark-to-market equity (cash + holdings).
+    unit_allocation = capital / unit_divisor
+    for t, price in enumerate(price_rows):
+        if t == 0:
+            n_paths, n_stocks = price.shape
+            paths = np.arange(n_paths)
+            buffer = np.zeros((window, n_paths, n_stocks))  # last `window` closes, NaN as 0
+            listed = np.zeros((window, n_paths, n_stocks), dtype=bool)
+            window_sum = np.zeros((n_paths, n_stocks))
+            window_count = np.zeros((n_paths, n_stocks), dtype=np.int64)
+            qty = np.zeros((n_paths, n_stocks))
+            cost = np.zeros((n_paths, n_stocks))
+            held = np.zeros((n_paths, n_stocks), dtype=bool)
+            opened = np.zeros((n_paths, n_stocks), dtype=np.int64)  # opening sequence, for sell order
+            next_seq = 0
+            cash = np.full(n_paths, float(capital))
+            realized = np.zeros(n_paths)
+            trades = np.zeros(n_paths, dtype=np.int64)
+            mark = np.zeros((n_paths, n_stocks))  # last known close (0 before the first)
+            peak = cash.copy()
+            max_drawdown = np.zeros(n_paths)
+
+        # 20-DMA over the last `window` rows, skipping NaN (min_periods=1),
+        # as running sums: add today's close, drop the one leaving the window.
+        # This is indicators' backtest smaN (indicator_matrix), kept inline
+        # because the paths are generated a day at a time as [paths x symbols]
+        slot = t % window
+        quoted = ~np.isnan(price)
+        value = np.where(quoted, price, 0.0)
+        window_sum += value - buffer[slot]
+        window_count += quoted.astype(np.int64) - listed[slot]
+        buffer[slot], listed[slot] = value, quoted
+        with np.errstate(invalid="ignore", divide="ignore"):
+            dma = window_sum / window_count
+            deviation = (price - dma) / dma
+        order, n_valid = rank_fallers(deviation, top_n)
+
+        # Entry: top_n fallers, up to max_buys attempts per path
+        buy_count = np.zeros(n_paths, dtype=np.int64)
+        for k in range(min(top_n, n_stocks)):
+            j = order[:, k]
+            attempt = (k < n_valid) & (buy_count < max_buys) & ~held[paths, j]
+            p = price[paths, j]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                q = np.floor_divide(unit_allocation, p)
+            fill = attempt & (cash >= unit_allocation) & (q != 0)
+            fp, fj = paths[fill], j[fill]
+            cash[fill] -= q[fill] * p[fill]
+            qty[fp, fj] = q[fill]
+            cost[fp, fj] = 0.0 + p[fill] * q[fill]
+            held[fp, fj] = True
+            opened[fp, fj] = next_seq
+            next_seq += 1
+            trades += fill
+            buy_count += attempt
+
+        # Averaging: largest drop below avg_threshold (ties: larger name)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            avg = np.where(held, cost / np.where(held, qty, 1.0), np.nan)
+            below = held & (price < avg_threshold * avg) & (buy_count == 0)[:, None]
+            drops = np.where(below, avg - price, -np.inf)
+        candidate = below & (drops == drops.max(axis=1, keepdims=True))
+        best = np.argmax(np.where(candidate, name_rank, -1), axis=1)
+        p = price[paths, best]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            q = np.floor_divide(unit_allocation, p)
+        fill = below.any(axis=1) & (cash >= unit_allocation) & (q != 0)
+        fp, fj = paths[fill], best[fill]
+        cash[fill] -= q[fill] * p[fill]
+        qty[fp, fj] += q[fill]
+        cost[fp, fj] += p[fill] * q[fill]
+        trades += fill
+
+        # Exit: first-opened position at or above sell_threshold
+        with np.errstate(invalid="ignore", divide="ignore"):
+            hit = held & (price >= sell_threshold * (cost / np.where(held, qty, 1.0)))
+        first = np.argmin(np.where(hit, opened, np.iinfo(np.int64).max), axis=1)
+        sell = hit.any(axis=1)
+        sp, sj = paths[sell], first[sell]
+        proceeds = price[sp, sj] * qty[sp, sj]
+        realized[sell] += proceeds - ((cost[sp, sj] / qty[sp, sj]) * qty[sp, sj])
+        cash[sell] += proceeds
+        qty[sp, sj] = cost[sp, sj] = 0.0
+        held[sp, sj] = False
+        trades += sell
+
+        # Mark-to-market equity and drawdown (qty is 0 where not held)
+        mark = np.where(quoted, price, mark)
+        equity = cash + (qty * mark).sum(axis=1)
+        peak = np.maximum(peak, equity)
+        max_drawdown = np.maximum(max_drawdown, 1 - equity / peak)
+
+    # Holdings at the last close, skipping symbols without one (as summarize does)
+    holdings_value = np.where(held & ~np.isnan(price), qty * price, 0.0).sum(axis=1)
+    return {
+        "Final Value": cash + realized + holdings_value,
+        "Cash": cash,
+        "Realized PnL": realized,
+        "Holdings Value": holdings_value,
+        "Trades": trades,
+        "Max Drawdown": max_drawdown,
+    }
+
+# === Resampled paths ===
+def log_returns(filled: np.ndarray) -> np.ndarray:
+    # Daily log returns of forward-filled closes; 0 before a listing
+    with np.errstate(invalid="ignore", divide="ignore"):
+        returns = np.log(filled[1:] / filled[:-1])
+    return np.nan_to_num(returns, nan=0.0, posinf=0.0, neginf=0.0)
+
+def bootstrap_paths(returns: np.ndarray, start_prices: np.ndarray, n_days: int, block: int, rng):
+    # Yields n_days rows of [paths x symbols] closes. Each path starts from
+    # its own historical row of prices, then strings together blocks of
+    # `block` consecutive return days (all symbols together, so the
+    # cross-section keeps its correlation), wrapping around the history.
+    n_paths = len(start_prices)
+    n_blocks = -(-max(n_days - 1, 1) // block)
+    starts = rng.integers(0, len(returns), size=(n_paths, n_blocks))
+    rows = ((starts[:, :, None] + np.arange(block)) % len(returns)).reshape(n_paths, -1)
+    log_price = np.log(start_prices)  # NaN: not listed yet, never traded in this path
+    yield np.round(start_prices, PRICE_DECIMALS)
+    for t in range(n_days - 1):
+        log_price = log_price + returns[rows[:, t]]
+        yield np.round(np.exp(log_price), PRICE_DECIMALS)
+
+_shared = {}
+
+def _init_worker(filled, returns, name_rank):
+    _shared.update(filled=filled, returns=returns, name_rank=name_rank)
+
+def _run_chunk(task):
+    seed, n_paths, n_days, block, capital, params = task
+    rng = np.random.default_rng(seed)
+    filled = _shared["filled"]
+    start_rows = rng.integers(0, len(filled), size=n_paths)  # shuffled start dates
+    result = simulate_batch(bootstrap_paths(_shared["returns"], filled[start_rows], n_days, block, rng), capital,
+                            _shared["name_rank"], **params)
+    result["Start Row"] = start_rows
+    return result
+
+# === Public API ===
+def run_monte_carlo(capital: float, n_paths: int = 10000, years: float = 10, block: int = BLOCK_DAYS,
+                    seed: int = 0, workers: int = 1, chunk: int = CHUNK_PATHS, csv_path: str = CSV_PATH,
+                    start_date: str = None, end_date: str = None,
+                    avg_threshold: float = AVG_THRESHOLD, sell_threshold: float = SELL_THRESHOLD,
+                    top_n: int = TOP_N, max_buys: int = MAX_BUYS, unit_divisor: float = UNIT_DIVISOR) -> pd.DataFrame:
+    # One row per path. Paths are simulated in chunks of `chunk`; each chunk
+    # has its own seed from SeedSequence(seed), so results depend on the
+    # seed and chunk size but not on the number of workers.
+    df = load_price_frame(csv_path)
+    if start_date or end_date:
+        df = df.iloc[date_slice(df.index, start_date or df.index[0], end_date or df.index[-1])]
+    filled = df.ffill().to_numpy()
+    returns = log_returns(filled)
+    name_rank = np.argsort(np.argsort(np.array(list(df.columns), dtype=object))).astype(np.int64)
+    n_days = int(round(years * TRADING_DAYS))
+    params = dict(avg_threshold=avg_threshold, sell_threshold=sell_threshold, top_n=top_n,
+                  max_buys=max_buys, unit_divisor=unit_divisor)
+
+    sizes = [min(chunk, n_paths - i) for i in range(0, n_paths, chunk)]
+    seeds = [s.generate_state(1)[0] for s in np.random.SeedSequence(seed).spawn(len(sizes))]
+    tasks = [(s, n, n_days, block, capital, params) for s, n in zip(seeds, sizes)]
+    if workers == 1:
+        _init_worker(filled, returns, name_rank)
+        chunks = [_run_chunk(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(filled, returns, name_rank)) as pool:
+            chunks = list(pool.map(_run_chunk, tasks))
+
+    results = pd.DataFrame({key: np.concatenate([c[key] for c in chunks]) for key in chunks[0]})
+    results.insert(0, "Path", np.arange(n_paths))
+    results.insert(1, "Start", df.index[results.pop("Start Row")].strftime("%Y-%m-%d"))
+    results["CAGR"] = ((results["Final Value"] / capital) ** (TRADING_DAYS / n_days) - 1) * 100
+    results["Max Drawdown"] *= 100
+    return results[["Path", "Start", "Trades", "Final Value", "CAGR", "Max Drawdown"]].round(2)
+
+def distribution(results: pd.DataFrame) -> pd.DataFrame:
+    # Quantiles of the per-path outcomes, plus the mean
+    table = results[["Final Value", "CAGR", "Max Drawdown"]].quantile(QUANTILES)
+    table.index = [f"p{int(q * 100)}" for q in QUANTILES]
+    table.loc["mean"] = results[["Final Value", "CAGR", "Max Drawdown"]].mean()
+    return table
+
+# === CLI ===
+def main(argv=None):
+    parser = monte_carlo_parser()
+    parser.set_defaults(block=BLOCK_DAYS, chunk=CHUNK_PATHS, avg_threshold=AVG_THRESHOLD,
+                        sell_threshold=SELL_THRESHOLD, top_n=TOP_N, max_buys=MAX_BUYS, unit_divisor=UNIT_DIVISOR,
+                        csv=CSV_PATH)
+    args = parser.parse_args(argv)
+
+    print(f"🎲 Simulating {args.paths} paths × {args.years:g} years...")
+    results = run_monte_carlo(args.capital, args.paths, args.years, args.block, args.seed, args.workers, args.chunk,
+                              args.csv, args.start, args.end, avg_threshold=args.avg_threshold,
+                              sell_threshold=args.sell_threshold, top_n=args.top_n, max_buys=args.max_buys,
+                              unit_divisor=args.unit_divisor)
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    results.to_csv(args.output, index=False)
+    print(f"✅ Per-path results saved to '{args.output}'")
+    print(distribution(results).round(2).to_string())
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,50 @@
 import pandas as pd
 import numpy as np
 import os
-
-def run_backtest(capital: float, start_date: str, end_date: str, output_suffix: str = ""):
-    unit_allocation = capital / 40
-    cash = capital
-    holdings = {}
-    actions_log = []
-    realized_pnl_log = {}
-
-    # Load and preprocess data
-    #df = pd.read_csv("Output files/daily_ma_nifty50.csv", index_col="Stock").transpose()
-    df = pd.read_csv("Output files/daily_ma_nifty50_10years.csv", index_col="Stock").transpose()
-    df.index = pd.to_datetime(df.index)
-    df = df.loc[(df.index >= pd.to_datetime(start_date)) & (df.index <= pd.to_datetime(end_date))]
-
-    def compute_20dma(price_df, current_date):
-        past_20 = price_df.loc[:current_date].tail(20)
-        return past_20.mean()
-
-    def get_avg_buy_price(stock):
-        total_qty = sum(q for _, q in holdings[stock])
-        total_cost = sum(p * q for p, q in holdings[stock])
-        return total_cost / total_qty if total_qty else 0
+from backtest_checkpoint import checkpoint_path_for, discard_checkpoint, load_checkpoint, save_checkpoint
+from indicators import DEFAULT_SIGNAL, MEMORY_CACHE, IndicatorCache, signal_matrices
+from membership import exclude_non_members, membership_mask
+from price_store import load_price_frame
+from risk_metrics import (benchmark_index, equity_curve, format_metrics, read_trades, risk_metrics,
+                          trades_from_rows, write_equity_curve)
+from ledger import PositionBook
+from trade_log import TradeLogWriter, BACKTEST_LOG_COLUMNS
+
+CSV_PATH = "Output files/daily_ma_nifty50_10years.csv"
+
+# Strategy defaults (see README "Strategy Logic Overview")
+AVG_THRESHOLD = 0.97     # average down below 97% of avg buy price
+SELL_THRESHOLD = 1.06    # sell at +6% over avg buy price
+TOP_N = 5                # fallers considered for entry each day
+MAX_BUYS = 2             # new positions opened per day
+UNIT_DIVISOR = 40        # unit allocation = capital / UNIT_DIVISOR
+
+def date_mask(index: pd.DatetimeIndex, start_date: str, end_date: str) -> np.ndarray:
+    return np.asarray((index >= pd.to_datetime(start_date)) & (index <= pd.to_datetime(end_date)))
+
+def date_slice(index: pd.DatetimeIndex, start_date: str, end_date: str) -> slice:
+    # date_mask as a row slice of a sorted index; df.iloc[slice] is a view
+    return slice(index.searchsorted(pd.to_datetime(start_date), side="left"),
+                 index.searchsorted(pd.to_datetime(end_date), side="right"))
+
+def compute_indicator_matrices(df: pd.DataFrame, window: int = 20, signal: str = None,
+                               cache: IndicatorCache = MEMORY_CACHE):
+    # Derive the rolling DMA (or `signal`, see indicators.py) and the
+    # deviation the fallers are ranked by for every date in a single pass
+    # over the price matrix; repeated calls on the same prices hit the cache.
+    prices = df.to_numpy(dtype=float)
+    dma, deviation = signal_matrices(prices, signal or f"sma{window}", df.index, df.columns, cache)
+    return prices, dma, deviation
+
+def simulate(dates, symbols, prices, deviation, capital: float,
+             avg_threshold: float = AVG_THRESHOLD, sell_threshold: float = SELL_THRESHOLD,
+             top_n: int = TOP_N, max_buys: int = MAX_BUYS, unit_divisor: float = UNIT_DIVISOR,
+             actions_log=None, state=None):
+    # actions_log: any sink with .append(row), e.g. a TradeLogWriter
+    # state: (cash, holdings, realized_pnl_log) to continue from (a checkpoint)
+    unit_allocation = capital / unit_divisor
+    cash, holdings, realized_pnl_log = state if state is not None else (capital, PositionBook(), {})
+    actions_log = [] if actions_log is None else actions_log
 
     def buy(stock, price, date, mode="BUY"):
         nonlocal cash
@@ -32,26 +54,22 @@ def run_backtest(capital: float, start_date: str, end_date: str, output_suffix:
         if qty == 0: return
         cost = qty * price
         cash -= cost
-        holdings.setdefault(stock, []).append((price, qty))
+        holdings.add(stock, price, qty)
         actions_log.append([date.strftime("%Y-%m-%d"), mode, stock, price, qty, ""])
 
     def sell(stock, price, date):
         nonlocal cash
-        total_qty = sum(q for _, q in holdings[stock])
-        avg_price = get_avg_buy_price(stock)
+        total_qty, avg_price = holdings.close(stock)
         proceeds = price * total_qty
         pnl = proceeds - (avg_price * total_qty)
         cash += proceeds
         realized_pnl_log[stock] = realized_pnl_log.get(stock, 0) + pnl
-        del holdings[stock]
         actions_log.append([date.strftime("%Y-%m-%d"), "SELL", stock, price, total_qty, round(pnl, 2)])
 
-    for date in df.index:
-        prices_today = df.loc[date].replace("null", np.nan).dropna().astype(float)
-        dma = compute_20dma(df.replace("null", np.nan).astype(float), date).dropna()
-
-        deviations = ((prices_today - dma) / dma).dropna()
-        top_fallers = deviations.sort_values().head(5)
+    for i, date in enumerate(dates):
+        prices_today = pd.Series(prices[i], index=symbols).dropna()
+        deviations = pd.Series(deviation[i], index=symbols).dropna()
+        top_fallers = deviations.sort_values().head(top_n)
 
         buy_count = 0
         for stock in top_fallers.index:
@@ -60,15 +78,15 @@ def run_backtest(capital: float, start_date: str, end_date: str, output_suffix:
             if not np.isnan(price):
                 buy(stock, price, date)
                 buy_count += 1
-            if buy_count == 2: break
+            if buy_count == max_buys: break
 
         if buy_count == 0:
             drops = []
             for stock in holdings:
                 price = prices_today.get(stock)
                 if pd.notna(price):
-                    avg = get_avg_buy_price(stock)
-                    if price < 0.97 * avg:
+                    avg = holdings.avg_price(stock)
+                    if price < avg_threshold * avg:
                         drops.append((avg - price, stock, price))
             if drops:
                 drops.sort(reverse=True)
@@ -78,20 +96,23 @@ def run_backtest(capital: float, start_date: str, end_date: str, output_suffix:
         for stock in list(holdings):
             price = prices_today.get(stock)
             if pd.notna(price):
-                avg = get_avg_buy_price(stock)
-                if price >= 1.06 * avg:
+                avg = holdings.avg_price(stock)
+                if price >= sell_threshold * avg:
                     sell(stock, price, date)
                     break
 
-    total_realized_pnl = sum(realized_pnl_log.values())
+    return cash, holdings, actions_log, realized_pnl_log
+
+def value_holdings(symbols, last_row, holdings) -> dict:
+    # { stock: {"Holdings Value", "Qty", "Unrealized PnL"} } at the last prices
     unrealized_holdings = {}
 
+    last_prices = pd.Series(last_row, index=symbols)
     for stock in holdings:
-        qty = sum(q for _, q in holdings[stock])
-        avg_price = get_avg_buy_price(stock)
-        last_price = df.iloc[-1][stock]
-        if last_price == "null" or pd.isna(last_price): continue
-        last_price = float(last_price)
+        qty = holdings[stock].qty
+        avg_price = holdings.avg_price(stock)
+        last_price = last_prices[stock]
+        if pd.isna(last_price): continue
         current_value = qty * last_price
         cost = qty * avg_price
         unrealized_pnl = current_value - cost
@@ -100,6 +121,23 @@ def run_backtest(capital: float, start_date: str, end_date: str, output_suffix:
             "Qty": qty,
             "Unrealized PnL": unrealized_pnl
         }
+    return unrealized_holdings
+
+def final_value_and_cagr(cash, total_realized_pnl, total_holdings_value, capital: float, start_date: str, end_date: str):
+    final_value = cash + total_realized_pnl + total_holdings_value
+    days = (pd.to_datetime(end_date) - pd.to_datetime(start_date)).days
+    cagr = ((final_value / capital) ** (365 / days)) - 1 if days > 0 else 0
+    return final_value, cagr
+
+def portfolio_value(symbols, last_row, cash, holdings, realized_pnl_log, capital: float, start_date: str, end_date: str):
+    # (final_value, cagr) as in summarize, without building the summary table
+    unrealized_holdings = value_holdings(symbols, last_row, holdings)
+    total_holdings_value = sum(d["Holdings Value"] for d in unrealized_holdings.values())
+    return final_value_and_cagr(cash, sum(realized_pnl_log.values()), total_holdings_value, capital, start_date, end_date)
+
+def summarize(symbols, last_row, cash, holdings, realized_pnl_log, capital: float, start_date: str, end_date: str):
+    total_realized_pnl = sum(realized_pnl_log.values())
+    unrealized_holdings = value_holdings(symbols, last_row, holdings)
 
     summary_rows = []
     all_stocks = set(list(realized_pnl_log.keys()) + list(unrealized_holdings.keys()))
@@ -117,22 +155,87 @@ def run_backtest(capital: float, start_date: str, end_date: str, output_suffix:
     summary_df = pd.DataFrame(summary_rows)
     total_holdings_value = sum(d["Holdings Value"] for d in unrealized_holdings.values())
     total_unrealized_pnl = sum(d["Unrealized PnL"] for d in unrealized_holdings.values())
-    final_value = cash + total_realized_pnl + total_holdings_value
-    days = (pd.to_datetime(end_date) - pd.to_datetime(start_date)).days
-    cagr = ((final_value / capital) ** (365 / days)) - 1 if days > 0 else 0
+    final_value, cagr = final_value_and_cagr(cash, total_realized_pnl, total_holdings_value, capital, start_date, end_date)
 
     summary_df.loc[len(summary_df.index)] = ["TOTAL", round(total_realized_pnl, 2), round(total_holdings_value, 2), "", round(total_unrealized_pnl, 2)]
     summary_df.loc[len(summary_df.index)] = ["CASH LEFT", "", "", "", round(cash, 2)]
     summary_df.loc[len(summary_df.index)] = ["PORTFOLIO VALUE", "", "", "", round(final_value, 2)]
     summary_df.loc[len(summary_df.index)] = ["CAGR", "", "", "", f"{cagr*100:.2f}%"]
 
+    return summary_df, final_value, cagr
+
+def get_engine(name: str):
+    if name == "loop":
+        return simulate
+    if name == "kernel":
+        from backtest_kernel import simulate_kernel
+        return simulate_kernel
+    raise ValueError(f"Unknown engine '{name}' (expected 'loop' or 'kernel')")
+
+def run_backtest(capital: float, start_date: str, end_date: str, output_suffix: str = "",
+                 avg_threshold: float = AVG_THRESHOLD, sell_threshold: float = SELL_THRESHOLD,
+                 top_n: int = TOP_N, max_buys: int = MAX_BUYS, unit_divisor: float = UNIT_DIVISOR,
+                 csv_path: str = CSV_PATH, engine: str = "loop", membership_path: str = None,
+                 checkpoint: bool = True, risk: bool = True, benchmark: str = "equal",
+                 signal: str = DEFAULT_SIGNAL, indicator_cache: IndicatorCache = MEMORY_CACHE):
+    # engine: "loop" (this module's simulate) or "kernel" (backtest_kernel,
+    # array-only and Numba-compiled when available; identical trades)
+    # membership_path: index membership history (see membership.py); only
+    # stocks in the index on a given day are bought that day
+    # checkpoint: save the end state (backtest_checkpoint.py) and, when a
+    # matching one exists, simulate only the dates after it
+    # risk: write the daily equity curve and add drawdown / volatility /
+    # Sharpe / Sortino / exposure / turnover and a comparison against
+    # `benchmark` ("equal" weight or a symbol in the CSV) to the result
+    # signal: the indicator fallers are ranked against (indicators.py),
+    # e.g. "sma50", "ema20" or "drawdown252"; the default is the 20-DMA
+    # Load and preprocess data
+    df = load_price_frame(csv_path)
+    df = df.iloc[date_slice(df.index, start_date, end_date)]
+
+    symbols = df.columns
+    prices, dma, deviation = compute_indicator_matrices(df, signal=signal, cache=indicator_cache)
+    deviation = exclude_non_members(deviation, membership_mask(membership_path, df.index, symbols))
+
     os.makedirs("Output files", exist_ok=True)
-    pd.DataFrame(actions_log, columns=["Date", "Action", "Stock", "Price", "Qty", "PnL"])\
-        .to_csv(f"Output files/portfolio_log_{output_suffix}.csv", index=False)
+    log_path = f"Output files/portfolio_log_{output_suffix}.csv"
+    checkpoint_path = checkpoint_path_for(output_suffix)
+    rules = dict(avg_threshold=avg_threshold, sell_threshold=sell_threshold,
+                 top_n=top_n, max_buys=max_buys, unit_divisor=unit_divisor)
+    key = dict(rules, capital=capital, signal=signal, start_date=str(pd.to_datetime(start_date).date()),
+               csv_path=os.path.abspath(csv_path), membership_path=membership_path and os.path.abspath(membership_path))
+    resume = load_checkpoint(checkpoint_path, key, df.index, symbols, prices, deviation, log_path) if checkpoint else None
+    if resume is None:
+        discard_checkpoint(checkpoint_path)  # the log below is rewritten
+    # A full run's trades stay in memory for the equity curve; a resumed one
+    # needs the earlier rows too, so it reads the log back
+    with TradeLogWriter(log_path, BACKTEST_LOG_COLUMNS, flush_every=1000, truncate=resume is None,
+                        keep_rows=risk and resume is None) as log:
+        if resume is None:
+            cash, holdings, _, realized_pnl_log = get_engine(engine)(
+                df.index, symbols, prices, deviation, capital, **rules, actions_log=log)
+        else:
+            done, state = resume
+            cash, holdings, _, realized_pnl_log = simulate(
+                df.index[done:], symbols, prices[done:], deviation[done:], capital, **rules, actions_log=log,
+                state=state)
+    if checkpoint:
+        save_checkpoint(checkpoint_path, key, df.index, symbols, prices, deviation,
+                        (cash, holdings, realized_pnl_log), log_path)
+    summary_df, final_value, cagr = summarize(
+        symbols, prices[-1], cash, holdings, realized_pnl_log, capital, start_date, end_date)
+
     summary_df.to_csv(f"Output files/final_result_{output_suffix}.csv", index=False)
 
-    return {
+    result = {
         "Capital": capital,
         "Final Value": round(final_value, 2),
         "CAGR": f"{cagr*100:.2f}%"
-    }
\ No newline at end of file
+    }
+    if risk:
+        trades = read_trades(log_path) if log.rows is None else trades_from_rows(log.rows, log.columns)
+        curve = equity_curve(df.index, symbols, prices, trades, capital)
+        curve["Benchmark"] = benchmark_index(prices, symbols, benchmark) * capital
+        write_equity_curve(curve, f"Output files/equity_curve_{output_suffix}.csv")
+        result.update(format_metrics(risk_metrics(curve)))
+    return result
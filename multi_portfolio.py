@@ -0,0 +1,190 @@
+import json
+import sys
+from datetime import datetime
+
+import pandas as pd
+
+from cli_args import live_multi_parser
+from final_script import CSV_PATH, connect_kite, fetch_zerodha_holdings, find_fallers, merge_holdings, run_strategy
+from instrumentation import RunMetrics, DISABLED
+from ledger import HOLDINGS_COLUMNS
+from market_cache import CACHE_DIR, MarketCache
+from price_store import load_price_frame
+from quotes import QuoteSnapshot
+from trade_log import TradeLogWriter, LIVE_LOG_COLUMNS
+
+# Several accounts / capital tiers run the same strategy in one pass. The
+# expensive, portfolio-independent work happens once per run: the price
+# frame and 20DMAs, one quote snapshot for the union of every portfolio's
+# symbols, the faller ranking, and one kite.holdings() per account. Each
+# portfolio then only walks its own buys, averages and sells against it.
+#
+# Config (JSON):
+#   {
+#     "csv": "daily_ma_nifty50_June1.csv",
+#     "accounts": {"main": {"api_key_env": "ZERODHA_API_KEY", "access_token_env": "ZERODHA_ACCESS_TOKEN"}},
+#     "portfolios": [
+#       {"name": "main", "capital": 200000, "log": "live_portfolio_log.csv",
+#        "holdings": "current_holdings.csv", "account": "main"},
+#       {"name": "tier_10l", "capital": 1000000, "log": "tier_10l_log.csv", "holdings": "tier_10l_holdings.csv"}
+#     ]
+#   }
+# A portfolio without an account trades from its saved holdings CSV only.
+# Each account backs at most one portfolio, since its kite.holdings() are
+# merged into that portfolio's ledger.
+
+CONFIG_PATH = "portfolios.json"
+UNIT_DIVISOR = 40
+
+class Portfolio:
+    def __init__(self, name, capital, log_path, holdings_path, account=None, unit_divisor=UNIT_DIVISOR):
+        self.name = name
+        self.capital = float(capital)
+        self.log_path = log_path
+        self.holdings_path = holdings_path
+        self.account = account
+        self.unit_divisor = unit_divisor
+        self.ledger = None
+        self.trade_log = None
+        self.cash = None
+
+    @property
+    def unit_allocation(self):
+        return self.capital / self.unit_divisor
+
+def load_config(path: str):
+    with open(path) as f:
+        config = json.load(f)
+    accounts = config.get("accounts", {})
+    portfolios = []
+    used = {}
+    for entry in config.get("portfolios", []):
+        name = entry["name"]
+        account = entry.get("account")
+        if account is not None and account not in accounts:
+            raise ValueError(f"Portfolio '{name}': unknown account '{account}'")
+        # kite.holdings() is the whole account: a second portfolio on it would count the same shares twice
+        if account is not None and account in used:
+            raise ValueError(f"Portfolio '{name}': account '{account}' is already used by '{used[account]}' "
+                             f"(leave 'account' out for other tiers; they trade from their holdings CSV)")
+        used.setdefault(account, name)
+        portfolios.append(Portfolio(name, entry["capital"],
+                                    entry.get("log", f"live_portfolio_log_{name}.csv"),
+                                    entry.get("holdings", f"current_holdings_{name}.csv"),
+                                    account, entry.get("unit_divisor", UNIT_DIVISOR)))
+    if not portfolios:
+        raise ValueError(f"No portfolios in '{path}'")
+    for attr in ("name", "log_path", "holdings_path"):
+        values = [getattr(p, attr) for p in portfolios]
+        if len(set(values)) != len(values):
+            raise ValueError(f"Portfolios must not share a {attr.replace('_', ' ')}")
+    return config.get("csv", CSV_PATH), accounts, portfolios
+
+# === One Kite session and one kite.holdings() per account, shared by its portfolios ===
+def connect_accounts(accounts: dict, portfolios, offline: bool = False, reload_env: bool = False) -> dict:
+    names = dict.fromkeys(p.account for p in portfolios if p.account is not None)
+    return {account: None if offline else connect_kite(**accounts[account], reload_env=reload_env)
+            for account in names}
+
+def fetch_account_holdings(kites: dict, nifty_50, metrics: RunMetrics = DISABLED) -> dict:
+    holdings = {}
+    for account, kite in kites.items():
+        print(f"\n👤 Account: {account}")
+        holdings[account] = fetch_zerodha_holdings(kite, nifty_50, metrics)
+    return holdings
+
+def load_portfolios(portfolios, account_holdings: dict):
+    no_account = pd.DataFrame(columns=HOLDINGS_COLUMNS)
+    for portfolio in portfolios:
+        portfolio.ledger = merge_holdings(account_holdings.get(portfolio.account, no_account), portfolio.holdings_path)
+        portfolio.trade_log = TradeLogWriter(portfolio.log_path, LIVE_LOG_COLUMNS, flush_every=None)
+        restore_cash(portfolio)
+
+def restore_cash(portfolio):
+    # Same rule as final_script.py: cash comes from the log's running totals
+    portfolio.cash = portfolio.trade_log.totals.cash(portfolio.capital)
+
+# === Decision pass per portfolio against the shared snapshot and fallers ===
+def run_portfolios(df_price, nifty_50, portfolios, snapshot: QuoteSnapshot, top_fallers: list, today_str: str,
+                   metrics: RunMetrics = DISABLED) -> pd.DataFrame:
+    rows = []
+    for portfolio in portfolios:
+        print(f"\n💼 Portfolio: {portfolio.name} (capital ₹{portfolio.capital:,.0f})")
+        ledger = portfolio.ledger
+        ledger.mark_all(snapshot.price)
+        portfolio.cash = run_strategy(df_price, nifty_50, ledger, snapshot, portfolio.trade_log, portfolio.cash,
+                                      today_str, unit_allocation=portfolio.unit_allocation, metrics=metrics,
+                                      top_fallers=top_fallers)
+        rows.append({
+            "Portfolio": portfolio.name,
+            "Cash": round(portfolio.cash, 2),
+            "Holdings Value": round(ledger.holdings_value, 2),
+            "Realized PnL": round(portfolio.trade_log.totals.realized_pnl, 2),
+            "Total": round(portfolio.cash + ledger.holdings_value, 2),
+            "New Trades": len(portfolio.trade_log.buffer),
+        })
+    return pd.DataFrame(rows)
+
+def save_portfolios(portfolios, save: bool):
+    for portfolio in portfolios:
+        if save:
+            portfolio.trade_log.flush()
+            portfolio.ledger.to_frame().to_csv(portfolio.holdings_path, index=False)
+        else:
+            portfolio.trade_log.discard()
+
+# === Main Execution ===
+def main(argv=None):
+    parser = live_multi_parser()
+    parser.set_defaults(config=CONFIG_PATH)
+    args = parser.parse_args(argv)
+    csv_path, accounts, portfolios = load_config(args.config)
+    cache = None if args.no_cache else MarketCache(args.cache_dir, offline=args.offline)
+    metrics = RunMetrics(enabled=args.metrics is not None).start()
+
+    with metrics.phase("load"):
+        df_price = load_price_frame(csv_path)
+        nifty_50 = set(df_price.columns)
+        kites = connect_accounts(accounts, portfolios, args.offline)
+        account_holdings = fetch_account_holdings(kites, nifty_50, metrics)
+        load_portfolios(portfolios, account_holdings)
+
+    now = datetime.now()
+    today_str = now.strftime("%Y-%m-%d")
+    print(f"\n🕒 Running strategy for {len(portfolios)} portfolios on {today_str} at {now.strftime('%H:%M:%S')}\n")
+
+    # === One quote snapshot and one faller scan serve every portfolio ===
+    with metrics.phase("quotes"):
+        held = set().union(*(p.ledger.positions for p in portfolios))
+        quote_symbols = sorted(nifty_50 | held)
+        snapshot = QuoteSnapshot.fetch(quote_symbols, metrics=metrics, cache=cache)
+        print(f"📡 Fetched {len(snapshot.quotes)} quotes for {len(quote_symbols)} symbols (NSE + BSE)")
+        if cache is not None:
+            print(cache.summary())
+    with metrics.phase("find_fallers"):
+        top_fallers = find_fallers(df_price, nifty_50, snapshot)
+
+    summary = run_portfolios(df_price, nifty_50, portfolios, snapshot, top_fallers, today_str, metrics)
+
+    # === FINAL SUMMARY ===
+    print(f"\n📊 Portfolio Summary ({today_str}):")
+    print(summary.to_string(index=False))
+
+    # === SAVE ===
+    save_response = args.save
+    if save_response == "ask":
+        save_response = input("\n💾 Save logs and holdings? (yes/no): ").strip().lower() if sys.stdin.isatty() else "no"
+    with metrics.phase("save"):
+        save_portfolios(portfolios, save_response == "yes")
+        print("✅ Logs and Holdings saved." if save_response == "yes" else "❌ Not saved.")
+
+    # === METRICS ===
+    metrics.stop()
+    metrics.print_summary()
+    metrics_path = metrics.write(args.metrics or f"live_metrics_{now:%Y%m%d_%H%M%S}.json")
+    if metrics_path:
+        print(f"📝 Metrics saved to '{metrics_path}'")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,256 @@
+import argparse
+import io
+import json
+import os
+import threading
+import warnings
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Columnar price store: one directory per dataset holding
+#   prices.npy   float32 [dates x symbols], NaN for missing closes (float64
+#                when a close is too large to round-trip through float32)
+#   dates.npy    datetime64[D] row index (sorted)
+#   symbols.json column index
+# Arrays are opened with mmap_mode="r", so opening a store is zero-copy.
+# to_frame (and load_price_frame) then make a rounded float64 copy, so a
+# frame holds as much memory as a parsed CSV; what the store saves is the
+# parse time. Only backtest_kernel's universe path and the sweep workers
+# read the float32 memmap directly, converting just the rows or symbol
+# blocks they use.
+
+STORE_SUFFIX = ".store"
+PRICE_DECIMALS = 2  # closes are quoted to the paisa
+DATE_FORMATS = ["%d/%m/%y", "%Y-%m-%d", "%d/%m/%Y"]
+FRAME_CACHE_BYTES = 1024 * 2**20  # parsed frames kept in process by load_price_frame
+
+class PriceMatrix:
+    def __init__(self, prices: np.ndarray, dates: np.ndarray, symbols: list):
+        self.prices = prices
+        self.dates = dates
+        self.symbols = symbols
+
+    @property
+    def index(self) -> pd.DatetimeIndex:
+        return pd.DatetimeIndex(self.dates)
+
+    def to_frame(self, read_only: bool = False) -> pd.DataFrame:
+        # A float64 copy of the whole matrix (see the note at the top)
+        prices = to_float64(self.prices)
+        prices.flags.writeable = not read_only
+        return pd.DataFrame(prices, index=self.index, columns=self.symbols, copy=False)
+
+def to_float64(prices) -> np.ndarray:
+    # Rounding back to the quoted precision recovers the exact CSV values:
+    # the store only keeps float32 prices that round-trip (see store_dtype).
+    return np.round(np.asarray(prices, dtype=np.float64), PRICE_DECIMALS)
+
+def store_dtype(prices):
+    # float32 has a 24-bit significand, so paisa-quoted closes stop
+    # round-tripping somewhere above ~1.3 lakh (e.g. MRF); such data is
+    # stored as float64 instead.
+    prices = np.asarray(prices, dtype=np.float64)
+    exact = np.array_equal(to_float64(prices.astype(np.float32)), np.round(prices, PRICE_DECIMALS), equal_nan=True)
+    return np.float32 if exact else np.float64
+
+def parse_date_headers(headers) -> pd.DatetimeIndex:
+    headers = pd.Index(headers).astype(str)
+    for fmt in DATE_FORMATS:
+        try:
+            return pd.DatetimeIndex(pd.to_datetime(headers, format=fmt))
+        except ValueError:
+            continue
+    # Mixed headers (e.g. dd/mm/yy history with appended ISO dates)
+    return pd.DatetimeIndex(pd.to_datetime(headers, format="mixed", dayfirst=True))
+
+def store_path_for(csv_path: str) -> str:
+    return os.path.splitext(csv_path)[0] + STORE_SUFFIX
+
+def _is_stale(csv_path: str, store_dir: str) -> bool:
+    marker = os.path.join(store_dir, "prices.npy")
+    return not os.path.exists(marker) or os.path.getmtime(marker) < os.path.getmtime(csv_path)
+
+def _csv_last_date(csv_path: str):
+    # Dates are the wide CSV's header, so one line is enough
+    with open(csv_path) as f:
+        headers = f.readline().rstrip("\r\n").split(",")[1:]
+    return parse_date_headers(headers).max() if headers else None
+
+def _store_is_ahead(csv_path: str, store_dir: str) -> bool:
+    # data_fetch.py appends to the store only (unless --export-csv), so a
+    # store with later dates than its CSV holds closes the CSV doesn't
+    if not os.path.exists(os.path.join(store_dir, "dates.npy")):
+        return False
+    dates = np.load(os.path.join(store_dir, "dates.npy"))
+    last_csv = _csv_last_date(csv_path)
+    return len(dates) > 0 and (last_csv is None or pd.Timestamp(dates.max()) > last_csv)
+
+# === Converter ===
+def write_store(store_dir: str, prices: np.ndarray, dates, symbols):
+    os.makedirs(store_dir, exist_ok=True)
+    np.save(os.path.join(store_dir, "dates.npy"), np.asarray(dates, dtype="datetime64[D]"))
+    with open(os.path.join(store_dir, "symbols.json"), "w") as f:
+        json.dump(list(symbols), f)
+    # prices.npy is written last: its mtime marks the store as complete
+    np.save(os.path.join(store_dir, "prices.npy"), np.ascontiguousarray(prices, dtype=store_dtype(prices)))
+    return store_dir
+
+def convert_csv(csv_path: str, store_dir: str = None) -> str:
+    store_dir = store_dir or store_path_for(csv_path)
+    df = pd.read_csv(csv_path, index_col="Stock", na_values=["null"])
+    dates = parse_date_headers(df.columns)
+    order = np.argsort(dates.values, kind="stable")
+    prices = df.to_numpy(dtype=np.float64).T[order]
+    return write_store(store_dir, prices, dates.values[order], df.index.astype(str))
+
+def _append_npy(path: str, rows: np.ndarray):
+    # Append rows along axis 0 without touching the existing data: rewrite
+    # the fixed-size .npy header in place and write the new bytes at the end.
+    # Falls back to a full rewrite only if the header would change length.
+    with open(path, "r+b") as f:
+        version = np.lib.format.read_magic(f)
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f) if version == (1, 0) else (None, None, None)
+        data_offset = f.tell()
+        rows = np.ascontiguousarray(rows, dtype=dtype)
+        if shape is not None and not fortran_order and rows.shape[1:] == shape[1:]:
+            header = io.BytesIO()
+            np.lib.format.write_array_header_1_0(header, {
+                "descr": np.lib.format.dtype_to_descr(dtype),
+                "fortran_order": False,
+                "shape": (shape[0] + rows.shape[0],) + shape[1:],
+            })
+            if header.tell() == data_offset:
+                f.seek(0)
+                f.write(header.getvalue())
+                f.seek(0, os.SEEK_END)
+                f.write(rows.tobytes())
+                return
+    existing = np.load(path)
+    np.save(path, np.concatenate([existing, rows.astype(existing.dtype)]))
+
+def append_rows(store_dir: str, prices: np.ndarray, dates):
+    # New dates only; columns must follow the store's symbols.json order
+    dates = np.asarray(dates, dtype="datetime64[D]")
+    if len(dates) == 0:
+        return store_dir
+    prices_path = os.path.join(store_dir, "prices.npy")
+    dates_path = os.path.join(store_dir, "dates.npy")
+    n_prices = len(np.load(prices_path, mmap_mode="r"))
+    n_dates = len(np.load(dates_path, mmap_mode="r"))
+    prices = np.asarray(prices, dtype=np.float64)
+    if n_prices > n_dates:
+        # Drop the rows of a previously interrupted append before adding more
+        np.save(prices_path, np.load(prices_path)[:n_dates])
+    if np.load(prices_path, mmap_mode="r").dtype == np.float32 and store_dtype(prices) != np.float32:
+        # A close float32 can't hold exactly: widen the stored matrix first
+        np.save(prices_path, to_float64(np.load(prices_path)))
+    _append_npy(prices_path, prices)
+    _append_npy(dates_path, dates)
+    return store_dir
+
+def add_symbols(store_dir: str, new_symbols) -> PriceMatrix:
+    # Widening the matrix changes every row, so this is a full rewrite; it
+    # only happens when the index adds a constituent.
+    matrix = open_store(store_dir)
+    new_symbols = [s for s in new_symbols if s not in matrix.symbols]
+    if new_symbols:
+        padding = np.full((len(matrix.dates), len(new_symbols)), np.nan, dtype=matrix.prices.dtype)
+        prices = np.hstack([np.asarray(matrix.prices), padding])
+        del matrix
+        write_store(store_dir, prices, np.load(os.path.join(store_dir, "dates.npy")), _read_symbols(store_dir) + new_symbols)
+    return open_store(store_dir)
+
+def export_csv(store_dir: str, csv_path: str):
+    matrix = open_store(store_dir)
+    df = pd.DataFrame(to_float64(matrix.prices).T, index=pd.Index(matrix.symbols, name="Stock"),
+                      columns=matrix.index.strftime("%Y-%m-%d"))
+    df.to_csv(csv_path, float_format="%.2f", na_rep="null")
+    return csv_path
+
+# === Loader ===
+def open_store(store_dir: str) -> PriceMatrix:
+    prices = np.load(os.path.join(store_dir, "prices.npy"), mmap_mode="r")
+    dates = np.load(os.path.join(store_dir, "dates.npy"))
+    # An interrupted append can leave one file a few rows longer than the other
+    n = min(len(prices), len(dates))
+    return PriceMatrix(prices[:n], dates[:n], _read_symbols(store_dir))
+
+def _read_symbols(store_dir: str) -> list:
+    with open(os.path.join(store_dir, "symbols.json")) as f:
+        return json.load(f)
+
+def load_prices(path: str) -> PriceMatrix:
+    # Accepts a store directory or the original wide CSV. A CSV is converted
+    # on first use (and again whenever it is newer than its store), unless
+    # the store already has dates past the CSV's last one: reconverting
+    # would drop the appended days, so the store is kept with a warning.
+    if os.path.isdir(path):
+        return open_store(path)
+    store_dir = store_path_for(path)
+    if os.path.exists(path) and _is_stale(path, store_dir):
+        if _store_is_ahead(path, store_dir):
+            warnings.warn(f"'{path}' changed but '{store_dir}' has later dates; keeping the store. Run "
+                          f"data_fetch.py --export-csv to update the CSV, or delete the store to rebuild it "
+                          f"from the CSV.", stacklevel=2)
+        else:
+            convert_csv(path, store_dir)
+    return open_store(store_dir)
+
+# === In-process frame cache ===
+# Parsed float64 frames keyed by path and the (mtime, size) of the CSV and
+# the store files, so any rewrite or append is a miss. Least recently used
+# frames are dropped beyond FRAME_CACHE_BYTES. Cached frames are shared
+# between callers, so their values are read-only; slice with iloc (a view)
+# and copy before modifying.
+_frames = OrderedDict()  # { key: DataFrame }
+_frames_lock = threading.Lock()
+
+def _stat(path: str):
+    try:
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size
+    except OSError:
+        return None
+
+def _frame_key(path: str):
+    path = os.path.abspath(path)
+    store_dir = path if os.path.isdir(path) else store_path_for(path)
+    return (path, _stat(path) if not os.path.isdir(path) else None,
+            _stat(os.path.join(store_dir, "prices.npy")), _stat(os.path.join(store_dir, "dates.npy")))
+
+def _frame_bytes(df: pd.DataFrame) -> int:
+    return df.shape[0] * df.shape[1] * 8
+
+def load_price_frame(path: str, cache: bool = True) -> pd.DataFrame:
+    if not cache:
+        return load_prices(path).to_frame()
+    key = _frame_key(path)
+    with _frames_lock:
+        if key in _frames:
+            _frames.move_to_end(key)
+            return _frames[key]
+    df = load_prices(path).to_frame(read_only=True)
+    key = _frame_key(path)  # the store may just have been (re)converted
+    with _frames_lock:
+        _frames[key] = df
+        total = sum(_frame_bytes(f) for f in _frames.values())
+        while total > FRAME_CACHE_BYTES and len(_frames) > 1:
+            _, evicted = _frames.popitem(last=False)
+            total -= _frame_bytes(evicted)
+    return df
+
+def clear_frame_cache():
+    with _frames_lock:
+        _frames.clear()
+
+# === One-shot conversion CLI ===
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert wide 'Stock x date' CSVs into the binary price store.")
+    parser.add_argument("csv", nargs="+", help="CSV files to convert")
+    args = parser.parse_args()
+    for csv_path in args.csv:
+        store_dir = convert_csv(csv_path)
+        matrix = open_store(store_dir)
+        print(f"✅ {csv_path} → {store_dir} ({len(matrix.dates)} dates × {len(matrix.symbols)} symbols)")
@@ -0,0 +1,56 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from instrumentation import DISABLED
+
+EXCHANGE_SUFFIX = {"NSE": ".NS", "BSE": ".BO"}
+
+def _download_last_price(ticker: str, timeout: float):
+    import yfinance as yf  # only needed for live fetches, not stubbed snapshots
+    history = yf.Ticker(ticker).history(period="1d", interval="1m", timeout=timeout)
+    if not history.empty:
+        return float(history.iloc[-1]["Close"])
+    return None
+
+def fetch_last_price(ticker: str, timeout: float = 10, cache=None):
+    # cache: optional market_cache.MarketCache; quotes live for its quote_1m TTL
+    try:
+        if cache is None:
+            return _download_last_price(ticker, timeout)
+        return cache.fetch("quote_1m", (ticker, "1m", date.today().isoformat()),
+                           lambda: _download_last_price(ticker, timeout))
+    except Exception:  # includes CacheMiss when offline
+        return None
+
+# Last 1-minute close for every symbol on every exchange, fetched in one
+# concurrent pass at the start of a run and served from memory afterwards.
+class QuoteSnapshot:
+    def __init__(self, quotes: dict):
+        self.quotes = quotes  # {(symbol, exchange): price}
+
+    @classmethod
+    def fetch(cls, symbols, exchanges=("NSE", "BSE"), timeout: float = 10, max_workers: int = 16,
+              metrics=DISABLED, cache=None):
+        keys = [(symbol, ex) for symbol in symbols for ex in exchanges]
+        tickers = [symbol + EXCHANGE_SUFFIX[ex] for symbol, ex in keys]
+
+        def fetch_one(ticker):
+            with metrics.call("yahoo.last_price") as call:
+                price = fetch_last_price(ticker, timeout, cache)
+                if price is None:
+                    call.fail()
+            return price
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            prices = list(pool.map(fetch_one, tickers))
+        return cls({key: price for key, price in zip(keys, prices) if price is not None})
+
+    def price(self, symbol, exchange):
+        return self.quotes.get((symbol, exchange))
+
+    def best_buy(self, symbol):
+        prices = {ex: self.quotes[(symbol, ex)] for ex in EXCHANGE_SUFFIX if (symbol, ex) in self.quotes}
+        if prices:
+            best_exchange = min(prices, key=prices.get)
+            return prices[best_exchange], best_exchange
+        return None, None
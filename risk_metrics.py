@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+
+# Daily mark-to-market for a backtest, built after the run from its trade
+# log instead of inside the simulation loop: per-day quantity changes are
+# scattered into a [dates x traded stocks] matrix, cumulated into positions
+# and multiplied by the (forward-filled) price matrix in one pass.
+
+TRADING_DAYS = 252
+RISK_FREE_RATE = 0.0  # annual, for Sharpe / Sortino
+
+TRADE_COLUMNS = ["Date", "Action", "Stock", "Price", "Qty"]
+
+def read_trades(log_path: str) -> pd.DataFrame:
+    return pd.read_csv(log_path, usecols=TRADE_COLUMNS)
+
+def trades_from_rows(rows, columns) -> pd.DataFrame:
+    # The same frame from rows still in memory (TradeLogWriter(keep_rows=True))
+    return pd.DataFrame(rows, columns=columns)[TRADE_COLUMNS]
+
+def equity_curve(dates, symbols, prices, trades: pd.DataFrame, capital: float) -> pd.DataFrame:
+    # Cash, holdings value at the last known close, equity and traded value per day
+    dates = pd.DatetimeIndex(dates)
+    traded = pd.Index(pd.unique(trades["Stock"]))
+    day = dates.get_indexer(pd.to_datetime(trades["Date"], format="%Y-%m-%d"))
+    stock = traded.get_indexer(trades["Stock"])
+    sign = np.where(trades["Action"].to_numpy() == "SELL", -1.0, 1.0)
+    qty = trades["Qty"].to_numpy(dtype=np.float64)
+    value = trades["Price"].to_numpy(dtype=np.float64) * qty
+
+    deltas = np.zeros((len(dates), len(traded)))
+    np.add.at(deltas, (day, stock), sign * qty)
+    flows = np.zeros(len(dates))
+    np.add.at(flows, day, -sign * value)
+    turnover = np.zeros(len(dates))
+    np.add.at(turnover, day, value)
+
+    columns = pd.Index(list(symbols)).get_indexer(traded)
+    marks = pd.DataFrame(np.asarray(prices, dtype=np.float64)[:, columns]).ffill().to_numpy()
+    holdings = (np.cumsum(deltas, axis=0) * np.nan_to_num(marks)).sum(axis=1)
+    cash = capital + np.cumsum(flows)
+    return pd.DataFrame({"Cash": cash, "Holdings Value": holdings, "Equity": cash + holdings, "Turnover": turnover},
+                        index=pd.Index(dates, name="Date"))
+
+def write_equity_curve(curve: pd.DataFrame, path: str):
+    # Written by hand: to_csv's per-value formatters cost more than building
+    # the curve itself. Same text as curve.round(2).to_csv (NaN as empty).
+    dates = curve.index.strftime("%Y-%m-%d")
+    values = np.round(curve.to_numpy(dtype=np.float64), 2).tolist()
+    lines = [",".join(["Date", *curve.columns])]
+    lines += [",".join([date, *("" if v != v else repr(v) for v in row)]) for date, row in zip(dates, values)]
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    return path
+
+# === Benchmarks from the same price matrix ===
+def equal_weight_index(prices) -> np.ndarray:
+    # Rebalanced daily: each day's return is the mean over stocks quoted on both days
+    prices = np.asarray(prices, dtype=np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        returns = prices[1:] / prices[:-1] - 1
+    quoted = np.isfinite(returns)
+    counts = quoted.sum(axis=1)
+    daily = np.where(quoted, returns, 0.0).sum(axis=1) / np.maximum(counts, 1)
+    return np.concatenate([[1.0], np.cumprod(1 + daily)])
+
+def benchmark_index(prices, symbols, benchmark: str = "equal") -> np.ndarray:
+    # "equal" for the equal-weight universe, or a symbol in the matrix (e.g. an index ETF)
+    if benchmark == "equal":
+        return equal_weight_index(prices)
+    series = pd.Series(np.asarray(prices, dtype=np.float64)[:, list(symbols).index(benchmark)]).ffill().bfill()
+    return (series / series.iloc[0]).to_numpy()
+
+# === Metrics ===
+def max_drawdown(values) -> float:
+    values = np.asarray(values, dtype=np.float64)
+    return float((values / np.maximum.accumulate(values) - 1).min()) if len(values) else 0.0
+
+def _return_stats(values, risk_free: float):
+    returns = np.diff(values) / values[:-1]
+    excess = returns - risk_free / TRADING_DAYS
+    std = returns.std(ddof=1) if len(returns) > 1 else 0.0
+    downside = np.sqrt(np.mean(np.minimum(excess, 0) ** 2)) if len(returns) else 0.0
+    scale = np.sqrt(TRADING_DAYS)
+    return returns, {
+        "Volatility": std * scale,
+        "Sharpe": excess.mean() / std * scale if std > 0 else 0.0,
+        "Sortino": excess.mean() / downside * scale if downside > 0 else 0.0,
+    }
+
+def _cagr(values, days: int) -> float:
+    return (values[-1] / values[0]) ** (365 / days) - 1 if days > 0 and values[0] > 0 else 0.0
+
+def risk_metrics(curve: pd.DataFrame, risk_free: float = RISK_FREE_RATE) -> dict:
+    # CAGR uses calendar days, as final_value_and_cagr does
+    equity = curve["Equity"].to_numpy()
+    days = (curve.index[-1] - curve.index[0]).days
+    returns, stats = _return_stats(equity, risk_free)
+    metrics = {
+        "Equity CAGR": _cagr(equity, days),
+        "Max Drawdown": max_drawdown(equity),
+        **stats,
+        "Exposure": float(np.mean(curve["Holdings Value"].to_numpy() / equity)),
+        "Turnover": float(curve["Turnover"].sum() / equity.mean() / (days / 365)) if days > 0 else 0.0,
+    }
+    if "Benchmark" in curve:
+        benchmark = curve["Benchmark"].to_numpy()
+        bench_returns, bench_stats = _return_stats(benchmark, risk_free)
+        variance = bench_returns.var(ddof=1) if len(bench_returns) > 1 else 0.0
+        metrics.update({
+            "Benchmark CAGR": _cagr(benchmark, days),
+            "Benchmark Max Drawdown": max_drawdown(benchmark),
+            "Benchmark Sharpe": bench_stats["Sharpe"],
+            "Excess CAGR": metrics["Equity CAGR"] - _cagr(benchmark, days),
+            "Beta": float(np.cov(returns, bench_returns)[0, 1] / variance) if variance > 0 else 0.0,
+        })
+    return metrics
+
+def format_metrics(metrics: dict) -> dict:
+    # Ratios to 2 dp, everything else as a percentage string like run_backtest's CAGR
+    ratios = {"Sharpe", "Sortino", "Benchmark Sharpe", "Beta", "Turnover"}
+    return {name: round(float(value), 2) if name in ratios else f"{value*100:.2f}%" for name, value in metrics.items()}
@@ -1,158 +1,69 @@
-import pandas as pd
-import numpy as np
-from datetime import datetime
 import os
-
-# === USER INPUTS ===
-capital = float(input("Enter total capital: "))
-start_date = input("Enter start date (YYYY-MM-DD): ").strip()
-end_date = input("Enter end date (YYYY-MM-DD): ").strip()
-
-unit_allocation = capital / 40
-cash = capital
-holdings = {}  # { stock: [ (buy_price, qty), ... ] }
-actions_log = []
-realized_pnl_log = {}  # { stock: pnl }
-
-# === Load daily data ===
-df = pd.read_csv("Output files/daily_ma_nifty50.csv", index_col="Stock")
-df = df.transpose()
-df.index = pd.to_datetime(df.index)
-
-# === Filter date range ===
-df = df.loc[(df.index >= pd.to_datetime(start_date)) & (df.index <= pd.to_datetime(end_date))]
-
-# === Helper functions ===
-def compute_20dma(price_df, current_date):
-    past_20 = price_df.loc[:current_date].tail(20)
-    return past_20.mean()
-
-def get_avg_buy_price(stock):
-    total_qty = sum(q for _, q in holdings[stock])
-    total_cost = sum(p * q for p, q in holdings[stock])
-    return total_cost / total_qty if total_qty else 0
-
-def buy(stock, price, date, mode="BUY"):
-    global cash
-    if cash < unit_allocation:
-        return
-    qty = unit_allocation // price
-    if qty == 0: return
-    cost = qty * price
-    cash -= cost
-    holdings.setdefault(stock, []).append((price, qty))
-    actions_log.append([date.strftime("%Y-%m-%d"), mode, stock, price, qty, ""])
-
-def sell(stock, price, date):
-    global cash
-    total_qty = sum(q for _, q in holdings[stock])
-    avg_price = get_avg_buy_price(stock)
-    proceeds = price * total_qty
-    pnl = proceeds - (avg_price * total_qty)
-    cash += proceeds
-    realized_pnl_log[stock] = realized_pnl_log.get(stock, 0) + pnl
-    del holdings[stock]
-    actions_log.append([date.strftime("%Y-%m-%d"), "SELL", stock, price, total_qty, round(pnl, 2)])
-
-# === Strategy Execution ===
-for date in df.index:
-    prices_today = df.loc[date].replace("null", np.nan).dropna().astype(float)
-    dma = compute_20dma(df.replace("null", np.nan).astype(float), date).dropna()
-    
-    # Entry: Find 5 worst deviations below 20-DMA
-    deviations = ((prices_today - dma) / dma).dropna()
-    top_fallers = deviations.sort_values().head(5)
-
-    buy_count = 0
-    # Try max 2 buys from top fallers (new only)
-    for stock in top_fallers.index:
-        if stock in holdings:
-            continue
-        price = prices_today.get(stock)
-        if not np.isnan(price):
-            buy(stock, price, date)
-            buy_count += 1
-        if buy_count == 2:
-            break
-
-    # Averaging mode
-    if buy_count == 0:
-        drops = []
-        for stock in holdings:
-            price = prices_today.get(stock)
-            if pd.notna(price):
-                avg = get_avg_buy_price(stock)
-                if price < 0.97 * avg:
-                    drops.append((avg - price, stock, price))
-        if drops:
-            drops.sort(reverse=True)
-            _, stock, price = drops[0]
-            buy(stock, price, date, mode="AVERAGE")
-
-    # Exit: Sell one stock that gained 5%
-    for stock in list(holdings):
-        price = prices_today.get(stock)
-        if pd.notna(price):
-            avg = get_avg_buy_price(stock)
-            if price >= 1.05 * avg:
-                sell(stock, price, date)
-                break
-
-# === Final Summary ===
-total_realized_pnl = sum(realized_pnl_log.values())
-unrealized_holdings = {}
-
-# Calculate unrealized value of remaining holdings
-for stock in holdings:
-    qty = sum(q for _, q in holdings[stock])
-    avg_price = get_avg_buy_price(stock)
-    last_price = df.iloc[-1][stock]
-    if last_price == "null" or pd.isna(last_price): continue
-    last_price = float(last_price)
-    current_value = qty * last_price
-    cost = qty * avg_price
-    unrealized_pnl = current_value - cost
-    unrealized_holdings[stock] = {
-        "Holdings Value": current_value,
-        "Qty": qty,
-        "Unrealized PnL": unrealized_pnl
-    }
-
-# Build final summary DataFrame
-summary_rows = []
-all_stocks = set(list(realized_pnl_log.keys()) + list(unrealized_holdings.keys()))
-for stock in sorted(all_stocks):
-    realized = realized_pnl_log.get(stock, 0)
-    hold_data = unrealized_holdings.get(stock, {"Holdings Value": 0, "Qty": 0, "Unrealized PnL": 0})
-    summary_rows.append({
-        "Stock": stock,
-        "Realized PnL": round(realized, 2),
-        "Holdings Value": round(hold_data["Holdings Value"], 2),
-        "Qty": int(hold_data["Qty"]),
-        "Unrealized PnL": round(hold_data["Unrealized PnL"], 2)
-    })
-
-summary_df = pd.DataFrame(summary_rows)
-
-# Totals and CAGR
-total_holdings_value = sum(d["Holdings Value"] for d in unrealized_holdings.values())
-total_unrealized_pnl = sum(d["Unrealized PnL"] for d in unrealized_holdings.values())
-final_value = cash + total_realized_pnl + total_holdings_value
-days = (pd.to_datetime(end_date) - pd.to_datetime(start_date)).days
-cagr = ((final_value / capital) ** (365 / days)) - 1 if days > 0 else 0
-
-# Add footer rows
-summary_df.loc[len(summary_df.index)] = ["TOTAL", round(total_realized_pnl, 2), round(total_holdings_value, 2), "", round(total_unrealized_pnl, 2)]
-summary_df.loc[len(summary_df.index)] = ["CASH LEFT", "", "", "", round(cash, 2)]
-summary_df.loc[len(summary_df.index)] = ["PORTFOLIO VALUE", "", "", "", round(final_value, 2)]
-summary_df.loc[len(summary_df.index)] = ["CAGR", "", "", "", f"{cagr*100:.2f}%"]
-
-# Save files
-os.makedirs("Output files", exist_ok=True)
-pd.DataFrame(actions_log, columns=["Date", "Action", "Stock", "Price", "Qty", "PnL"])\
-    .to_csv("Output files/portfolio_log.csv", index=False)
-summary_df.to_csv("Output files/final_result.csv", index=False)
-
-print("\n✅ Backtest complete.")
-print("🔸 Log: Output files/portfolio_log.csv")
-print("🔸 Summary: Output files/final_result.csv")
\ No newline at end of file
+import sys
+
+from cli_args import backtest_parser
+from mul_stratergy_per_capital import compute_indicator_matrices, date_slice, get_engine, summarize
+from price_store import load_price_frame
+from trade_log import TradeLogWriter, BACKTEST_LOG_COLUMNS
+
+CSV_PATH = "Output files/daily_ma_nifty50.csv"
+LOG_PATH = "Output files/portfolio_log.csv"
+RESULT_PATH = "Output files/final_result.csv"
+
+# Manual backtest rules: top 5 fallers, up to 2 new buys a day, average down
+# below 97% of the average price, sell one stock at +5%, units of capital / 40
+TOP_N = 5
+MAX_BUYS = 2
+AVG_THRESHOLD = 0.97
+SELL_THRESHOLD = 1.05
+UNIT_DIVISOR = 40
+
+def run_manual_backtest(capital: float, start_date: str, end_date: str, csv_path: str = CSV_PATH,
+                        engine: str = "loop"):
+    # === Load daily data and filter date range ===
+    df = load_price_frame(csv_path)
+    df = df.iloc[date_slice(df.index, start_date, end_date)]
+
+    # === Parse prices once and precompute 20-DMA / deviation matrices ===
+    symbols = df.columns
+    prices, dma, deviation = compute_indicator_matrices(df)
+
+    # === Strategy Execution ===
+    os.makedirs("Output files", exist_ok=True)
+    with TradeLogWriter(LOG_PATH, BACKTEST_LOG_COLUMNS, flush_every=1000, truncate=True) as actions_log:
+        cash, holdings, _, realized_pnl_log = get_engine(engine)(
+            df.index, symbols, prices, deviation, capital,
+            avg_threshold=AVG_THRESHOLD, sell_threshold=SELL_THRESHOLD, top_n=TOP_N, max_buys=MAX_BUYS,
+            unit_divisor=UNIT_DIVISOR, actions_log=actions_log)
+
+    # === Final Summary ===
+    summary_df, final_value, cagr = summarize(
+        symbols, prices[-1], cash, holdings, realized_pnl_log, capital, start_date, end_date)
+    summary_df.to_csv(RESULT_PATH, index=False)
+    return final_value, cagr
+
+# === USER INPUTS (flags; prompts only when run interactively) ===
+def _ask(value, prompt):
+    if value is not None:
+        return value
+    if not sys.stdin.isatty():
+        raise SystemExit(f"❌ Missing {prompt.lower()} (no terminal to prompt on; pass it as a flag)")
+    return input(f"Enter {prompt}: ").strip()
+
+def main(argv=None):
+    parser = backtest_parser()
+    parser.set_defaults(csv=CSV_PATH)
+    args = parser.parse_args(argv)
+
+    capital = float(_ask(args.capital, "total capital"))
+    start_date = _ask(args.start, "start date (YYYY-MM-DD)")
+    end_date = _ask(args.end, "end date (YYYY-MM-DD)")
+
+    run_manual_backtest(capital, start_date, end_date, args.csv, args.engine)
+
+    print("\n✅ Backtest complete.")
+    print(f"🔸 Log: {LOG_PATH}")
+    print(f"🔸 Summary: {RESULT_PATH}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+import bisect
+import csv
+import json
+import os
+import queue
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from cli_args import stream_parser
+from indicators import RollingIndicators
+from instrumentation import LatencyReservoir
+from ledger import PortfolioLedger
+from price_store import load_prices, to_float64
+from trade_log import TradeLogWriter
+
+CSV_PATH = "daily_ma_nifty50_June1.csv"
+HOLDINGS_PATH = "current_holdings.csv"
+STREAM_LOG_PATH = "live_stream_log.csv"
+STREAM_LOG_COLUMNS = ["Timestamp", "Action", "Stock", "Price", "Qty", "Exchange", "PnL", "Cash Left", "Holdings Value"]
+CAPITAL = 200000
+DMA_WINDOW = 20
+TOP_N = 5
+MAX_BUYS = 2
+AVG_THRESHOLD = 0.97
+SELL_THRESHOLD = 1.05   # live target, see README
+UNIT_DIVISOR = 40
+
+# === Rolling indicator state ===
+# The 20-DMA is indicators.RollingIndicators' sma (the mean of the last
+# DMA_WINDOW valid closes, as final_script.compute_dmas and live_daemon.py
+# use). It only moves at the day boundary, like compute_20dma, which uses
+# history up to yesterday, so a tick costs one subtraction and division.
+def seed_indicators(csv_path: str = CSV_PATH, window: int = DMA_WINDOW) -> RollingIndicators:
+    matrix = load_prices(csv_path)
+    return RollingIndicators(to_float64(matrix.prices), matrix.symbols, [f"sma{window}"])
+
+def cash_from_log(log_path: str, capital: float = CAPITAL) -> float:
+    # Same rule as final_script.py (LogTotals.cash) over the stream log's running totals
+    return TradeLogWriter(log_path, STREAM_LOG_COLUMNS, flush_every=None).totals.cash(capital)
+
+# === Strategy state, evaluated per batch of ticks ===
+def day_counts(log_path: str, day) -> tuple:
+    # (buys, averaged) already logged on `day`, so a restart keeps the day's budget
+    buys, averaged = 0, False
+    if os.path.exists(log_path):
+        with open(log_path, newline="") as f:
+            for row in csv.DictReader(f):
+                if str(row.get("Timestamp", "")).startswith(str(day)):
+                    buys += row["Action"] == "BUY"
+                    averaged = averaged or row["Action"] == "AVERAGE"
+    return buys, averaged
+
+# The decision pass of final_script.run_strategy, run after every batch of
+# ticks (KiteTicker delivers them in batches) over the symbols in that
+# batch only: buy the most fallen of them not held, if they rank within
+# today's top_n, average down the largest drop below avg_threshold among
+# held symbols that ticked on a day without buys, then sell at most one of
+# them at sell_threshold, first in holding order. Today's deviations are
+# kept sorted, so a batch costs O(log n) per ticked symbol, not a rescan of
+# the universe. Differences from cron runs of final_script.py: budgets are
+# per day (max_buys buys, one average down) instead of per run, decisions
+# only use prices from the current batch, and quotes are NSE only.
+class StreamingStrategy:
+    def __init__(self, indicators: RollingIndicators, ledger: PortfolioLedger, capital: float = CAPITAL, cash: float = None,
+                 top_n: int = TOP_N, max_buys: int = MAX_BUYS, avg_threshold: float = AVG_THRESHOLD,
+                 sell_threshold: float = SELL_THRESHOLD, unit_divisor: float = UNIT_DIVISOR, counts=None):
+        # counts(day) -> (buys, averaged) for a day's budget, e.g. from day_counts on the log
+        self.indicators = indicators
+        self.spec = indicators.specs[0]
+        self.dmas = indicators.as_dict(self.spec)
+        self.ledger = ledger
+        self.cash = capital if cash is None else cash  # see cash_from_log
+        self.unit_allocation = capital / unit_divisor
+        self.top_n = top_n
+        self.max_buys = max_buys
+        self.avg_threshold = avg_threshold
+        self.sell_threshold = sell_threshold
+        self.counts = counts or (lambda day: (0, False))
+        self.deviations = {}   # latest deviation per symbol (today)
+        self.ranked = []       # sorted [(deviation, symbol)] of self.deviations
+        self.last_price = {}   # latest tick per symbol (today)
+        self.day = None
+        self.buys_today = 0
+        self.averaged_today = False
+
+    def _roll_day(self, day):
+        # Yesterday's last trade becomes a close in every ticked symbol's window
+        if self.last_price:
+            self.indicators.append([self.last_price.get(s, np.nan) for s in self.indicators.symbols])
+            self.dmas = self.indicators.as_dict(self.spec)
+        self.last_price.clear()
+        self.deviations.clear()
+        self.ranked.clear()
+        self.day = day
+        self.buys_today, self.averaged_today = self.counts(day)
+
+    def _rank(self, symbol, deviation):
+        old = self.deviations.get(symbol)
+        if old is not None:
+            del self.ranked[bisect.bisect_left(self.ranked, (old, symbol))]
+        self.deviations[symbol] = deviation
+        bisect.insort(self.ranked, (deviation, symbol))
+
+    def on_ticks(self, day, ticks):
+        # ticks: [(symbol, price)]; returns [(action, symbol, price, qty, pnl)]
+        if day != self.day:
+            self._roll_day(day)
+        batch = dict(ticks)
+        for symbol, price in batch.items():
+            self.last_price[symbol] = price
+            dma = self.dmas.get(symbol)
+            if dma:
+                self._rank(symbol, (price - dma) / dma)
+            if symbol in self.ledger:
+                self.ledger.mark(symbol, price)
+        return self._decide(batch)
+
+    def on_tick(self, day, symbol, price):
+        return self.on_ticks(day, [(symbol, price)])
+
+    def _buy(self, symbol, price, action):
+        qty = int(self.unit_allocation // price)
+        if qty > 0 and qty * price <= self.cash:
+            self.cash -= qty * price
+            self.ledger.apply_fill(symbol, qty, price, action, "NSE")
+            return qty
+        return 0
+
+    def _decide(self, batch):
+        decisions = []
+        # BUY: most fallen first, among the batch's symbols in today's top_n
+        if self.buys_today < self.max_buys:
+            fallers = sorted((self.deviations[s], s) for s in batch if s in self.deviations and s not in self.ledger)
+            for deviation, symbol in fallers:
+                if self.buys_today >= self.max_buys:
+                    break
+                if bisect.bisect_left(self.ranked, (deviation, symbol)) < self.top_n:
+                    qty = self._buy(symbol, batch[symbol], "BUY")
+                    if qty:
+                        self.buys_today += 1
+                        decisions.append(("BUY", symbol, batch[symbol], qty, 0))
+
+        held = [self.ledger.positions[s] for s in batch if s in self.ledger]
+
+        # AVERAGE DOWN: the largest drop (avg - price) below avg_threshold
+        if self.buys_today == 0 and not self.averaged_today:
+            drops = [(p.avg_price - batch[p.stock], p.stock, batch[p.stock]) for p in held
+                     if batch[p.stock] < self.avg_threshold * p.avg_price]
+            if drops:
+                _, symbol, price = max(drops)
+                qty = self._buy(symbol, price, "AVERAGE")
+                if qty:
+                    self.averaged_today = True
+                    decisions.append(("AVERAGE", symbol, price, qty, 0))
+
+        # SELL: at most one position per batch, first in holding order
+        targets = [p for p in held if batch[p.stock] >= self.sell_threshold * p.avg_price]
+        if targets:
+            position = targets[0] if len(targets) == 1 else next(p for p in self.ledger if p in targets)
+            price, qty, avg = batch[position.stock], position.qty, position.avg_price
+            self.cash += price * qty
+            self.ledger.apply_fill(position.stock, qty, price, "SELL", "NSE")
+            decisions.append(("SELL", position.stock, price, qty, round((price - avg) * qty, 2)))
+        return decisions
+
+# === Tick sources: each yields (timestamp, [(symbol, price), ...]) batches ===
+class ReplaySource:
+    # Recorded ticks as CSV (timestamp,symbol,price) or JSONL; consecutive
+    # ticks with the same timestamp form one batch. With speed set, the
+    # original gaps are replayed scaled by 1/speed; otherwise as fast as possible.
+    def __init__(self, path: str, speed: float = None):
+        self.path = path
+        self.speed = speed
+
+    def _rows(self):
+        with open(self.path) as f:
+            if self.path.endswith(".jsonl"):
+                for line in f:
+                    if line.strip():
+                        row = json.loads(line)
+                        yield row["timestamp"], row["symbol"], float(row["price"])
+            else:
+                for row in csv.DictReader(f):
+                    yield row["timestamp"], row["symbol"], float(row["price"])
+
+    def __iter__(self):
+        previous, batch = None, []
+        for timestamp, symbol, price in self._rows():
+            ts = np.datetime64(timestamp)
+            if batch and ts != previous:
+                yield previous, batch
+                batch = []
+                if self.speed:
+                    gap = (ts - previous) / np.timedelta64(1, "s") / self.speed
+                    if gap > 0:
+                        time.sleep(gap)
+            previous = ts
+            batch.append((symbol, price))
+        if batch:
+            yield previous, batch
+
+class KiteTickerSource:
+    # Live NSE ticks from the Kite WebSocket. KiteTicker callbacks run on its
+    # own thread; ticks are handed over through a queue.
+    def __init__(self, api_key: str, access_token: str, symbols, kite=None):
+        from kiteconnect import KiteConnect, KiteTicker
+        kite = kite or KiteConnect(api_key=api_key)
+        kite.set_access_token(access_token)
+        wanted = set(symbols)
+        self.token_to_symbol = {i["instrument_token"]: i["tradingsymbol"]
+                                for i in kite.instruments("NSE") if i["tradingsymbol"] in wanted}
+        self.ticks = queue.Queue()
+        self.ticker = KiteTicker(api_key, access_token)
+        self.ticker.on_ticks = self._on_ticks
+        self.ticker.on_connect = self._on_connect
+
+    def _on_connect(self, ws, response):
+        tokens = list(self.token_to_symbol)
+        ws.subscribe(tokens)
+        ws.set_mode(ws.MODE_LTP, tokens)
+
+    def _on_ticks(self, ws, ticks):
+        batch = [(self.token_to_symbol[tick["instrument_token"]], float(tick["last_price"]))
+                 for tick in ticks if tick["instrument_token"] in self.token_to_symbol]
+        if batch:
+            self.ticks.put((np.datetime64(datetime.now()), batch))
+
+    def __iter__(self):
+        self.ticker.connect(threaded=True)
+        try:
+            while True:
+                yield self.ticks.get()
+        finally:
+            self.ticker.close()
+
+# === Runner ===
+def run_stream(source, strategy: StreamingStrategy, log_path: str = STREAM_LOG_PATH, record_path: str = None,
+               holdings_path: str = None):
+    # holdings_path: saved after every batch that traded, so a restart resumes the positions
+    latencies_ns = LatencyReservoir()
+    # Every decision is flushed (fsync'd) as soon as it is made
+    with TradeLogWriter(log_path, STREAM_LOG_COLUMNS, flush_every=1) as log:
+        recorder = open(record_path, "a") if record_path else None
+        try:
+            for ts, ticks in source:
+                started = time.perf_counter_ns()
+                decisions = strategy.on_ticks(ts.astype("datetime64[D]"), ticks)
+                latencies_ns.add(time.perf_counter_ns() - started)
+                if recorder:
+                    for symbol, price in ticks:
+                        recorder.write(json.dumps({"timestamp": str(ts), "symbol": symbol, "price": price}) + "\n")
+                for action, stock, fill_price, qty, pnl in decisions:
+                    print(f"⚡ {action}: {stock} @ ₹{fill_price:.2f} × {qty} ({ts})")
+                    log.write([ts, action, stock, fill_price, qty, "NSE", pnl,
+                               round(strategy.cash, 2), round(strategy.ledger.holdings_value, 2)])
+                if decisions and holdings_path:
+                    strategy.ledger.to_frame().to_csv(holdings_path, index=False)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if recorder:
+                recorder.close()
+
+    if latencies_ns.count:
+        print(f"\n⏱️ {latencies_ns.count} batches | tick-to-decision p50 {latencies_ns.percentile(50) / 1e3:.1f} µs, "
+              f"p99 {latencies_ns.percentile(99) / 1e3:.1f} µs, max {latencies_ns.max / 1e3:.1f} µs")
+    return latencies_ns
+
+def main(argv=None):
+    parser = stream_parser()
+    parser.set_defaults(csv=CSV_PATH, holdings=HOLDINGS_PATH, capital=CAPITAL, log=STREAM_LOG_PATH)
+    args = parser.parse_args(argv)
+
+    indicators = seed_indicators(args.csv)
+    if os.path.exists(args.holdings):
+        ledger = PortfolioLedger.from_frame(pd.read_csv(args.holdings))
+    else:
+        ledger = PortfolioLedger()
+    strategy = StreamingStrategy(indicators, ledger, capital=args.capital, cash=cash_from_log(args.log, args.capital),
+                                 counts=lambda day: day_counts(args.log, day))
+
+    if args.live:
+        from dotenv import load_dotenv
+        load_dotenv()
+        source = KiteTickerSource(os.getenv("ZERODHA_API_KEY"), os.getenv("ZERODHA_ACCESS_TOKEN"), indicators.symbols)
+    else:
+        source = ReplaySource(args.replay, speed=args.speed)
+
+    run_stream(source, strategy, log_path=args.log, record_path=args.record, holdings_path=args.holdings)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from cli_args import sweep_parser
+from mul_stratergy_per_capital import (
+    CSV_PATH, AVG_THRESHOLD, SELL_THRESHOLD, TOP_N, MAX_BUYS, UNIT_DIVISOR,
+    date_mask, get_engine, summarize,
+)
+from indicators import DEFAULT_SIGNAL, MEMORY_CACHE, IndicatorCache, parse_spec, signal_matrices
+from market_cache import MarketCache
+from membership import exclude_non_members, membership_mask
+from price_store import load_prices, store_path_for, to_float64
+
+PARAM_NAMES = ["capital", "avg_threshold", "sell_threshold", "top_n", "max_buys", "unit_divisor"]
+
+# === Worker state (populated once per process by _init_worker) ===
+_shared = {}
+
+def _init_worker(store_path, dates, symbols, engine="loop", members=None, cache_dir=None):
+    # Every worker maps the same price store read-only; pages are shared by
+    # the OS page cache instead of pickling the price matrix into each process.
+    _shared["prices"] = load_prices(store_path).prices
+    _shared["dates"] = dates
+    _shared["symbols"] = symbols
+    _shared["simulate"] = get_engine(engine)
+    _shared["members"] = members  # bool [dates x symbols] or None
+    # Combos differing only in trading rules reuse the window's indicator;
+    # with a cache dir, workers and later sweeps share it on disk too
+    _shared["indicators"] = IndicatorCache(MarketCache(cache_dir)) if cache_dir else MEMORY_CACHE
+
+def _run_combo(combo):
+    start_date, end_date = combo["window"]
+    mask = date_mask(_shared["dates"], start_date, end_date)
+    prices = to_float64(_shared["prices"][mask])
+    dates = _shared["dates"][mask]
+    symbols = _shared["symbols"]
+    params = {k: combo[k] for k in PARAM_NAMES if k != "capital"}
+    _, deviation = signal_matrices(prices, combo["signal"], dates, symbols, _shared["indicators"])
+    if _shared["members"] is not None:
+        deviation = exclude_non_members(deviation, _shared["members"][mask])
+
+    cash, holdings, actions_log, realized_pnl_log = _shared["simulate"](
+        dates, symbols, prices, deviation, combo["capital"], **params)
+    _, final_value, cagr = summarize(
+        symbols, prices[-1], cash, holdings, realized_pnl_log, combo["capital"], start_date, end_date)
+
+    return {
+        **{k: combo[k] for k in PARAM_NAMES},
+        "Signal": combo["signal"],
+        "Start": start_date,
+        "End": end_date,
+        "Trades": len(actions_log),
+        "Final Value": round(final_value, 2),
+        "CAGR": round(cagr * 100, 2),
+    }
+
+# === Public API ===
+def build_grid(capitals, windows, avg_thresholds=(AVG_THRESHOLD,), sell_thresholds=(SELL_THRESHOLD,),
+               top_ns=(TOP_N,), max_buys=(MAX_BUYS,), unit_divisors=(UNIT_DIVISOR,), signals=(DEFAULT_SIGNAL,)):
+    grid = []
+    for values in itertools.product(capitals, avg_thresholds, sell_thresholds, top_ns, max_buys, unit_divisors,
+                                    signals, windows):
+        combo = dict(zip(PARAM_NAMES, values[:-2]))
+        combo["signal"] = values[-2]
+        combo["window"] = tuple(values[-1])
+        grid.append(combo)
+    return grid
+
+def run_sweep(grid, csv_path: str = CSV_PATH, workers: int = None, engine: str = "loop",
+              membership_path: str = None, cache_dir: str = None) -> pd.DataFrame:
+    # Converts the CSV on first use; workers then map the store directly
+    matrix = load_prices(csv_path)
+    store_path = csv_path if os.path.isdir(csv_path) else store_path_for(csv_path)
+    members = membership_mask(membership_path, matrix.index, matrix.symbols)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(store_path, matrix.index, pd.Index(matrix.symbols), engine, members,
+                                       cache_dir)) as pool:
+        chunksize = max(1, len(grid) // ((workers or os.cpu_count() or 1) * 4))
+        results = list(pool.map(_run_combo, grid, chunksize=chunksize))
+
+    return pd.DataFrame(results)
+
+# === CLI ===
+def main(argv=None):
+    parser = sweep_parser()
+    parser.set_defaults(avg_threshold=[AVG_THRESHOLD], sell_threshold=[SELL_THRESHOLD], top_n=[TOP_N],
+                        max_buys=[MAX_BUYS], unit_divisor=[UNIT_DIVISOR], signal=[DEFAULT_SIGNAL], csv=CSV_PATH)
+    args = parser.parse_args(argv)
+    for signal in args.signal:
+        try:
+            parse_spec(signal)
+        except ValueError as e:
+            parser.error(str(e))
+
+    grid = build_grid(args.capital, args.window, args.avg_threshold, args.sell_threshold,
+                      args.top_n, args.max_buys, args.unit_divisor, args.signal)
+    print(f"🧮 Running {len(grid)} combinations...")
+    results = run_sweep(grid, csv_path=args.csv, workers=args.workers, engine=args.engine,
+                        membership_path=args.membership, cache_dir=args.cache_dir)
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    results.to_csv(args.output, index=False)
+    print(f"✅ Sweep results saved to '{args.output}'")
+    print(results.sort_values("CAGR", ascending=False).head(10).to_string(index=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from price_store import PRICE_DECIMALS
+
+# Seeded synthetic daily closes in the same wide layout as the Nifty CSVs:
+# one row per symbol ("Stock" column), one dd/mm/yy column per trading day.
+TRADING_DAYS = 252
+END_DATE = "2025-06-30"
+LATE_LISTING_SHARE = 0.1   # symbols whose history starts part-way through
+GAP_RATE = 0.001           # isolated missing closes
+
+def generate_prices(n_symbols: int = 50, years: float = 10, seed: int = 0, end_date: str = END_DATE):
+    # Geometric Brownian motion per symbol with a shared market factor, so
+    # fallers cluster on down days the way index constituents do.
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end=end_date, periods=max(int(round(years * TRADING_DAYS)), 2))
+    n_days = len(dates)
+
+    drift = rng.normal(0.12, 0.08, n_symbols) / TRADING_DAYS
+    vol = rng.uniform(0.15, 0.45, n_symbols) / np.sqrt(TRADING_DAYS)
+    beta = rng.uniform(0.5, 1.5, n_symbols)
+    market = rng.normal(0.0, 0.01, n_days)[:, None]
+    shocks = rng.normal(0.0, 1.0, (n_days, n_symbols)) * vol + market * beta + drift - vol ** 2 / 2
+    start = rng.lognormal(np.log(800), 1.0, n_symbols)
+    prices = np.round(start * np.exp(np.cumsum(shocks, axis=0)), PRICE_DECIMALS)
+    prices = np.maximum(prices, 1.0)
+
+    late = rng.random(n_symbols) < LATE_LISTING_SHARE
+    for j in np.nonzero(late)[0]:
+        prices[:rng.integers(1, n_days // 2 + 2), j] = np.nan
+    prices[rng.random(prices.shape) < GAP_RATE] = np.nan
+
+    symbols = [f"SYN{j:04d}.NS" for j in range(n_symbols)]
+    return pd.DataFrame(prices, index=dates, columns=symbols)
+
+def write_wide_csv(df: pd.DataFrame, path: str):
+    wide = df.T
+    wide.columns = df.index.strftime("%d/%m/%y")
+    wide.index.name = "Stock"
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    wide.to_csv(path, float_format="%.2f", na_rep="null")
+
+def generate_market(path: str, n_symbols: int = 50, years: float = 10, seed: int = 0, end_date: str = END_DATE):
+    df = generate_prices(n_symbols, years, seed, end_date)
+    write_wide_csv(df, path)
+    return df
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a seeded synthetic price CSV in the wide Nifty layout.")
+    parser.add_argument("--symbols", type=int, default=50)
+    parser.add_argument("--years", type=float, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--end-date", default=END_DATE)
+    parser.add_argument("--output", default="Output files/synthetic_50x10.csv")
+    args = parser.parse_args()
+    df = generate_market(args.output, args.symbols, args.years, args.seed, args.end_date)
+    print(f"✅ {df.shape[1]} symbols × {df.shape[0]} days written to '{args.output}'")
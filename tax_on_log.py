@@ -1,5 +1,12 @@
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 import pandas as pd
 
+from cli_args import charges_parser
+
 # Constants
 STAMP_DUTY_BUY = 0.00015         # 0.015%
 STT_SELL = 0.001                 # 0.1%
@@ -8,59 +15,111 @@ SEBI_CHARGES = 10 / 1e7          # 10 per crore = 0.0001%
 GST_RATE = 0.18
 DP_CHARGES = 15.93               # Flat on SELL side per txn
 
-# Load the portfolio log
-df = pd.read_csv("Output files/portfolio_log_3000000.csv")
+CHARGE_COLUMNS = ["Brokerage", "STT", "Txn Charges", "SEBI Charges", "GST", "Stamp Duty", "DP Charges", "Total Charges"]
+DEFAULT_LOG = "Output files/portfolio_log_3000000.csv"
+DEFAULT_OUTPUT = "portfolio_charges.csv"
+CHUNK_ROWS = 500_000
 
-# Convert price and qty columns to float if not already
-df["Price"] = df["Price"].astype(float)
-df["Qty"] = df["Qty"].astype(int)
+# === Charge model (vectorized over whole columns) ===
+def _round2(values: np.ndarray) -> np.ndarray:
+    # np.round scales by 100 first, which can tip values sitting on a half
+    # cent (e.g. 82.115) the other way from Python's round(). Those few
+    # values are re-rounded with round() so totals match the row-wise model.
+    rounded = np.round(values, 2)
+    scaled = values * 100
+    near_half = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if near_half.any():
+        rounded[near_half] = [round(float(v), 2) for v in values[near_half]]
+    return rounded
 
-# Calculate turnover
-df["Turnover"] = df["Price"] * df["Qty"]
+def compute_charges(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.copy()
+    df["Price"] = df["Price"].astype(float)
+    df["Qty"] = df["Qty"].astype(float).astype(int)
+    df["Turnover"] = df["Price"] * df["Qty"]
 
-# Initialize charge columns
-df["Brokerage"] = 0.0
-df["STT"] = 0.0
-df["Txn Charges"] = 0.0
-df["SEBI Charges"] = 0.0
-df["GST"] = 0.0
-df["Stamp Duty"] = 0.0
-df["DP Charges"] = 0.0
-df["Total Charges"] = 0.0
-
-# Row-wise calculation
-for idx, row in df.iterrows():
-    turnover = row["Turnover"]
-    action = row["Action"].strip().upper()
+    turnover = df["Turnover"].to_numpy()
+    action = df["Action"].astype(str).str.strip().str.upper().to_numpy()
+    is_buy = action == "BUY"
+    is_sell = action == "SELL"
 
     txn_charge = turnover * TXN_CHARGES
     sebi = turnover * SEBI_CHARGES
     gst = (txn_charge + sebi) * GST_RATE
-    stt = 0
-    stamp = 0
-    dp = 0
+    stt = np.where(is_sell, turnover * STT_SELL, 0.0)
+    stamp = np.where(is_buy, turnover * STAMP_DUTY_BUY, 0.0)
+    dp = np.where(is_sell, DP_CHARGES, 0.0)  # flat per sell txn
+    total = txn_charge + sebi + gst + stt + stamp + dp
 
-    if action == "BUY":
-        stamp = turnover * STAMP_DUTY_BUY
-    elif action == "SELL":
-        stt = turnover * STT_SELL
-        dp = DP_CHARGES  # flat per sell txn
+    df["Brokerage"] = 0.0
+    df["STT"] = _round2(stt)
+    df["Txn Charges"] = _round2(txn_charge)
+    df["SEBI Charges"] = _round2(sebi)
+    df["GST"] = _round2(gst)
+    df["Stamp Duty"] = _round2(stamp)
+    df["DP Charges"] = _round2(dp)
+    df["Total Charges"] = _round2(total)
+    return df
 
-    total = txn_charge + sebi + gst + stt + stamp + dp
+# === Batch mode ===
+def _run_suffix(log_path: str) -> str:
+    name = os.path.splitext(os.path.basename(log_path))[0]
+    return name[len("portfolio_log_"):] if name.startswith("portfolio_log_") else name
+
+def summarize_log(log_path: str, chunksize: int = CHUNK_ROWS, detail: bool = False) -> dict:
+    # Streams the log in chunks so very large logs never load at once
+    suffix = _run_suffix(log_path)
+    out_dir = os.path.dirname(log_path)
+    detail_path = os.path.join(out_dir, f"portfolio_charges_{suffix}.csv")
+    totals = pd.Series(0.0, index=["Turnover"] + CHARGE_COLUMNS)
+    counts = {"Trades": 0, "Buys": 0, "Averages": 0, "Sells": 0}
+
+    for i, chunk in enumerate(pd.read_csv(log_path, chunksize=chunksize)):
+        charged = compute_charges(chunk)
+        totals += charged[totals.index].sum()
+        action = charged["Action"].astype(str).str.strip().str.upper()
+        counts["Trades"] += len(charged)
+        counts["Buys"] += int((action == "BUY").sum())
+        counts["Averages"] += int((action == "AVERAGE").sum())
+        counts["Sells"] += int((action == "SELL").sum())
+        if detail:
+            charged.to_csv(detail_path, mode="w" if i == 0 else "a", header=i == 0, index=False)
+
+    summary = {"Run": suffix, **counts, **totals.round(2).to_dict()}
+    pd.DataFrame([summary]).to_csv(os.path.join(out_dir, f"charges_summary_{suffix}.csv"), index=False)
+    return summary
+
+def run_batch(log_paths, workers: int = None, chunksize: int = CHUNK_ROWS, detail: bool = False) -> pd.DataFrame:
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        summaries = list(pool.map(summarize_log, log_paths, [chunksize] * len(log_paths), [detail] * len(log_paths)))
+    return pd.DataFrame(summaries)
+
+def main(argv=None):
+    parser = charges_parser()
+    parser.set_defaults(log=DEFAULT_LOG, output=DEFAULT_OUTPUT, chunksize=CHUNK_ROWS)
+    args = parser.parse_args(argv)
+
+    if args.batch:
+        log_paths = sorted({p for pattern in args.batch for p in glob.glob(pattern)})
+        if not log_paths:
+            print("❌ No logs matched.")
+            return
+        print(f"🧾 Costing {len(log_paths)} logs...")
+        summaries = run_batch(log_paths, workers=args.workers, chunksize=args.chunksize, detail=args.detail)
+        print(summaries.to_string(index=False))
+        print("\n✅ charges_summary_<run>.csv written next to each log")
+        return
+
+    # Load the portfolio log
+    df = compute_charges(pd.read_csv(args.log))
+
+    # Save to new CSV
+    df.to_csv(args.output, index=False)
+
+    # Print total charges
+    print(f"\n✅ Charges per transaction saved to: {args.output}")
+    print("💰 Total Charges Summary:")
+    print(df[CHARGE_COLUMNS].sum().round(2))
 
-    # Assign
-    df.at[idx, "Txn Charges"] = round(txn_charge, 2)
-    df.at[idx, "SEBI Charges"] = round(sebi, 2)
-    df.at[idx, "GST"] = round(gst, 2)
-    df.at[idx, "STT"] = round(stt, 2)
-    df.at[idx, "Stamp Duty"] = round(stamp, 2)
-    df.at[idx, "DP Charges"] = round(dp, 2)
-    df.at[idx, "Total Charges"] = round(total, 2)
-
-# Save to new CSV
-df.to_csv("portfolio_charges.csv", index=False)
-
-# Print total charges
-print("\n✅ Charges per transaction saved to: portfolio_charges.csv")
-print("💰 Total Charges Summary:")
-print(df[["Brokerage", "STT", "Txn Charges", "SEBI Charges", "GST", "Stamp Duty", "DP Charges", "Total Charges"]].sum().round(2))
\ No newline at end of file
+if __name__ == "__main__":
+    main()
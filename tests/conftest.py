@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+# The modules are flat scripts at the repository root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+@pytest.fixture
+def price_csv(tmp_path):
+    # A fixed slice of the bundled Nifty 50 closes (wide layout): 12 stocks, ~2 years
+    df = pd.read_csv(os.path.join(ROOT, "daily_ma_nifty50_10years.csv"), index_col=0)
+    path = tmp_path / "prices.csv"
+    df.iloc[:12, :500].to_csv(path)
+    return str(path)
@@ -0,0 +1,29 @@
+import subprocess
+import sys
+
+import pytest
+
+import assetsync
+from cli_args import PARSERS
+from conftest import ROOT
+
+HELP_WITHOUT_PANDAS = """
+import sys
+import assetsync
+try:
+    assetsync.main([{command!r}, "--help"])
+except SystemExit as e:
+    assert e.code == 0
+assert "pandas" not in sys.modules and {module!r} not in sys.modules, sorted(sys.modules)
+"""
+
+@pytest.mark.parametrize("command", sorted(PARSERS))
+def test_subcommand_help_skips_the_tool_module(command):
+    module = assetsync.COMMANDS[command][0]
+    result = subprocess.run([sys.executable, "-c", HELP_WITHOUT_PANDAS.format(command=command, module=module)],
+                            cwd=ROOT, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert "usage:" in result.stdout
+
+def test_every_command_has_a_parser():
+    assert set(PARSERS) == set(assetsync.COMMANDS)
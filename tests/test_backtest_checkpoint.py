@@ -0,0 +1,50 @@
+import os
+import time
+
+import pandas as pd
+
+import mul_stratergy_per_capital as backtest
+
+START, END = "2015-01-01", "2016-12-31"
+
+def _write_days(full_csv, path, days):
+    pd.read_csv(full_csv, index_col=0).iloc[:, :days].to_csv(path)
+    later = time.time() + days  # each rewrite is newer than the store built from the last one
+    os.utime(path, (later, later))
+
+def _simulated_days(monkeypatch):
+    days = []
+    simulate = backtest.simulate
+    def spy(dates, *args, **kwargs):
+        days.append(len(dates))
+        return simulate(dates, *args, **kwargs)
+    monkeypatch.setattr(backtest, "simulate", spy)
+    return days
+
+def test_resume_matches_a_full_run(price_csv, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    growing = str(tmp_path / "growing.csv")
+    days = _simulated_days(monkeypatch)
+    _write_days(price_csv, growing, 400)
+    backtest.run_backtest(300000, START, END, "r", csv_path=growing)
+    _write_days(price_csv, growing, 500)  # data_fetch.py appended 100 days
+    resumed = backtest.run_backtest(300000, START, END, "r", csv_path=growing)
+    full = backtest.run_backtest(300000, START, END, "full", csv_path=growing, checkpoint=False)
+    first, new, total = days
+    assert first == 400 and 0 < new and first + new == total  # only the new days were simulated
+    assert resumed == full
+    out = tmp_path / "Output files"
+    for name in ("portfolio_log", "final_result", "equity_curve"):
+        assert (out / f"{name}_r.csv").read_bytes() == (out / f"{name}_full.csv").read_bytes()
+
+def test_edited_history_or_rules_force_a_full_run(price_csv, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    days = _simulated_days(monkeypatch)
+    backtest.run_backtest(300000, START, END, "e", csv_path=price_csv)
+    backtest.run_backtest(300000, START, END, "e", csv_path=price_csv, sell_threshold=1.05)
+    df = pd.read_csv(price_csv, index_col=0)
+    df.iloc[0, 10] *= 1.01
+    df.to_csv(price_csv)
+    os.utime(price_csv, (time.time() + 60,) * 2)
+    backtest.run_backtest(300000, START, END, "e", csv_path=price_csv, sell_threshold=1.05)
+    assert len(days) == 3 and days[0] == days[1] == days[2]
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest_kernel import run_universe_backtest, simulate_kernel
+from mul_stratergy_per_capital import run_backtest, simulate
+
+START, END = "2015-01-01", "2016-12-31"
+
+def _outputs(tmp_path, suffix):
+    out = tmp_path / "Output files"
+    return (pd.read_csv(out / f"portfolio_log_{suffix}.csv"), pd.read_csv(out / f"final_result_{suffix}.csv"))
+
+@pytest.mark.parametrize("rules", [
+    {},
+    {"avg_threshold": 0.95, "sell_threshold": 1.04, "top_n": 3, "max_buys": 1},
+    {"top_n": 8, "max_buys": 4, "unit_divisor": 20},
+    {"top_n": 6, "max_buys": 0},  # no buy cap: every top_n faller not held
+])
+def test_kernel_matches_loop_engine(price_csv, tmp_path, monkeypatch, rules):
+    monkeypatch.chdir(tmp_path)
+    loop = run_backtest(300000, START, END, "loop", csv_path=price_csv, checkpoint=False, risk=False, **rules)
+    kernel = run_backtest(300000, START, END, "kernel", csv_path=price_csv, engine="kernel", checkpoint=False,
+                          risk=False, **rules)
+    assert loop == kernel
+    for a, b in zip(_outputs(tmp_path, "loop"), _outputs(tmp_path, "kernel")):
+        pd.testing.assert_frame_equal(a, b)
+
+def test_kernel_breaks_ties_like_the_loop_engine(price_csv, tmp_path, monkeypatch):
+    # Two stocks with identical closes have identical deviations every day
+    df = pd.read_csv(price_csv, index_col=0)
+    df.loc["ZZTWIN.NS"] = df.iloc[2]
+    df.loc["AATWIN.NS"] = df.iloc[2]
+    df.to_csv(price_csv)
+    monkeypatch.chdir(tmp_path)
+    loop = run_backtest(300000, START, END, "loop", csv_path=price_csv, checkpoint=False, risk=False)
+    kernel = run_backtest(300000, START, END, "kernel", csv_path=price_csv, engine="kernel", checkpoint=False,
+                          risk=False)
+    assert loop == kernel
+    log, kernel_log = (_outputs(tmp_path, s)[0] for s in ("loop", "kernel"))
+    assert log["Stock"].isin(["ZZTWIN.NS", "AATWIN.NS"]).any()
+    pd.testing.assert_frame_equal(log, kernel_log)
+
+def test_universe_backtest_matches_run_backtest(price_csv, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    loop = run_backtest(300000, START, END, "loop", csv_path=price_csv, checkpoint=False, risk=False)
+    universe = run_universe_backtest(300000, START, END, "universe", csv_path=price_csv)
+    assert loop == universe
+    for a, b in zip(_outputs(tmp_path, "loop"), _outputs(tmp_path, "universe")):
+        pd.testing.assert_frame_equal(a, b)
+
+def test_kernel_without_a_buy_cap_has_room_for_every_buy():
+    # max_buys=0 never stops the entry loop: 8 buys on the first of 3 days
+    # is more than the 2-a-day trade slots max_buys alone would allow
+    dates = pd.date_range("2020-01-01", periods=3)
+    symbols = [f"S{j}" for j in range(8)]
+    prices = np.full((3, 8), 100.0)
+    deviation = -np.arange(1, 9, dtype=float)[None, :].repeat(3, axis=0)
+    rules = dict(top_n=8, max_buys=0)
+    loop_cash, loop_book, loop_log, _ = simulate(dates, symbols, prices, deviation, 1000000, **rules)
+    cash, book, log, _ = simulate_kernel(dates, symbols, prices, deviation, 1000000, **rules)
+    assert len(log) == len(loop_log) == 8
+    assert log == loop_log and cash == loop_cash and list(book) == list(loop_book)
@@ -0,0 +1,29 @@
+import pytest
+
+from instrumentation import RunMetrics
+
+def test_call_latencies_stay_bounded(monkeypatch):
+    # A fake clock: call k takes k ms, and every tenth call fails
+    clock = iter(x for k in range(50000) for x in (0.0, k / 1e3))
+    monkeypatch.setattr("instrumentation.time.perf_counter", lambda: next(clock))
+    metrics = RunMetrics()
+    for k in range(25000):
+        with metrics.call("quotes") as timer:
+            if k % 10 == 0:
+                timer.fail()
+    stats = metrics.calls["quotes"]
+    assert len(stats.reservoir.samples) == stats.reservoir.size < 25000
+    data = metrics.to_dict()["calls"]["quotes"]
+    assert data["count"] == 25000 and data["errors"] == 2500
+    assert data["max_ms"] == pytest.approx(24999)
+    assert data["total_ms"] == pytest.approx(sum(range(25000)))
+    assert 10000 < data["p50_ms"] < 15000
+
+def test_phases_report_total_time(monkeypatch):
+    clock = iter([0.0, 0.5, 1.0, 1.25])
+    monkeypatch.setattr("instrumentation.time.perf_counter", lambda: next(clock))
+    metrics = RunMetrics()
+    for _ in range(2):
+        with metrics.phase("strategy"):
+            pass
+    assert metrics.to_dict()["phases"] == {"strategy": pytest.approx(750)}
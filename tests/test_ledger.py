@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from ledger import HOLDINGS_COLUMNS, PortfolioLedger
+
+def _rescan(ledger, prices):
+    # Totals recomputed from scratch, as final_script did before the ledger
+    value = sum(prices[p.stock] * p.qty for p in ledger)
+    cost = sum(p.qty * p.avg_price for p in ledger)
+    return value, cost
+
+def test_ledger_totals_match_a_rescan():
+    ledger = PortfolioLedger.from_frame(pd.DataFrame([["TCS", 10, 3500.0, "NSE"], ["INFY", 5, 1500.0, None]],
+                                                     columns=HOLDINGS_COLUMNS))
+    rng = np.random.default_rng(0)
+    stocks = ["TCS", "INFY", "SBIN", "ITC"]
+    prices = {s: 100.0 + 50 * i for i, s in enumerate(stocks)}
+    ledger.mark_all(lambda stock, exchange: prices[stock])
+    for _ in range(200):
+        stock = stocks[rng.integers(len(stocks))]
+        prices[stock] = round(prices[stock] * (1 + rng.normal(0, 0.02)), 2)
+        if stock in ledger and rng.random() < 0.3:
+            ledger.apply_fill(stock, ledger.positions[stock].qty, prices[stock], "SELL", "NSE")
+        else:
+            action = "AVERAGE" if stock in ledger else "BUY"
+            ledger.apply_fill(stock, int(rng.integers(1, 20)), prices[stock], action, "NSE")
+        ledger.mark_all(lambda s, exchange: prices[s])
+        value, cost = _rescan(ledger, prices)
+        assert ledger.holdings_value == pytest.approx(value, abs=1e-6)
+        assert ledger.cost_basis == pytest.approx(cost, abs=1e-6)
+
+def test_average_fill_rounds_the_average_price():
+    ledger = PortfolioLedger()
+    ledger.apply_fill("TCS", 3, 100.0, "BUY", "NSE")
+    ledger.apply_fill("TCS", 4, 90.01, "AVERAGE", "BSE")
+    position = ledger.positions["TCS"]
+    assert (position.qty, position.avg_price, position.exchange) == (7, round((300 + 360.04) / 7, 2), "BSE")
+    assert ledger.holdings_value == pytest.approx(7 * 90.01)
+
+def test_sell_removes_the_position():
+    ledger = PortfolioLedger()
+    ledger.apply_fill("TCS", 3, 100.0, "BUY", "NSE")
+    ledger.apply_fill("TCS", 3, 106.0, "SELL", "NSE")
+    assert "TCS" not in ledger
+    assert ledger.holdings_value == 0 and ledger.cost_basis == 0
+    assert ledger.to_frame().empty
+
+# === PositionBook (backtests) ===
+def test_position_book_matches_lot_lists():
+    from ledger import PositionBook
+    book, lots = PositionBook(), {}
+    rng = np.random.default_rng(1)
+    for _ in range(500):
+        stock = f"S{rng.integers(5)}"
+        if stock in book and rng.random() < 0.2:
+            qty, avg = book.close(stock)
+            lot = lots.pop(stock)
+            assert qty == sum(q for _, q in lot)
+            assert avg == pytest.approx(sum(p * q for p, q in lot) / qty, rel=1e-12)
+        else:
+            price, qty = round(float(rng.uniform(50, 5000)), 2), float(rng.integers(1, 40))
+            book.add(stock, price, qty)
+            lots.setdefault(stock, []).append((price, qty))
+        assert list(book) == list(lots)  # insertion order drives the sell scan
+        for s, lot in lots.items():
+            assert book.avg_price(s) == pytest.approx(sum(p * q for p, q in lot) / sum(q for _, q in lot), rel=1e-12)
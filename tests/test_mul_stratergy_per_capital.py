@@ -0,0 +1,92 @@
+import pandas as pd
+
+import mul_stratergy_per_capital
+from mul_stratergy_per_capital import run_backtest
+from price_store import load_price_frame
+from risk_metrics import equity_curve, read_trades
+from trade_log import BACKTEST_LOG_COLUMNS
+
+START, END = "2015-01-01", "2016-12-31"
+
+def per_day_backtest(df: pd.DataFrame, capital: float):
+    # The original engine: the 20-DMA from price_df.loc[:date].tail(20) and
+    # the deviations recomputed every day, lots kept as (price, qty) lists
+    unit_allocation = capital / 40
+    cash, holdings, log, realized = capital, {}, [], {}
+
+    def avg_price(stock):
+        qty = sum(q for _, q in holdings[stock])
+        return sum(p * q for p, q in holdings[stock]) / qty
+
+    def buy(stock, price, date, mode="BUY"):
+        nonlocal cash
+        if cash < unit_allocation:
+            return
+        qty = unit_allocation // price
+        if qty == 0:
+            return
+        cash -= qty * price
+        holdings.setdefault(stock, []).append((price, qty))
+        log.append([date.strftime("%Y-%m-%d"), mode, stock, price, qty, ""])
+
+    def sell(stock, price, date):
+        nonlocal cash
+        qty = sum(q for _, q in holdings[stock])
+        pnl = price * qty - avg_price(stock) * qty
+        cash += price * qty
+        realized[stock] = realized.get(stock, 0) + pnl
+        del holdings[stock]
+        log.append([date.strftime("%Y-%m-%d"), "SELL", stock, price, qty, round(pnl, 2)])
+
+    for date in df.index:
+        prices_today = df.loc[date].dropna()
+        dma = df.loc[:date].tail(20).mean().dropna()
+        top_fallers = ((prices_today - dma) / dma).dropna().sort_values().head(5)
+        buy_count = 0
+        for stock in top_fallers.index:
+            if stock in holdings:
+                continue
+            buy(stock, prices_today[stock], date)
+            buy_count += 1
+            if buy_count == 2:
+                break
+        if buy_count == 0:
+            drops = [(avg_price(s) - prices_today[s], s, prices_today[s]) for s in holdings
+                     if s in prices_today and prices_today[s] < 0.97 * avg_price(s)]
+            if drops:
+                _, stock, price = max(drops)
+                buy(stock, price, date, mode="AVERAGE")
+        for stock in list(holdings):
+            if stock in prices_today and prices_today[stock] >= 1.06 * avg_price(stock):
+                sell(stock, prices_today[stock], date)
+                break
+    # Final value as the original summary: cash + realized P&L + holdings at the last close
+    last = df.iloc[-1]
+    holdings_value = sum(sum(q for _, q in lots) * last[s] for s, lots in holdings.items() if pd.notna(last[s]))
+    return pd.DataFrame(log, columns=BACKTEST_LOG_COLUMNS), cash + sum(realized.values()) + holdings_value
+
+def test_precomputed_matrices_match_per_day_computation(price_csv, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    df = load_price_frame(price_csv)
+    df = df.loc[START:END]
+    expected, final_value = per_day_backtest(df, 500000)
+    expected.to_csv(tmp_path / "expected.csv", index=False)
+
+    result = run_backtest(500000, START, END, "t", csv_path=price_csv, checkpoint=False, risk=False)
+    assert result["Final Value"] == round(final_value, 2)
+    got = pd.read_csv(tmp_path / "Output files" / "portfolio_log_t.csv")
+    assert len(got) > 50
+    pd.testing.assert_frame_equal(got, pd.read_csv(tmp_path / "expected.csv"))
+
+def test_equity_curve_uses_the_trades_in_memory(price_csv, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    def no_reread(path):
+        raise AssertionError("a full run should not read its log back")
+    monkeypatch.setattr(mul_stratergy_per_capital, "read_trades", no_reread)
+    run_backtest(300000, START, END, "risk", csv_path=price_csv, checkpoint=False)
+
+    df = load_price_frame(price_csv).loc[START:END]
+    expected = equity_curve(df.index, df.columns, df.to_numpy(), read_trades("Output files/portfolio_log_risk.csv"), 300000)
+    curve = pd.read_csv("Output files/equity_curve_risk.csv", index_col="Date", parse_dates=True)
+    pd.testing.assert_frame_equal(curve[expected.columns], expected.round(2), check_index_type=False, check_names=False)
@@ -0,0 +1,33 @@
+import json
+
+import pandas as pd
+import pytest
+
+from ledger import HOLDINGS_COLUMNS
+from multi_portfolio import load_config, load_portfolios
+
+def _write_config(tmp_path, portfolios):
+    path = tmp_path / "portfolios.json"
+    path.write_text(json.dumps({"csv": "prices.csv", "accounts": {"main": {}}, "portfolios": portfolios}))
+    return str(path)
+
+def test_two_portfolios_on_one_account_are_rejected(tmp_path):
+    path = _write_config(tmp_path, [
+        {"name": "a", "capital": 200000, "log": "a_log.csv", "holdings": "a_h.csv", "account": "main"},
+        {"name": "b", "capital": 1000000, "log": "b_log.csv", "holdings": "b_h.csv", "account": "main"},
+    ])
+    with pytest.raises(ValueError, match="already used"):
+        load_config(path)
+
+def test_account_holdings_go_to_their_portfolio_only(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    path = _write_config(tmp_path, [
+        {"name": "a", "capital": 200000, "log": "a_log.csv", "holdings": "a_h.csv", "account": "main"},
+        {"name": "b", "capital": 1000000, "log": "b_log.csv", "holdings": "b_h.csv"},
+    ])
+    _, _, portfolios = load_config(path)
+    zerodha = pd.DataFrame([["TCS.NS", 10, 3500.0, None]], columns=HOLDINGS_COLUMNS)
+    load_portfolios(portfolios, {"main": zerodha})
+    a, b = portfolios
+    assert a.ledger.positions["TCS.NS"].qty == 10
+    assert "TCS.NS" not in b.ledger.positions
@@ -0,0 +1,51 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from price_store import append_rows, load_prices, store_path_for, to_float64
+
+def _touch_later(path):
+    later = time.time() + 10
+    os.utime(path, (later, later))
+
+def test_changed_csv_does_not_drop_appended_days(price_csv):
+    matrix = load_prices(price_csv)
+    last = matrix.dates[-1]
+    new_date = last + np.timedelta64(1, "D")
+    append_rows(store_path_for(price_csv), np.asarray(matrix.prices[-1:]), [new_date])
+    _touch_later(price_csv)  # e.g. a git checkout rewrote the CSV
+    with pytest.warns(UserWarning, match="keeping the store"):
+        matrix = load_prices(price_csv)
+    assert matrix.dates[-1] == new_date
+
+def test_edited_csv_is_reconverted(price_csv):
+    load_prices(price_csv)
+    df = pd.read_csv(price_csv, index_col=0)
+    df.iloc[0, -1] = 12345.67
+    df.to_csv(price_csv)
+    _touch_later(price_csv)
+    assert load_prices(price_csv).prices[-1, 0] == np.float32(12345.67)
+
+def test_prices_above_float32_range_round_trip(price_csv):
+    # MRF-like closes: 2-decimal values past ~1.3 lakh don't survive float32
+    df = pd.read_csv(price_csv, index_col=0)
+    df.iloc[0, -1] = 145000.07  # 145000.06 after float32
+    df.to_csv(price_csv)
+    matrix = load_prices(price_csv)
+    assert matrix.prices.dtype == np.float64
+    assert matrix.to_frame().iloc[-1, 0] == 145000.07
+
+def test_appending_a_large_close_widens_the_store(price_csv):
+    matrix = load_prices(price_csv)
+    assert matrix.prices.dtype == np.float32
+    before = matrix.to_frame()
+    row = to_float64(matrix.prices[-1:])
+    row[0, 0] = 145000.07
+    append_rows(store_path_for(price_csv), row, [matrix.dates[-1] + np.timedelta64(1, "D")])
+    del matrix
+    frame = load_prices(price_csv).to_frame()
+    assert frame.iloc[-1, 0] == 145000.07
+    assert frame.iloc[:-1].equals(before)
@@ -0,0 +1,122 @@
+import csv
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import assetsync
+from final_script import compute_dmas, find_fallers, run_strategy
+from indicators import RollingIndicators
+from ledger import HOLDINGS_COLUMNS, PortfolioLedger
+from price_store import load_price_frame
+from quotes import QuoteSnapshot
+from streaming import (STREAM_LOG_COLUMNS, LatencyReservoir, ReplaySource, StreamingStrategy, cash_from_log,
+                       day_counts, run_stream)
+from trade_log import TradeLogWriter
+
+HISTORY = 300
+CAPITAL = 200000
+
+class Rows(list):
+    # Stands in for final_script's TradeLogWriter
+    write = list.append
+
+def _write_replay(path, rows):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["timestamp", "symbol", "price"])
+        writer.writerows(rows)
+
+def _flat_dmas(symbols):
+    # A 20-DMA of 100 for every symbol
+    return RollingIndicators(np.full((20, len(symbols)), 100.0), list(symbols), ["sma20"])
+
+def _log_rows(path):
+    with open(path, newline="") as f:
+        return [(r["Timestamp"][:10], r["Action"], r["Stock"], float(r["Price"]), int(r["Qty"]))
+                for r in csv.DictReader(f)]
+
+def test_cash_is_restored_from_the_logged_fills(tmp_path):
+    path = str(tmp_path / "stream_log.csv")
+    with TradeLogWriter(path, STREAM_LOG_COLUMNS) as log:
+        log.write(["2025-06-02T09:20:00", "BUY", "TCS", 3500.0, 2, "NSE", 0, 193000.0, 7000.0])
+        log.write(["2025-06-04T10:05:00", "SELL", "TCS", 3700.0, 2, "NSE", 400.0, 200400.0, 0.0])
+    # Buys spend, sells return their proceeds: the log's own last "Cash Left"
+    assert cash_from_log(path, 200000) == pytest.approx(200400)
+    assert cash_from_log(str(tmp_path / "missing.csv"), 200000) == 200000
+
+def test_replay_matches_final_script_run_per_day(tmp_path, price_csv):
+    # One batch per day (every symbol's close at one timestamp) is one
+    # final_script run per day on NSE quotes
+    df = load_price_frame(price_csv)
+    symbols = list(df.columns)
+    replay = df.iloc[HISTORY:]
+    _write_replay(tmp_path / "replay.csv", [(f"{day:%Y-%m-%d}T15:25:00", s, repr(p))
+                                            for day, row in replay.iterrows() for s, p in row.dropna().items()])
+
+    indicators = RollingIndicators(df.iloc[:HISTORY].to_numpy(), symbols, ["sma20"])
+    strategy = StreamingStrategy(indicators, PortfolioLedger(), capital=CAPITAL, top_n=len(symbols))
+    log_path = str(tmp_path / "stream_log.csv")
+    run_stream(ReplaySource(str(tmp_path / "replay.csv")), strategy, log_path=log_path)
+
+    ledger, trades, cash = PortfolioLedger(), Rows(), CAPITAL
+    for k, (day, row) in enumerate(replay.iterrows()):
+        history = df.iloc[:HISTORY + k]
+        snapshot = QuoteSnapshot({(s, "NSE"): p for s, p in row.dropna().items()})
+        fallers = find_fallers(history, symbols, snapshot, compute_dmas(history, symbols), verbose=False)
+        cash = run_strategy(history, symbols, ledger, snapshot, trades, cash, f"{day:%Y-%m-%d}",
+                            unit_allocation=CAPITAL / 40, top_fallers=fallers)
+
+    expected = [(r[0], r[1], r[2], float(r[3]), int(r[4])) for r in trades]
+    assert {r[1] for r in expected} == {"BUY", "AVERAGE", "SELL"}
+    assert _log_rows(log_path) == expected
+    assert strategy.cash == pytest.approx(cash)
+    assert cash_from_log(log_path, CAPITAL) == pytest.approx(cash)
+
+def test_restart_keeps_the_days_buy_budget(tmp_path):
+    indicators = lambda: _flat_dmas("ABCD")
+    log_path, holdings_path = str(tmp_path / "stream_log.csv"), str(tmp_path / "holdings.csv")
+    _write_replay(tmp_path / "morning.csv", [("2025-06-02T09:20:00", "A", "90.0"), ("2025-06-02T09:20:00", "B", "91.0")])
+    _write_replay(tmp_path / "after.csv", [("2025-06-02T09:21:00", "C", "92.0"), ("2025-06-02T09:21:00", "D", "93.0")])
+
+    strategy = StreamingStrategy(indicators(), PortfolioLedger(), capital=CAPITAL)
+    run_stream(ReplaySource(str(tmp_path / "morning.csv")), strategy, log_path=log_path, holdings_path=holdings_path)
+    assert day_counts(log_path, np.datetime64("2025-06-02")) == (2, False)
+
+    # A restart picks the holdings, cash and the day's counters back up: both buys are spent
+    restarted = StreamingStrategy(indicators(), PortfolioLedger.from_frame(pd.read_csv(holdings_path)),
+                                  capital=CAPITAL, cash=cash_from_log(log_path, CAPITAL),
+                                  counts=lambda day: day_counts(log_path, day))
+    run_stream(ReplaySource(str(tmp_path / "after.csv")), restarted, log_path=log_path, holdings_path=holdings_path)
+    assert [r[1:3] for r in _log_rows(log_path)] == [("BUY", "A"), ("BUY", "B")]
+    assert list(restarted.ledger.positions) == ["A", "B"]
+    assert restarted.cash == pytest.approx(strategy.cash)
+
+def test_only_the_batchs_symbols_are_decided_on(tmp_path):
+    day = np.datetime64("2025-06-02")
+    ledger = PortfolioLedger.from_frame(pd.DataFrame([["H", 50, 100.0, "NSE"]], columns=HOLDINGS_COLUMNS))
+    strategy = StreamingStrategy(_flat_dmas("ADH"), ledger, capital=CAPITAL, cash=0)
+    assert strategy.on_ticks(day, [("A", 90.0)]) == []  # no cash for the buy
+    assert strategy.on_ticks(day, [("H", 106.0)]) == [("SELL", "H", 106.0, 50, 300.0)]
+    # A is still today's biggest faller, but its 90 is not a current price
+    assert strategy.on_ticks(day, [("D", 99.0)]) == [("BUY", "D", 99.0, 50, 0)]
+
+def test_latency_reservoir_is_bounded():
+    reservoir = LatencyReservoir(size=100)
+    for value in range(100000):
+        reservoir.add(value)
+    assert len(reservoir.samples) == 100
+    assert reservoir.count == 100000 and reservoir.max == 99999
+    # A uniform sample: the median lands near the middle of the range
+    assert 30000 < reservoir.percentile(50) < 70000
+
+def test_stream_subcommand_replays(tmp_path, price_csv):
+    df = load_price_frame(price_csv)
+    day = df.index[-1] + pd.Timedelta(days=1)
+    _write_replay(tmp_path / "ticks.csv", [(f"{day:%Y-%m-%d}T09:20:00", s, repr(p * 0.9))
+                                           for s, p in df.iloc[-1].dropna().items()])
+    log_path, holdings_path = str(tmp_path / "stream_log.csv"), str(tmp_path / "holdings.csv")
+    assetsync.main(["stream", "--replay", str(tmp_path / "ticks.csv"), "--csv", price_csv,
+                    "--log", log_path, "--holdings", holdings_path])
+    assert [r[1] for r in _log_rows(log_path)] == ["BUY", "BUY"]
+    assert len(pd.read_csv(holdings_path)) == 2
@@ -0,0 +1,92 @@
+import json
+
+import pandas as pd
+import pytest
+
+from trade_log import LIVE_LOG_COLUMNS, STATE_SUFFIX, TradeLogWriter
+
+ROWS = [
+    ["2025-06-02", "BUY", "TCS", 3500.0, 1, "NSE", "", 196500.0, 3500.0, ""],
+    ["2025-06-02", "BUY", "INFY", 1500.5, 3, "BSE", "", 192000.0, 8000.0, ""],
+    ["2025-06-03", "AVERAGE", "TCS", 3300.0, 1, "NSE", "", 188700.0, 11000.0, ""],
+    ["2025-06-05", "SELL", "INFY", 1600.0, 3, "NSE", 298.5, 193500.0, 6800.0, 298.5],
+]
+
+def _from_file(path):
+    # What final_script.py derived by reading the whole log
+    df = pd.read_csv(path)
+    pnl = pd.to_numeric(df["PnL"], errors="coerce").fillna(0)
+    return len(df), (df["Price"] * df["Qty"]).sum(), pnl.sum(), pnl[df["Action"] == "SELL"].sum()
+
+def _totals(writer):
+    t = writer.totals
+    return t.rows, t.turnover, t.pnl, t.realized_pnl
+
+def test_sidecar_totals_match_the_log(tmp_path):
+    path = str(tmp_path / "log.csv")
+    with TradeLogWriter(path, LIVE_LOG_COLUMNS, flush_every=2) as log:
+        for row in ROWS:
+            log.write(row)
+    assert _totals(TradeLogWriter(path)) == pytest.approx(_from_file(path))
+    assert json.load(open(path + STATE_SUFFIX))["bytes"] == len(open(path, "rb").read())
+
+def test_rows_past_the_sidecar_are_scanned(tmp_path):
+    path = str(tmp_path / "log.csv")
+    with TradeLogWriter(path) as log:
+        for row in ROWS[:2]:
+            log.write(row)
+    # A crash after the data write but before the sidecar update
+    with open(path, "a") as f:
+        for row in ROWS[2:]:
+            f.write(",".join(map(str, row)) + "\n")
+    assert _totals(TradeLogWriter(path)) == pytest.approx(_from_file(path))
+
+def test_discard_drops_unflushed_rows(tmp_path):
+    path = str(tmp_path / "log.csv")
+    log = TradeLogWriter(path, flush_every=None)
+    log.write(ROWS[0])
+    log.flush()
+    log.write(ROWS[1])
+    log.discard()
+    assert log.totals.rows == 1 and not log.buffer
+    assert _totals(TradeLogWriter(path)) == pytest.approx(_from_file(path))
+
+def test_truncate_starts_a_new_log(tmp_path):
+    path = str(tmp_path / "log.csv")
+    with TradeLogWriter(path) as log:
+        log.write(ROWS[0])
+    with TradeLogWriter(path, truncate=True) as log:
+        log.write(ROWS[1])
+    assert _totals(TradeLogWriter(path)) == pytest.approx(_from_file(path))
+    assert len(pd.read_csv(path)) == 1
+
+def test_cash_adds_back_sell_proceeds(tmp_path):
+    path = str(tmp_path / "log.csv")
+    with TradeLogWriter(path) as log:
+        for row in ROWS:
+            log.write(row)
+    assert TradeLogWriter(path).totals.cash(200000) == pytest.approx(200000 - 3500 - 4501.5 - 3300 + 4800)
+
+def test_sidecar_without_net_flow_is_rescanned(tmp_path):
+    path = str(tmp_path / "log.csv")
+    with TradeLogWriter(path) as log:
+        for row in ROWS:
+            log.write(row)
+    state = json.load(open(path + STATE_SUFFIX))
+    del state["totals"]["net_flow"]
+    json.dump(state, open(path + STATE_SUFFIX, "w"))
+    assert TradeLogWriter(path).totals.net_flow == pytest.approx(-3500 - 4501.5 - 3300 + 4800)
+
+def test_torn_last_line_is_cut_off(tmp_path):
+    path = str(tmp_path / "log.csv")
+    with TradeLogWriter(path) as log:
+        for row in ROWS[:2]:
+            log.write(row)
+    # A crash halfway through writing the third row, sidecar not yet updated
+    with open(path, "a") as f:
+        f.write("2025-06-03,AVERAGE,TCS,33")
+    with TradeLogWriter(path) as log:
+        assert log.totals.rows == 2
+        log.write(ROWS[3])
+    assert _totals(TradeLogWriter(path)) == pytest.approx(_from_file(path))
+    assert pd.read_csv(path)["Stock"].tolist() == ["TCS", "INFY", "INFY"]
@@ -0,0 +1,24 @@
+import pandas as pd
+import pytest
+
+from mul_stratergy_per_capital import run_backtest
+from walk_forward import load_state, run_walk_forward
+
+WINDOWS = [
+    ("2015-01-01", "2015-12-31"),
+    ("2015-01-01", "2016-06-30"),  # shares its simulation with the first window
+    ("2015-03-10", "2016-03-09"),  # starts mid-history: its warm-up DMA rows are redone
+    ("2015-07-15", "2016-11-30"),
+]
+
+@pytest.mark.parametrize("rules", [{}, {"avg_threshold": 0.95, "sell_threshold": 1.04, "top_n": 3, "max_buys": 1}])
+def test_windows_match_run_backtest(price_csv, tmp_path, monkeypatch, rules):
+    monkeypatch.chdir(tmp_path)
+    results = run_walk_forward(WINDOWS, 300000, state=load_state(price_csv), **rules)
+    for k, (start, end) in enumerate(WINDOWS):
+        expected = run_backtest(300000, start, end, str(k), csv_path=price_csv, checkpoint=False, risk=False,
+                                **rules)
+        row = results.iloc[k]
+        assert row["Final Value"] == expected["Final Value"]
+        assert f"{row['CAGR']:.2f}%" == expected["CAGR"]
+        assert row["Trades"] == len(pd.read_csv(tmp_path / "Output files" / f"portfolio_log_{k}.csv"))
@@ -0,0 +1,169 @@
+import csv
+import io
+import json
+import os
+
+LIVE_LOG_COLUMNS = ["Date", "Action", "Stock", "Price", "Qty", "Exchange", "PnL", "Cash Left", "Holdings Value", "Total PnL"]
+BACKTEST_LOG_COLUMNS = ["Date", "Action", "Stock", "Price", "Qty", "PnL"]
+STATE_SUFFIX = ".state.json"
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+class LogTotals:
+    # Running totals over every row of a trade log. Enough to restore live
+    # cash (see cash) and realized P&L without reading history.
+    def __init__(self, rows=0, turnover=0.0, net_flow=0.0, pnl=0.0, realized_pnl=0.0, actions=None):
+        self.rows = rows
+        self.turnover = turnover
+        self.net_flow = net_flow  # sell proceeds minus buy/average costs
+        self.pnl = pnl
+        self.realized_pnl = realized_pnl
+        self.actions = actions or {}
+
+    def add(self, row: dict):
+        price, qty, pnl = _number(row.get("Price")), _number(row.get("Qty")), _number(row.get("PnL"))
+        action = str(row.get("Action", "")).strip().upper()
+        self.rows += 1
+        self.turnover += price * qty
+        self.net_flow += price * qty if action == "SELL" else -price * qty
+        self.pnl += pnl
+        if action == "SELL":
+            self.realized_pnl += pnl
+        self.actions[action] = self.actions.get(action, 0) + 1
+
+    def to_dict(self):
+        return {"rows": self.rows, "turnover": self.turnover, "net_flow": self.net_flow, "pnl": self.pnl,
+                "realized_pnl": self.realized_pnl, "actions": self.actions}
+
+    def cash(self, capital: float) -> float:
+        # Cash left after every logged fill: buys and average-downs spend,
+        # sells return their proceeds (the realized P&L is part of them)
+        return capital + self.net_flow
+
+# Append-only CSV trade log. Rows are buffered and written in batches; each
+# flush fsyncs the data before atomically replacing a small sidecar
+# (<log>.state.json) holding the running totals and the byte offset they
+# cover. Opening an existing log reads the sidecar and only scans rows past
+# that offset (left behind by a crash), so startup cost does not grow with
+# the history. A torn last line from a crash mid-write is cut off first.
+class TradeLogWriter:
+    # keep_rows: also keep this session's rows in memory (.rows), for callers
+    # that use them right after writing, instead of reading the file back
+    def __init__(self, path: str, columns=LIVE_LOG_COLUMNS, flush_every: int = 100, fsync: bool = True,
+                 truncate: bool = False, keep_rows: bool = False):
+        self.path = path
+        self.columns = list(columns)
+        self.flush_every = flush_every
+        self.fsync = fsync
+        self.state_path = path + STATE_SUFFIX
+        self.buffer = []
+        self.rows = [] if keep_rows else None
+        if truncate:
+            for stale in (path, self.state_path):
+                if os.path.exists(stale):
+                    os.remove(stale)
+        self.totals, self.offset = self._recover()
+
+    # --- startup ---
+    def _recover(self):
+        if not os.path.exists(self.path):
+            return LogTotals(), 0
+        size = os.path.getsize(self.path)
+        totals, offset = LogTotals(), 0
+        if os.path.exists(self.state_path):
+            with open(self.state_path) as f:
+                state = json.load(f)
+            # Sidecars from before net_flow are rescanned from the start
+            if state.get("bytes", 0) <= size and "net_flow" in state["totals"]:
+                totals, offset = LogTotals(**state["totals"]), state["bytes"]
+        if offset < size:
+            size = self._drop_torn_tail(offset, size)
+        if offset < size:
+            totals = self._scan(offset, totals)
+            offset = size
+            self._write_state(totals, offset)
+        return totals, offset
+
+    def _drop_torn_tail(self, offset, size):
+        # A crash mid-write can leave a last line without its newline: cut
+        # the log back to the last complete row so it is neither counted nor
+        # glued to the next write. Flushed rows always end in "\n", so only
+        # bytes past the sidecar's offset need checking.
+        with open(self.path, "r+b") as f:
+            f.seek(offset)
+            end = offset + f.read().rfind(b"\n") + 1
+            if end < size:
+                f.truncate(end)
+        return end
+
+    def _scan(self, offset, totals):
+        with open(self.path, newline="") as f:
+            header = next(csv.reader([f.readline()]), None)
+            if header and header != self.columns:
+                self.columns = header  # keep appending in the file's own layout
+            if offset:
+                f.seek(offset)
+            for values in csv.reader(f):
+                if values:
+                    totals.add(dict(zip(self.columns, values)))
+        return totals
+
+    def _write_state(self, totals, offset):
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"bytes": offset, "totals": totals.to_dict()}, f)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp, self.state_path)
+
+    # --- writing ---
+    def write(self, row):
+        row = list(row)
+        self.buffer.append(row)
+        if self.rows is not None:
+            self.rows.append(row)
+        self.totals.add(dict(zip(self.columns, row)))
+        if self.flush_every and len(self.buffer) >= self.flush_every:
+            self.flush()
+
+    append = write  # drop-in for the list-based actions_log
+
+    def __len__(self):
+        return self.totals.rows
+
+    def flush(self):
+        if not self.buffer and os.path.exists(self.path):
+            return
+        chunk = io.StringIO()
+        writer = csv.writer(chunk, lineterminator="\n")
+        if self.offset == 0:
+            writer.writerow(self.columns)
+        writer.writerows(self.buffer)
+        data = chunk.getvalue().encode()
+        with open(self.path, "ab") as f:
+            f.write(data)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        self.offset += len(data)
+        self.buffer.clear()
+        self._write_state(self.totals, self.offset)
+
+    def discard(self):
+        # Drop rows that were never flushed and restore the persisted totals
+        self.buffer.clear()
+        self.totals, self.offset = self._recover()
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
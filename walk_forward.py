@@ -0,0 +1,181 @@
+import argparse
+import os
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from backtest_kernel import SELL, rank_fallers, run_kernel
+from ledger import PositionBook
+from membership import exclude_non_members, membership_mask
+from mul_stratergy_per_capital import (
+    CSV_PATH, AVG_THRESHOLD, SELL_THRESHOLD, TOP_N, MAX_BUYS, UNIT_DIVISOR,
+    compute_indicator_matrices, date_mask, portfolio_value,
+)
+from price_store import load_price_frame
+
+DMA_WINDOW = 20
+
+# === Windows ===
+def rolling_windows(first_date: str, last_date: str, years: int = 3, step_months: int = 1):
+    # Every `years`-long window starting on first_date + k * step_months
+    first, last = pd.Timestamp(first_date), pd.Timestamp(last_date)
+    windows = []
+    k = 0
+    while True:
+        start = first + pd.DateOffset(months=k * step_months)
+        end = start + pd.DateOffset(years=years) - pd.Timedelta(days=1)
+        if end > last:
+            return windows
+        windows.append((start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d")))
+        k += 1
+
+# === Shared indicator state ===
+class IndicatorState:
+    # Prices and the rolling DMA over the full history, computed once. A
+    # window is a row slice of this state; only its first window-1 DMA rows
+    # (and their faller rankings) are recomputed, because run_backtest's DMA
+    # restarts at the window start (min_periods=1) and those rows see less
+    # history than the full series. `members` is an optional point-in-time
+    # membership mask over the same dates and symbols.
+    def __init__(self, df: pd.DataFrame, window: int = DMA_WINDOW, members: np.ndarray = None):
+        self.dates = df.index
+        self.symbols = list(df.columns)
+        self.window = window
+        self.members = members
+        self.prices, self.dma, self.full_deviation = compute_indicator_matrices(df, window)
+        self.full_deviation = exclude_non_members(self.full_deviation, members)
+        self.rankings = {}  # { top_n: rank_fallers(full_deviation, top_n) }
+
+    def bounds(self, start_date: str, end_date: str):
+        rows = np.nonzero(date_mask(self.dates, start_date, end_date))[0]
+        return (rows[0], rows[-1] + 1) if len(rows) else (0, 0)
+
+    def deviation(self, a: int, b: int) -> np.ndarray:
+        prices = self.prices[a:b]
+        dma = self.dma[a:b].copy()
+        warm = min(self.window - 1, b - a)
+        dma[:warm] = pd.DataFrame(prices[:warm]).expanding().mean().to_numpy()
+        deviation = (prices - dma) / dma
+        return exclude_non_members(deviation, None if self.members is None else self.members[a:b])
+
+    def ranking(self, a: int, b: int, deviation: np.ndarray, top_n: int):
+        if top_n not in self.rankings:
+            self.rankings[top_n] = rank_fallers(self.full_deviation, top_n)
+        full_order, full_n_valid = self.rankings[top_n]
+        warm = min(self.window - 1, b - a)
+        order, n_valid = full_order[a:b].copy(), full_n_valid[a:b].copy()
+        order[:warm], n_valid[:warm] = rank_fallers(deviation[:warm], top_n)
+        return order, n_valid
+
+def load_state(csv_path: str = CSV_PATH, membership_path: str = None, window: int = DMA_WINDOW) -> IndicatorState:
+    df = load_price_frame(csv_path)
+    return IndicatorState(df, window, membership_mask(membership_path, df.index, df.columns))
+
+# === Prefix replay ===
+def replay(trades, symbols, capital: float, stops):
+    # Re-applies kernel fills in order and yields (stop, n_trades, cash,
+    # holdings, realized_pnl_log) once every fill before row `stop` is in.
+    # The arithmetic is the same as simulate's, so each stop matches a
+    # backtest that ended there.
+    days, actions, stocks, prices, qtys, _ = trades
+    cash = capital
+    holdings = PositionBook()
+    realized_pnl_log = {}
+    k = 0
+    for stop in sorted(stops):
+        while k < len(days) and days[k] < stop:
+            stock, price = symbols[stocks[k]], prices[k]
+            if actions[k] == SELL:
+                total_qty, avg_price = holdings.close(stock)
+                proceeds = price * total_qty
+                cash += proceeds
+                realized_pnl_log[stock] = realized_pnl_log.get(stock, 0) + (proceeds - (avg_price * total_qty))
+            else:
+                cash -= qtys[k] * price
+                holdings.add(stock, price, qtys[k])
+            k += 1
+        yield stop, k, cash, holdings, realized_pnl_log
+
+# === Walk-forward ===
+def run_walk_forward(windows, capital: float, csv_path: str = CSV_PATH,
+                     avg_threshold: float = AVG_THRESHOLD, sell_threshold: float = SELL_THRESHOLD,
+                     top_n: int = TOP_N, max_buys: int = MAX_BUYS, unit_divisor: float = UNIT_DIVISOR,
+                     state: IndicatorState = None, membership_path: str = None) -> pd.DataFrame:
+    state = state or load_state(csv_path, membership_path)
+    params = dict(avg_threshold=avg_threshold, sell_threshold=sell_threshold, top_n=top_n,
+                  max_buys=max_buys, unit_divisor=unit_divisor)
+
+    # Windows sharing a first trading day share one simulation up to the
+    # latest of their end days; shorter windows are prefixes of it.
+    by_start = defaultdict(list)
+    for i, (start_date, end_date) in enumerate(windows):
+        a, b = state.bounds(start_date, end_date)
+        by_start[a].append((b, i))
+
+    rows = [None] * len(windows)
+    for a, ends in by_start.items():
+        b_max = max(b for b, _ in ends)
+        if b_max <= a:
+            for _, i in ends:
+                rows[i] = {"Start": windows[i][0], "End": windows[i][1], "Days": 0, "Trades": 0,
+                           "Final Value": capital, "CAGR": 0.0}
+            continue
+        deviation = state.deviation(a, b_max)
+        *_, trades = run_kernel(state.symbols, state.prices[a:b_max], deviation, capital,
+                                ranking=state.ranking(a, b_max, deviation, top_n), **params)
+        windows_at = defaultdict(list)
+        for b, i in ends:
+            windows_at[b - a].append(i)
+        for stop, n_trades, cash, holdings, realized_pnl_log in replay(trades, state.symbols, capital, windows_at):
+            for i in windows_at[stop]:
+                start_date, end_date = windows[i]
+                final_value, cagr = portfolio_value(state.symbols, state.prices[a + stop - 1], cash, holdings,
+                                                    realized_pnl_log, capital, start_date, end_date)
+                rows[i] = {"Start": start_date, "End": end_date, "Days": stop, "Trades": n_trades,
+                           "Final Value": round(final_value, 2), "CAGR": round(cagr * 100, 2)}
+
+    return pd.DataFrame(rows, columns=["Start", "End", "Days", "Trades", "Final Value", "CAGR"])
+
+# === CLI ===
+def _parse_window(text):
+    start, _, end = text.partition(":")
+    if not start or not end:
+        raise argparse.ArgumentTypeError(f"Window must be START:END (YYYY-MM-DD:YYYY-MM-DD), got '{text}'")
+    return start, end
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Walk-forward backtests over rolling windows.")
+    parser.add_argument("--capital", type=float, required=True)
+    parser.add_argument("--years", type=int, default=3, help="Window length in years")
+    parser.add_argument("--step-months", type=int, default=1, help="Months between window starts")
+    parser.add_argument("--first", default=None, help="First window start (default: first date in the CSV)")
+    parser.add_argument("--last", default=None, help="Latest window end (default: last date in the CSV)")
+    parser.add_argument("--window", type=_parse_window, nargs="+", default=None,
+                        help="Explicit START:END windows instead of the rolling grid")
+    parser.add_argument("--avg-threshold", type=float, default=AVG_THRESHOLD)
+    parser.add_argument("--sell-threshold", type=float, default=SELL_THRESHOLD)
+    parser.add_argument("--top-n", type=int, default=TOP_N)
+    parser.add_argument("--max-buys", type=int, default=MAX_BUYS)
+    parser.add_argument("--unit-divisor", type=float, default=UNIT_DIVISOR)
+    parser.add_argument("--csv", default=CSV_PATH)
+    parser.add_argument("--membership", default=None,
+                        help="Index membership history (Symbol,Start,End CSV or .members store)")
+    parser.add_argument("--output", default="Output files/walk_forward_results.csv")
+    args = parser.parse_args(argv)
+
+    state = load_state(args.csv, args.membership)
+    windows = args.window or rolling_windows(args.first or state.dates[0], args.last or state.dates[-1],
+                                             args.years, args.step_months)
+    print(f"🪟 Running {len(windows)} windows...")
+    results = run_walk_forward(windows, args.capital, state=state, avg_threshold=args.avg_threshold,
+                               sell_threshold=args.sell_threshold, top_n=args.top_n, max_buys=args.max_buys,
+                               unit_divisor=args.unit_divisor)
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    results.to_csv(args.output, index=False)
+    print(f"✅ Walk-forward results saved to '{args.output}'")
+    print(results["CAGR"].describe().round(2).to_string())
+
+if __name__ == "__main__":
+    main()